@@ -0,0 +1,105 @@
+"""Compare throughput of BytesLoop with the previous bytearray implementation
+
+Run from project root with: python -m benchmarks.bytesloop
+"""
+import threading
+import time
+from threading import Event
+from typing import Callable, Union
+
+from fpipe.utils.bytesloop import BytesLoop
+
+CHUNK_SIZES = (2 ** 14, 2 ** 20, 2 ** 23)
+TOTAL_SIZE = 2 ** 30
+
+
+class LegacyBytesLoop:
+    """BytesLoop as it was before the ring buffer, kept for reference"""
+
+    def __init__(self, buf_size: int):
+        self.__buffer = bytearray()
+        self.__buf_size = buf_size
+        self.__done = False
+        self.__bytes_written = 0
+        self.__bytes_read = 0
+        self.read_ready = Event()
+        self.write_ready = Event()
+        self.write_ready.set()
+
+    def read(self, n=-1) -> bytes:
+        chunk = b''
+        while not self.__done or self.__bytes_written > self.__bytes_read:
+            self.read_ready.wait()
+            chunk = self.__buffer[:n] if n > 0 else self.__buffer[:]
+            try:
+                if chunk:
+                    chunk_len = len(chunk)
+                    del self.__buffer[:chunk_len]
+                    self.__bytes_read += chunk_len
+                    return chunk
+            finally:
+                self.read_ready.clear()
+                self.write_ready.set()
+        return chunk
+
+    def write(self, s: Union[bytes, bytearray]) -> int:
+        data_len = len(s)
+        if not isinstance(s, bytearray):
+            s = bytearray(s)
+        self.__bytes_written += data_len
+        if not data_len:
+            self.__done = True
+            self.write_ready.clear()
+            self.read_ready.set()
+            return 0
+        while True:
+            self.write_ready.wait()
+            remaining_buffer = self.__buf_size - len(self.__buffer)
+            chunk_length = min(remaining_buffer, data_len)
+            if chunk_length == data_len:
+                self.__buffer += s
+                break
+            else:
+                chunk = s[:remaining_buffer]
+                del s[:chunk_length]
+                data_len -= chunk_length
+                self.__buffer += chunk
+            self.write_ready.clear()
+            self.read_ready.set()
+        return data_len
+
+
+def run(factory: Callable, chunk_size: int, total_size: int) -> float:
+    loop = factory(chunk_size)
+    data = b'x' * chunk_size
+
+    def produce():
+        for _ in range(total_size // chunk_size):
+            loop.write(data)
+        loop.write(b'')
+
+    producer = threading.Thread(target=produce, daemon=True)
+    start = time.perf_counter()
+    producer.start()
+    received = 0
+    while True:
+        b = loop.read(chunk_size)
+        if not b:
+            break
+        received += len(b)
+    producer.join()
+    elapsed = time.perf_counter() - start
+    assert received == total_size
+    return total_size / elapsed / 2 ** 20
+
+
+def main():
+    print(f"{'chunk size':>12} {'legacy MiB/s':>14} {'ring MiB/s':>14}")
+    for chunk_size in CHUNK_SIZES:
+        legacy = run(LegacyBytesLoop, chunk_size, TOTAL_SIZE)
+        ring = run(BytesLoop, chunk_size, TOTAL_SIZE)
+        print(f"{chunk_size:>12} {legacy:>14.1f} {ring:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Compare bytes copied by MultipartBuffer and the previous bytearray
+implementation, when writing through S3FileWriter
+
+Run from project root with: python -m benchmarks.multipart_buffer
+"""
+import time
+from typing import Tuple, Type, Union
+from unittest import mock
+
+from fpipe.utils import s3_writer
+from fpipe.utils.multipart_buffer import MultipartBuffer
+from fpipe.utils.s3_writer import S3FileWriter
+
+PART_SIZE = S3FileWriter.MIN_BLOCK_SIZE
+WRITE_SIZES = (2 ** 14, 2 ** 20, 3 * 2 ** 20, PART_SIZE)
+TOTAL_SIZE = 2 ** 28
+
+
+class LegacyMultipartBuffer(object):
+    """MultipartBuffer before parts were preallocated, kept for reference
+
+    copied tallies the bytes moved by each operation: += copies the write,
+    slicing copies the part and del moves the remainder to the front.
+    """
+
+    def __init__(self, chunk_size: int, str_encoding: str = "utf-8"):
+        self.buffer: bytearray = bytearray()
+        self.part_number: int = 1
+        self.chunk_size: int = chunk_size
+        self.count: int = 0
+        self.str_encoding = str_encoding
+        self.copied = 0
+
+    def add(self, s: Union[bytes, bytearray]):
+        self.buffer += s
+        self.count += len(s)
+        self.copied += len(s)
+
+    def empty(self) -> bool:
+        return self.count == 0
+
+    def full(self) -> bool:
+        return self.count >= self.chunk_size
+
+    def get(self) -> Tuple[bytearray, int]:
+        try:
+            part = self.buffer[: self.chunk_size]
+            self.copied += len(part)
+            return part, self.part_number
+        finally:
+            del self.buffer[: self.chunk_size]
+            self.copied += len(self.buffer)
+            self.count -= max(0, self.chunk_size)
+            self.part_number += 1
+
+    def clear(self):
+        del self.buffer[:]
+        self.part_number = 1
+        self.count = 0
+
+
+class CountingMultipartBuffer(MultipartBuffer):
+    """Writes are copied once into a part, parts are handed out as they are
+    """
+
+    def __init__(self, chunk_size: int, str_encoding: str = "utf-8"):
+        super().__init__(chunk_size, str_encoding)
+        self.copied = 0
+
+    def add(self, s: Union[bytes, bytearray, memoryview]):
+        super().add(s)
+        self.copied += len(s)
+
+
+class Client:
+    """Accepts multipart uploads without sending them anywhere"""
+
+    def create_multipart_upload(self, **kwargs):
+        return {"UploadId": "benchmark"}
+
+    def upload_part(self, Body, **kwargs):
+        return {"ETag": '"benchmark"'}
+
+    def complete_multipart_upload(self, **kwargs):
+        return {}
+
+
+def run(buffer_class: Type, write_size: int) -> Tuple[float, float]:
+    buffers = []
+
+    def create_buffer(chunk_size, **kwargs):
+        # Parts of a fixed size, without checksums
+        buffers.append(buffer_class(chunk_size))
+        return buffers[-1]
+
+    data = b'x' * write_size
+    start = time.perf_counter()
+    with mock.patch.object(s3_writer, "MultipartBuffer", create_buffer):
+        with S3FileWriter(Client(), "bucket", "key", "mime",
+                          checksum=None) as writer:
+            for _ in range(TOTAL_SIZE // write_size):
+                writer.write(data)
+    elapsed = time.perf_counter() - start
+    copied = sum(b.copied for b in buffers)
+    return elapsed, copied / (TOTAL_SIZE // write_size * write_size)
+
+
+def main():
+    print(f"{TOTAL_SIZE // 2 ** 20} MiB in parts of {PART_SIZE // 2 ** 20} "
+          f"MiB, bytes copied per byte uploaded")
+    for write_size in WRITE_SIZES:
+        for buffer_class in (LegacyMultipartBuffer, CountingMultipartBuffer):
+            elapsed, copied = run(buffer_class, write_size)
+            print(
+                f"{buffer_class.__name__:>24} "
+                f"write {write_size:>8}: {copied:5.2f} copies, "
+                f"{TOTAL_SIZE / elapsed / 2 ** 20:8.1f} MiB/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,11 @@ class S3WriteException(Exception):
     pass
 
 
+class SourceModifiedException(FileException):
+    """The source changed while it was read"""
+    pass
+
+
 class FileDataException(Exception):
     def __init__(self, obj: Union[Type, object]):
         if isinstance(obj, type):
@@ -2,4 +2,4 @@ from .byte import ByteFile  # noqa:F401
 from .file import File  # noqa:F401
 from .local import LocalFile  # noqa:F401
 from .s3 import S3File, S3PrefixFile  # noqa:F401
-from .ftp import FTPFile  # noqa:F401
+from .ftp import FTPFile, FTPPrefixFile  # noqa:F401
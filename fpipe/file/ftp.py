@@ -4,6 +4,7 @@ from fpipe.meta.blocksize import BlockSize
 from fpipe.meta.host import Host
 from fpipe.meta.password import Password
 from fpipe.meta.port import Port
+from fpipe.meta.prefix import Prefix
 from fpipe.meta.username import Username
 from fpipe.utils.const import DEFAULT_FTP_BLOCK_SIZE
 
@@ -27,3 +28,27 @@ class FTPFile(File):
             BlockSize(block_size)
 
         ))
+
+
+class FTPPrefixFile(File):
+    def __init__(
+        self,
+        prefix: str,
+        host: str,
+        username: str,
+        password: str,
+        port: int,
+        block_size: int = DEFAULT_FTP_BLOCK_SIZE
+    ):
+        """
+        :param prefix: directory listed by the FTP generator, every file in
+        it is downloaded
+        """
+        super().__init__(meta=(
+            Prefix(prefix),
+            Host(host),
+            Username(username),
+            Password(password),
+            Port(port),
+            BlockSize(block_size)
+        ))
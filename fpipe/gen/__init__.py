@@ -1,7 +1,9 @@
-from .meta import Meta  # noqa:F401
+from .meta import Meta, AsyncMeta  # noqa:F401
 from .local import Local  # noqa:F401
-from .program import Program  # noqa:F401
+from .program import Program, AsyncProgram  # noqa:F401
 from .s3 import S3  # noqa:F401
 from .tar import Tar  # noqa:F401
 from .ftp import FTP  # noqa:F401
 from .generator import Method  # noqa:F401
+from .concurrent import Concurrent, AsyncConcurrent  # noqa:F401
+from .async_generator import AsyncFileGenerator  # noqa:F401
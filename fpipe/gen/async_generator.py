@@ -0,0 +1,111 @@
+import asyncio
+from abc import abstractmethod
+from typing import Awaitable, AsyncIterator, AsyncIterable, Optional, \
+    Iterator
+
+from fpipe.exceptions import FileDataException
+from fpipe.file import File
+from fpipe.gen.generator import FileGenerator
+from fpipe.meta.abstract import FileData
+from fpipe.meta.stream import Stream
+from fpipe.utils import async_stream
+
+
+class AsyncFileGeneratorResponse:
+    def __init__(self, file: File, *coroutine: Awaitable):
+        self.file: File = file
+        self.coroutines = coroutine
+
+
+class AsyncFileGenerator(FileGenerator):
+    """Abstract class to use as base for FileGenerators driven by asyncio
+
+    Work that FileGenerators do on threads is done by coroutines scheduled
+    on the running event loop. Iterate with async for, and use
+    aflush()/aflush_iter() instead of flush()/flush_iter().
+
+    Any FileGenerator can be chained to an AsyncFileGenerator, but not the
+    other way around.
+    """
+
+    def __iter__(self) -> Iterator[File]:
+        raise TypeError(
+            f"{self.__class__.__name__} must be iterated with async for"
+        )
+
+    def __aiter__(self) -> AsyncIterator[File]:
+        return self.aiterate(self.async_source_files())
+
+    async def aflush(self) -> None:
+        async for f in self:
+            try:
+                stream = f[Stream]
+            except FileDataException:
+                continue
+            await async_stream.flush(stream)
+
+    async def aflush_iter(self) -> AsyncIterator[File]:  # type: ignore
+        async for f in self:
+            try:
+                stream = f[Stream]
+            except FileDataException:
+                continue
+            await async_stream.flush(stream)
+            yield f
+
+    async def async_source_files(self) -> AsyncIterator[File]:
+        for source in self.sources:
+            if isinstance(source, File):
+                yield source
+            elif hasattr(source, '__aiter__'):
+                async for s in source:  # type: ignore
+                    yield s
+            else:
+                for s in source:
+                    yield s
+
+    async def aiterate(
+            self,
+            sources: AsyncIterable[File]
+    ) -> AsyncIterator[File]:
+        """
+        Runs process() for every file in sources, independent of the
+        sources chained to this generator.
+
+        :param sources: files to process
+        :return: the files produced
+        """
+        async for source in sources:
+            responses = self.process(
+                source,
+                File(
+                    parent=source,
+                    meta=(
+                        m if isinstance(m, FileData) else m(source) for m in
+                        self.process_meta
+                    )
+                )
+            )
+
+            if responses:
+                async for resp in responses:
+                    if resp:
+                        tasks = [
+                            asyncio.ensure_future(c) for c in resp.coroutines
+                        ]
+
+                        if resp.file:
+                            yield resp.file
+
+                        if tasks:
+                            await asyncio.gather(*tasks)
+            else:
+                yield source
+
+    @abstractmethod
+    def process(  # type: ignore
+            self,
+            source: File,
+            process_meta: File
+    ) -> Optional[AsyncIterator[AsyncFileGeneratorResponse]]:
+        raise NotImplementedError
@@ -0,0 +1,308 @@
+import asyncio
+from collections import deque
+from queue import Queue
+from threading import Event, Thread
+from typing import Iterator, Iterable, List, Optional, Deque, Tuple, \
+    AsyncIterator, AsyncIterable
+
+from fpipe.exceptions import FileDataException
+from fpipe.file import File
+from fpipe.gen.async_generator import AsyncFileGenerator
+from fpipe.gen.generator import FileGenerator
+from fpipe.meta.stream import Stream
+from fpipe.utils import async_stream
+
+_DONE = object()
+
+
+class Concurrent(FileGenerator):
+    """Runs a chain of generators for several source files at once
+
+    Every source file gets its own pipeline through the generators, running
+    on a separate thread, with at most max_in_flight pipelines alive at a
+    time. A pipeline does not advance past a file until the consumer has
+    moved on from it, so memory is bounded by the buffers of the pipelines
+    in flight.
+
+    Since the generators are shared between pipelines, process() of each
+    generator must be safe to call from several threads.
+    """
+
+    def __init__(
+            self,
+            first_gen: FileGenerator,
+            *generators: FileGenerator,
+            max_in_flight: int = 4,
+            ordered: bool = True
+    ):
+        """
+
+        :param first_gen: first generator of the chain
+        :param generators: remaining generators of the chain
+        :param max_in_flight: max number of source files processed at once
+        :param ordered: yield files in the order of the source files,
+        otherwise files are yielded as soon as they are produced
+        """
+        super().__init__()
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.generators: List[FileGenerator] = [first_gen, *generators]
+        self.max_in_flight = max_in_flight
+        self.ordered = ordered
+
+    def __iter__(self) -> Iterator[File]:
+        return self.__run(drain=False)
+
+    def flush(self) -> None:
+        for _ in self.__run(drain=True):
+            pass
+
+    def flush_iter(self) -> Iterator[File]:
+        return self.__run(drain=True)
+
+    def process(self, source: File, process_meta: File):
+        raise NotImplementedError
+
+    def __pipeline(self, source: File) -> Iterator[File]:
+        files: Iterable[File] = (source,)
+        for gen in self.generators:
+            files = gen.iterate(files)
+        return iter(files)
+
+    def __run_pipeline(self, source: File, queue: Queue, drain: bool,
+                       stop: Event, releases: List[Event]):
+        try:
+            for f in self.__pipeline(source):
+                if drain:
+                    try:
+                        f[Stream].flush()
+                    except FileDataException:
+                        # flush_iter only yields files with a stream
+                        continue
+                release = Event()
+                releases.append(release)
+                if stop.is_set():
+                    break
+                queue.put((f, release))
+                release.wait()
+                releases.remove(release)
+                if stop.is_set():
+                    break
+        except BaseException as e:
+            queue.put(e)
+        finally:
+            queue.put(_DONE)
+
+    def __start(self, sources: Iterator[File], queue: Queue, drain: bool,
+                stop: Event, releases: List[Event]) -> Optional[Thread]:
+        source = next(sources, None)
+        if source is None:
+            return None
+        thread = Thread(
+            target=self.__run_pipeline,
+            args=(source, queue, drain, stop, releases),
+            name=f"{self.__class__.__name__}",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    @staticmethod
+    def __consume(queue: Queue) -> Iterator[File]:
+        """Yields files from queue, until one pipeline is done"""
+        while True:
+            item = queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            f, release = item
+            try:
+                yield f
+            finally:
+                release.set()
+
+    def __run(self, drain: bool) -> Iterator[File]:
+        sources = iter(self.source_files)
+        stop = Event()
+        # Files waiting for the consumer to move on
+        releases: List[Event] = []
+        try:
+            if self.ordered:
+                pending: Deque[Tuple[Queue, Thread]] = deque()
+                while True:
+                    while len(pending) < self.max_in_flight:
+                        queue: Queue = Queue()
+                        thread = self.__start(
+                            sources, queue, drain, stop, releases
+                        )
+                        if not thread:
+                            break
+                        pending.append((queue, thread))
+                    if not pending:
+                        break
+                    queue, thread = pending.popleft()
+                    yield from self.__consume(queue)
+                    thread.join()
+            else:
+                shared: Queue = Queue()
+                in_flight = 0
+                while True:
+                    while in_flight < self.max_in_flight:
+                        thread = self.__start(
+                            sources, shared, drain, stop, releases
+                        )
+                        if not thread:
+                            break
+                        in_flight += 1
+                    if not in_flight:
+                        break
+                    # Returns when any one pipeline is done
+                    yield from self.__consume(shared)
+                    in_flight -= 1
+        finally:
+            # Let pipelines blocked on an abandoned consumer finish
+            stop.set()
+            for release in list(releases):
+                release.set()
+
+
+class AsyncConcurrent(AsyncFileGenerator):
+    """Asyncio counterpart of Concurrent
+
+    Every source file gets its own pipeline through the generators, running
+    as a task on the event loop instead of on a thread.
+    """
+
+    def __init__(
+            self,
+            first_gen: AsyncFileGenerator,
+            *generators: AsyncFileGenerator,
+            max_in_flight: int = 4,
+            ordered: bool = True
+    ):
+        """
+
+        :param first_gen: first generator of the chain
+        :param generators: remaining generators of the chain
+        :param max_in_flight: max number of source files processed at once
+        :param ordered: yield files in the order of the source files,
+        otherwise files are yielded as soon as they are produced
+        """
+        super().__init__()
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.generators: List[AsyncFileGenerator] = [first_gen, *generators]
+        self.max_in_flight = max_in_flight
+        self.ordered = ordered
+
+    def __aiter__(self) -> AsyncIterator[File]:
+        return self.__run(drain=False)
+
+    async def aflush(self) -> None:
+        async for _ in self.__run(drain=True):
+            pass
+
+    def aflush_iter(self) -> AsyncIterator[File]:
+        return self.__run(drain=True)
+
+    def process(self, source: File, process_meta: File):  # type: ignore
+        raise NotImplementedError
+
+    def __pipeline(self, source: File) -> AsyncIterator[File]:
+        async def first() -> AsyncIterator[File]:
+            yield source
+
+        files: AsyncIterable[File] = first()
+        for gen in self.generators:
+            files = gen.aiterate(files)
+        return files.__aiter__()
+
+    async def __run_pipeline(self, source: File, queue: asyncio.Queue,
+                             drain: bool):
+        try:
+            async for f in self.__pipeline(source):
+                if drain:
+                    try:
+                        stream = f[Stream]
+                    except FileDataException:
+                        # aflush_iter only yields files with a stream
+                        continue
+                    await async_stream.flush(stream)
+                release = asyncio.Event()
+                await queue.put((f, release))
+                await release.wait()
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(_DONE)
+
+    async def __start(self, sources: AsyncIterator[File],
+                      queue: asyncio.Queue,
+                      drain: bool) -> Optional[asyncio.Future]:
+        try:
+            source = await sources.__anext__()
+        except StopAsyncIteration:
+            return None
+        return asyncio.ensure_future(
+            self.__run_pipeline(source, queue, drain)
+        )
+
+    @staticmethod
+    async def __consume(queue: asyncio.Queue) -> AsyncIterator[File]:
+        """Yields files from queue, until one pipeline is done"""
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            f, release = item
+            try:
+                yield f
+            finally:
+                release.set()
+
+    async def __run(self, drain: bool) -> AsyncIterator[File]:
+        sources = self.async_source_files()
+        tasks: List[asyncio.Future] = []
+        try:
+            if self.ordered:
+                pending: Deque[Tuple[asyncio.Queue, asyncio.Future]] = \
+                    deque()
+                while True:
+                    while len(pending) < self.max_in_flight:
+                        queue: asyncio.Queue = asyncio.Queue()
+                        task = await self.__start(sources, queue, drain)
+                        if not task:
+                            break
+                        tasks.append(task)
+                        pending.append((queue, task))
+                    if not pending:
+                        break
+                    queue, task = pending.popleft()
+                    async for f in self.__consume(queue):
+                        yield f
+                    await task
+                    tasks.remove(task)
+            else:
+                shared: asyncio.Queue = asyncio.Queue()
+                in_flight = 0
+                while True:
+                    while in_flight < self.max_in_flight:
+                        task = await self.__start(sources, shared, drain)
+                        if not task:
+                            break
+                        tasks.append(task)
+                        in_flight += 1
+                    if not in_flight:
+                        break
+                    # Returns when any one pipeline is done
+                    async for f in self.__consume(shared):
+                        yield f
+                    in_flight -= 1
+        finally:
+            # Pipelines abandoned by the consumer are cancelled
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
@@ -3,6 +3,7 @@ from fpipe.file.file import File
 from fpipe.gen.generator import FileGenerator
 from fpipe.meta.stream import Stream
 from fpipe.utils.const import PIPE_BUFFER_SIZE
+from fpipe.utils.sink import SinkStream
 
 
 class Flush(FileGenerator):
@@ -13,9 +14,22 @@ class Flush(FileGenerator):
     def process(self, source: File,
                 generated_meta_container: File):
         try:
-            stream_read = source[Stream].read
-            size = PIPE_BUFFER_SIZE
+            stream = source[Stream]
+        except FileDataException:
+            return
+
+        if isinstance(stream, SinkStream):
+            # Nothing to read, waits for the write and raises its error
+            stream.flush()
+            return
+
+        size = PIPE_BUFFER_SIZE
+        if hasattr(stream, 'readinto'):
+            # Drain into one reusable buffer instead of allocating per read
+            buffer = bytearray(size)
+            while stream.readinto(buffer):  # type: ignore
+                pass
+        else:
+            stream_read = stream.read
             while stream_read(size):
                 pass
-        except FileDataException:
-            pass
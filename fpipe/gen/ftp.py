@@ -1,29 +1,209 @@
+from collections import deque
+from threading import Thread
+from typing import Any, BinaryIO, Deque, Dict, Iterable, List, Optional, \
+    Tuple, Union
+
+from fpipe.exceptions import FileDataException
 from fpipe.file import File
-from fpipe.gen.generator import FileGenerator, FileGeneratorResponse
+from fpipe.gen.generator import FileGenerator, FileGeneratorResponse, \
+    MetaResolver
+from fpipe.meta.abstract import FileData
 from fpipe.meta.blocksize import BlockSize
 from fpipe.meta.host import Host
+from fpipe.meta.modified import Modified
 from fpipe.meta.password import Password
 from fpipe.meta.path import Path
 from fpipe.meta.port import Port
+from fpipe.meta.prefix import Prefix
+from fpipe.meta.size import Size
+from fpipe.meta.stream import Stream
 from fpipe.meta.username import Username
+from fpipe.utils.const import DEFAULT_FTP_BLOCK_SIZE, FTP_RESUME_WINDOW
 from fpipe.utils.ftp import FTPClient
+from fpipe.utils.ftp_pool import FTPConnectionPool, default_pool
+from fpipe.utils.meta import meta_prioritized
+from fpipe.utils.sink import SinkStream
 
 
 class FTP(FileGenerator):
+    """Downloads files from FTP, or uploads sources with a Stream
+
+    source or process_meta must provide metadata Host, Username, Password,
+    Port and Path or Prefix, BlockSize is optional. Files listed from a
+    Prefix get metadata Path, Size and Modified, with list_prefetch the
+    files following the one being read are downloaded at the same time.
+
+    A source with a Stream is uploaded to Path with STOR. The stream of the
+    output file is a SinkStream, flushing waits for the upload, Size is set
+    once it is complete.
+    """
+
+    def __init__(
+            self,
+            process_meta: Optional[
+                Union[Iterable[MetaResolver], MetaResolver]
+            ] = None,
+            pool: Optional[FTPConnectionPool] = None,
+            segments: int = 1,
+            segment_size: int = DEFAULT_FTP_BLOCK_SIZE,
+            list_workers: int = 1,
+            list_recursive: bool = False,
+            list_pattern: Optional[str] = None,
+            upload_retries: int = 0,
+            resume_window: int = FTP_RESUME_WINDOW,
+            list_prefetch: int = 0
+    ):
+        """
+        :param process_meta: MetaResolver to provider addition FileData
+        if source File does not provide everything needed
+        :param pool: connections reused between files, defaults to a pool
+        shared by all FTP generators
+        :param segments: segments of a file downloaded in parallel, with
+        REST, see FTPClient
+        :param segment_size: size of each segment
+        :param list_workers: directories of a Prefix listed at once, on
+        connections from pool, see fpipe.utils.ftp_list
+        :param list_recursive: files in subdirectories of a Prefix are
+        downloaded as well
+        :param list_pattern: fnmatch pattern, files of a Prefix with a name
+        not matching it are skipped
+        :param upload_retries: connections dropped during an upload that
+        are replaced, the upload is resumed with APPE
+        :param resume_window: bytes of an upload kept to be sent again on a
+        resume, see FTPClient.upload
+        :param list_prefetch: files of a Prefix downloaded ahead of the one
+        being read, each into a buffer of BlockSize. Bounded by the
+        connections pool keeps to the host, or max_connections when set,
+        so every transfer gets a connection without waiting
+        """
+        super().__init__(process_meta)
+        self.pool = pool
+        self.segments = segments
+        self.segment_size = segment_size
+        self.list_workers = list_workers
+        self.list_recursive = list_recursive
+        self.list_pattern = list_pattern
+        self.upload_retries = upload_retries
+        self.resume_window = resume_window
+        self.list_prefetch = list_prefetch
+
     def process(self,
                 source: File,
                 generated_meta_container: File):
+        def meta(t):
+            return meta_prioritized(t, generated_meta_container, source)
+
+        try:
+            block_size: Optional[int] = meta(BlockSize)
+        except FileDataException:
+            block_size = None
         ftp_client = FTPClient(
-            host=source[Host],
-            username=source[Username],
-            password=source[Password],
-            block_size=source[BlockSize],
-            port=source[Port]
-        )
-        thread, bytes_io = ftp_client.write_to_file_threaded(
-            source[Path]
+            host=meta(Host),
+            username=meta(Username),
+            password=meta(Password),
+            block_size=block_size,
+            port=meta(Port),
+            pool=self.pool or default_pool(),
+            segments=self.segments,
+            segment_size=self.segment_size
         )
+        try:
+            source_stream = source[Stream]
+        except FileDataException:
+            yield from self.__download(ftp_client, source)
+        else:
+            path = meta(Path)
+            sink = SinkStream()
+            yield FileGeneratorResponse(
+                File(
+                    stream=sink,
+                    parent=source,
+                    meta=(
+                        Path(path),
+                        Size(future=sink.future("Size", Size)),
+                    )
+                ),
+                Thread(
+                    target=self.__upload,
+                    args=(ftp_client, path, source_stream, sink),
+                    daemon=True,
+                    name=self.__class__.__name__,
+                )
+            )
+
+    def __upload(self, ftp_client: FTPClient, path: str, source: BinaryIO,
+                 sink: SinkStream):
+        try:
+            size = ftp_client.upload(
+                path,
+                source,
+                retries=self.upload_retries,
+                resume_window=self.resume_window
+            )
+        except BaseException as e:
+            # Raised by flush()
+            sink.finish(error=e)
+        else:
+            sink.finish(Size=size)
+
+    def __download(self, ftp_client: FTPClient, source: File):
+        try:
+            path = source[Path]
+        except FileDataException as e:
+            try:
+                prefix = source[Prefix]
+            except FileDataException as e2:
+                raise e2 from e
+            ahead = self.__prefetch(ftp_client)
+            fetching: Deque[Tuple[Dict[str, Any], Thread, BinaryIO]] = \
+                deque()
+            for entry in ftp_client.list_files(
+                    prefix,
+                    recursive=self.list_recursive,
+                    pattern=self.list_pattern,
+                    workers=self.list_workers
+            ):
+                thread, bytes_io = ftp_client.write_to_file_threaded(
+                    entry["path"]
+                )
+                thread.start()
+                fetching.append((entry, thread, bytes_io))
+                if len(fetching) > ahead:
+                    yield from self.__listed(source, *fetching.popleft())
+            while fetching:
+                yield from self.__listed(source, *fetching.popleft())
+        else:
+            thread, bytes_io = ftp_client.write_to_file_threaded(path)
+            yield FileGeneratorResponse(
+                File(stream=bytes_io, parent=source),
+                thread
+            )
+
+    def __prefetch(self, ftp_client: FTPClient) -> int:
+        """Files downloaded ahead, each transfer takes segments connections"""
+        pool = ftp_client.pool
+        if pool is None or self.list_prefetch <= 0:
+            return 0
+        connections = pool.max_connections
+        if connections is None:
+            connections = pool.host_limits.get(
+                ftp_client.host, pool.max_per_host
+            )
+        return max(min(
+            self.list_prefetch, connections // self.segments - 1
+        ), 0)
+
+    @staticmethod
+    def __listed(source: File, entry: Dict[str, Any], thread: Thread,
+                 bytes_io: BinaryIO):
+        meta: List[FileData] = [
+            Path(entry["path"]),
+            Size(entry["size"])
+        ]
+        if entry["modified"] is not None:
+            meta.append(Modified(entry["modified"]))
+        # Started already, joined once the file has been read
         yield FileGeneratorResponse(
-            File(stream=bytes_io, parent=source),
-            thread
+            File(stream=bytes_io, parent=source, meta=meta)
         )
+        thread.join()
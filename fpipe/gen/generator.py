@@ -1,7 +1,8 @@
+import asyncio
 from abc import abstractmethod
 from threading import Thread
 from typing import Callable, Optional, Generator, Iterator, Union, List, \
-    Iterable
+    Iterable, AsyncIterator
 
 from fpipe.exceptions import FileDataException
 from fpipe.file import File
@@ -67,6 +68,30 @@ class FileGenerator:
             except FileDataException:
                 pass
 
+    def __aiter__(self) -> AsyncIterator[File]:
+        return self.__iterate_in_executor(iter(self))
+
+    async def aflush(self) -> None:
+        """flush() on the default executor, for use with asyncio"""
+        await asyncio.get_event_loop().run_in_executor(None, self.flush)
+
+    def aflush_iter(self) -> AsyncIterator[File]:
+        """flush_iter() on the default executor, for use with asyncio"""
+        return self.__iterate_in_executor(self.flush_iter())
+
+    @staticmethod
+    async def __iterate_in_executor(
+            files: Iterator[File]
+    ) -> AsyncIterator[File]:
+        loop = asyncio.get_event_loop()
+        while True:
+            f: Optional[File] = await loop.run_in_executor(
+                None, next, files, None
+            )
+            if f is None:
+                break
+            yield f
+
     @property
     def source_files(self) -> Iterator[File]:
         for source in self.sources:
@@ -79,7 +104,17 @@ class FileGenerator:
                     yield s
 
     def __iter__(self) -> Iterator[Union[File, File]]:
-        for source in self.source_files:
+        return self.iterate(self.source_files)
+
+    def iterate(self, sources: Iterable[File]) -> Iterator[File]:
+        """
+        Runs process() for every file in sources, independent of the
+        sources chained to this generator.
+
+        :param sources: files to process
+        :return: the files produced
+        """
+        for source in sources:
             responses: Optional[
                 Generator[FileGeneratorResponse, None, None]
             ] = self.process(
@@ -1,3 +1,5 @@
+import datetime
+import os
 import threading
 from typing import Optional, Union, Iterable, BinaryIO
 
@@ -5,11 +7,15 @@ from fpipe.exceptions import FileDataException
 from fpipe.file.file import File
 from fpipe.gen.generator import FileGenerator, FileGeneratorResponse, \
     MetaResolver
+from fpipe.meta.modified import Modified
 from fpipe.meta.path import Path
+from fpipe.meta.size import Size
 from fpipe.meta.stream import Stream
 from fpipe.utils.bytesloop import BytesLoop
 from fpipe.utils.const import PIPE_BUFFER_SIZE
 from fpipe.utils.meta import meta_prioritized
+from fpipe.utils.pipe import splice, stream_fileno
+from fpipe.utils.sink import SinkStream
 
 
 class Local(FileGenerator):
@@ -17,16 +23,22 @@ class Local(FileGenerator):
             self,
             pass_through=False,
             process_meta: Optional[
-                Union[Iterable[MetaResolver], MetaResolver]] = None
+                Union[Iterable[MetaResolver], MetaResolver]] = None,
+            sink=False
     ):
         """
         :param pass_through: pass through the source instead of waiting for
         writes to complete
         :param process_meta: callable that can produce FileData
         needed by self.process()
+        :param sink: files written are not opened again, the stream of the
+        output files is a SinkStream, with Size and Modified of the file
         """
         super().__init__(process_meta)
+        if sink and pass_through:
+            raise ValueError("A sink can not pass through the source")
         self.pass_through = pass_through
+        self.sink = sink
 
     @staticmethod
     def __process_stream(
@@ -34,6 +46,11 @@ class Local(FileGenerator):
             byte_loop: Optional[BytesLoop] = None
     ):
         with open(path_name, "wb") as f2:
+            if not byte_loop:
+                # Pipes and regular files are copied inside the kernel
+                source_fd = stream_fileno(source_stream)
+                if source_fd is not None and splice(source_fd, f2.fileno()):
+                    return
             while True:
                 b = source_stream.read(PIPE_BUFFER_SIZE)
                 if byte_loop:
@@ -42,6 +59,24 @@ class Local(FileGenerator):
                 if not b:
                     break
 
+    @staticmethod
+    def __build_sink_file(path: str, parent: File) -> File:
+        stat = os.stat(path)
+        sink = SinkStream()
+        sink.finish(
+            Size=stat.st_size,
+            Modified=datetime.datetime.fromtimestamp(stat.st_mtime),
+        )
+        return File(
+            stream=sink,
+            parent=parent,
+            meta=(
+                Path(path),
+                Size(future=sink.future("Size", Size)),
+                Modified(future=sink.future("Modified", Modified)),
+            )
+        )
+
     def process(self, source: File, process_meta: File):
 
         path = meta_prioritized(
@@ -68,6 +103,11 @@ class Local(FileGenerator):
                     )
             else:
                 Local.__process_stream(source_stream, path)
+                if self.sink:
+                    yield FileGeneratorResponse(
+                        Local.__build_sink_file(path, source)
+                    )
+                    return
                 with open(path, "rb") as f:
                     yield FileGeneratorResponse(
                         File(stream=f, parent=source, meta=Path(path))
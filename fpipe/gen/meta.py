@@ -1,26 +1,36 @@
 import threading
-from typing import Type, Optional, Generator, Tuple
+from typing import Type, Optional, Generator, Tuple, AsyncIterator, \
+    BinaryIO, cast
 
 from fpipe.file.file import File
+from fpipe.gen.async_generator import AsyncFileGenerator, \
+    AsyncFileGeneratorResponse
 from fpipe.gen.generator import FileGenerator, FileGeneratorResponse
 from fpipe.meta.abstract import FileData
 from fpipe.meta.stream import Stream
+from fpipe.utils import async_stream
+from fpipe.utils.async_bytesloop import AsyncBytesLoop
 from fpipe.utils.bytesloop import BytesLoop
+from fpipe.utils.calculator_pool import CalculatorPool
 from fpipe.utils.const import PIPE_BUFFER_SIZE
 
 
 class Meta(FileGenerator):
     """Generator producing FileData by doing calculations on a File
     """
-    def __init__(self, *file_meta: Type[FileData]):
+    def __init__(self, *file_meta: Type[FileData],
+                 pool: Optional[CalculatorPool] = None):
         """
 
         :param file_meta: a FileData with a link to a FileDataCalculator
         through FileData.get_calculator()
+        :param pool: run the calculators in worker processes from pool
+        instead of on the thread reading the source
         """
         super().__init__()
         self.file_meta: Tuple[Type[FileData], ...] = file_meta
         self.bufsize = PIPE_BUFFER_SIZE
+        self.pool = pool
 
     def process(
             self,
@@ -32,6 +42,14 @@ class Meta(FileGenerator):
             None
         ]
     ]:
+        if self.pool:
+            return self.__process_in_pool(self.pool, source)
+        return self.__process_in_thread(source)
+
+    def __process_in_thread(
+            self,
+            source: File
+    ) -> Generator[FileGeneratorResponse, None, None]:
         buf_size = self.bufsize
 
         with BytesLoop(self.bufsize) as byte_loop:
@@ -69,3 +87,94 @@ class Meta(FileGenerator):
                 ),
                 proc_thread
             )
+
+    def __process_in_pool(
+            self,
+            pool: CalculatorPool,
+            source: File
+    ) -> Generator[FileGeneratorResponse, None, None]:
+        buf_size = self.bufsize
+        file_meta = [f for f in self.file_meta if f.get_calculator()]
+        file_data = [f() for f in file_meta]
+
+        with BytesLoop(self.bufsize) as byte_loop:
+            def write_to_pool():
+                source_reader = source[Stream].read
+                with pool.worker() as worker:
+                    worker.start(file_meta)
+                    while True:
+                        s = source_reader(buf_size)
+                        worker.write(s)
+                        if not s:
+                            break
+                        byte_loop.write(s)
+                    # Values are set before EOF reaches the reader
+                    for data, value in zip(file_data, worker.result()):
+                        data.value = value
+                byte_loop.write(b'')
+
+            proc_thread = threading.Thread(
+                target=write_to_pool,
+                name=f"{self.__class__.__name__}",
+                daemon=True,
+            )
+
+            yield FileGeneratorResponse(
+                File(
+                    stream=byte_loop,
+                    parent=source,
+                    meta=file_data,
+                ),
+                proc_thread
+            )
+
+
+class AsyncMeta(AsyncFileGenerator):
+    """Asyncio counterpart of Meta, calculations run on the event loop
+    """
+    def __init__(self, *file_meta: Type[FileData]):
+        """
+
+        :param file_meta: a FileData with a link to a FileDataCalculator
+        through FileData.get_calculator()
+        """
+        super().__init__()
+        self.file_meta: Tuple[Type[FileData], ...] = file_meta
+        self.bufsize = PIPE_BUFFER_SIZE
+
+    async def process(  # type: ignore
+            self,
+            source: File,
+            process_meta: File
+    ) -> AsyncIterator[AsyncFileGeneratorResponse]:
+        buf_size = self.bufsize
+
+        with AsyncBytesLoop(self.bufsize) as byte_loop:
+            mata_calculators = [
+                f.get_calculator() for f in self.file_meta
+            ]
+
+            meta_calculators_write = [
+                f.write for f in mata_calculators if f
+            ]
+
+            async def write_to_meta_calculators():
+                source_stream = source[Stream]
+                while True:
+                    s = await async_stream.read(source_stream, buf_size)
+                    for write in meta_calculators_write:
+                        write(s)
+                    await byte_loop.write(s)
+                    if not s:
+                        break
+
+            yield AsyncFileGeneratorResponse(
+                File(
+                    stream=cast(BinaryIO, byte_loop),
+                    parent=source,
+                    meta=(
+                        c.calculable for c in mata_calculators if c
+                    ),
+                ),
+                write_to_meta_calculators()
+            )
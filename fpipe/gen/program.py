@@ -1,14 +1,19 @@
+import asyncio
 import shlex
 import subprocess
 import threading
-from typing import Optional, Generator, Union, List, BinaryIO
+from typing import Optional, Generator, Union, List, BinaryIO, cast, \
+    AsyncIterator, Any
 
 from fpipe.exceptions import FileDataException
 from fpipe.file.file import File
+from fpipe.gen.async_generator import AsyncFileGenerator, \
+    AsyncFileGeneratorResponse
 from fpipe.gen.generator import FileGenerator, FileGeneratorResponse
 from fpipe.meta.stream import Stream
-from fpipe.utils.bytesloop import BytesLoop
+from fpipe.utils import async_stream
 from fpipe.utils.const import PIPE_BUFFER_SIZE
+from fpipe.utils.pipe import PipeStream, stream_fileno
 
 
 class Program(FileGenerator):
@@ -54,17 +59,6 @@ class Program(FileGenerator):
                 proc.stdin.close()
                 break
 
-    @staticmethod
-    def __stdout_to_file(byte_loop, proc, buf_size):
-        while True:
-            e = proc.stdout.read(buf_size)
-            # stats.w(e)
-            byte_loop.write(e)
-
-            if not e:
-                proc.stdout.close()  # EOF
-                break
-
     def process(
             self,
             source: File,
@@ -78,31 +72,136 @@ class Program(FileGenerator):
         except FileDataException:
             source_stream = None
 
-        with BytesLoop() as byte_loop:
-            with subprocess.Popen(
-                self.command,
-                stdin=subprocess.PIPE if source_stream else None,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE if self.std_err else subprocess.DEVNULL,
-                bufsize=buf_size
-            ) as proc:
-                threads = [
+        # Adjacent programs and regular files are connected to stdin
+        # directly, without passing data through python
+        stdin_fd = stream_fileno(source_stream) if source_stream else None
+
+        stdin: Optional[int]
+        if stdin_fd is not None:
+            stdin = stdin_fd
+        elif source_stream:
+            stdin = subprocess.PIPE
+        else:
+            stdin = None
+
+        with subprocess.Popen(
+            self.command,
+            stdin=stdin,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE if self.std_err else subprocess.DEVNULL,
+            bufsize=buf_size
+        ) as proc:
+            threads = []
+            if source_stream and stdin_fd is None:
+                threads.append(
                     threading.Thread(
-                        target=self.__stdout_to_file,
-                        args=(byte_loop, proc, buf_size),
-                        name=f"{self.__class__.__name__} STD-OUT",
+                        target=self.__std_in_to_cmd,
+                        args=(source_stream, proc, buf_size),
+                        name=f"{self.__class__.__name__} STD-IN",
                         daemon=True,
                     )
-                ]
-                if source_stream:
-                    threads.append(
-                        threading.Thread(
-                            target=self.__std_in_to_cmd,
-                            args=(source_stream, proc, buf_size),
-                            name=f"{self.__class__.__name__} STD-OUT",
-                            daemon=True,
-                        )
-                    )
-                yield FileGeneratorResponse(
-                    File(stream=byte_loop, parent=source), *threads
                 )
+            yield FileGeneratorResponse(
+                File(
+                    stream=PipeStream(cast(BinaryIO, proc.stdout)),
+                    parent=source
+                ),
+                *threads
+            )
+
+
+class AsyncProgram(AsyncFileGenerator):
+    """Asyncio counterpart of Program, stdin and stdout of the subprocess
+    are handled on the event loop instead of on threads
+    """
+
+    def __init__(
+            self,
+            command: Union[List[str], str],
+            buffer_size=PIPE_BUFFER_SIZE,
+            posix=True
+    ):
+        """
+        :param command: if a string is passed, shell
+        :param buffer_size: buffer_size for subprocess stdin and stdout
+        :param posix=True, used by shlex to determine how to parse command
+        """
+        super().__init__()
+
+        self.command = (
+            shlex.split(command, posix=posix)
+            if isinstance(command, str)
+            else command
+        )
+        self.buf_size = buffer_size
+
+    @staticmethod
+    async def __std_in_to_cmd(source_stream: Any, proc, buf_size):
+        try:
+            while True:
+                read_chunk = await async_stream.read(source_stream, buf_size)
+                if not read_chunk:  # EOF
+                    break
+                proc.stdin.write(read_chunk)
+                await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # Program exited without reading all of stdin
+            pass
+        finally:
+            proc.stdin.close()
+
+    async def process(  # type: ignore
+            self,
+            source: File,
+            generated_meta_container: File
+    ) -> AsyncIterator[AsyncFileGeneratorResponse]:
+        buf_size = self.buf_size
+
+        source_stream: Any
+        try:
+            source_stream = source[Stream]
+        except FileDataException:
+            source_stream = None
+
+        # Adjacent programs and regular files are connected to stdin
+        # directly, without passing data through python
+        stdin_fd = (
+            stream_fileno(source_stream)
+            if source_stream and not async_stream.is_async(source_stream)
+            else None
+        )
+
+        stdin: Optional[int]
+        if stdin_fd is not None:
+            stdin = stdin_fd
+        elif source_stream:
+            stdin = subprocess.PIPE
+        else:
+            stdin = None
+
+        proc = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=stdin,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            limit=buf_size
+        )
+
+        stdout = cast(asyncio.StreamReader, proc.stdout)
+        feeder = None
+        if source_stream and stdin_fd is None:
+            feeder = asyncio.ensure_future(
+                self.__std_in_to_cmd(source_stream, proc, buf_size)
+            )
+        try:
+            yield AsyncFileGeneratorResponse(
+                File(stream=cast(BinaryIO, stdout), parent=source)
+            )
+        finally:
+            if not stdout.at_eof():
+                # Output was abandoned, stop the program instead of
+                # waiting for it
+                proc.kill()
+            if feeder:
+                await feeder
+            await proc.wait()
@@ -1,16 +1,26 @@
+import hashlib
+import os
 from threading import Lock, Thread
-from typing import Optional, Generator, Union, Iterable, BinaryIO
+from typing import Optional, Generator, Union, Iterable, BinaryIO, \
+    Callable, Sequence, Dict, Any
 from fpipe.exceptions import FileException, FileDataException
 from fpipe.file import File
 from fpipe.gen.generator import FileGenerator, FileGeneratorResponse, \
     MetaResolver
-from fpipe.meta import Path, Version, Bucket, Prefix
+from fpipe.meta import Path, Version, Bucket, Prefix, Size, Mime, ETag
 from fpipe.meta.s3 import S3MetadataProducer
 from fpipe.meta.stream import Stream
+from fpipe.utils import s3_copy
+from fpipe.utils.const import S3_READ_CHUNK_SIZE, S3_COPY_PART_SIZE
 from fpipe.utils.meta import meta_prioritized
 from fpipe.utils.mime import guess_mime
+from fpipe.utils.s3_block_cache import S3BlockCache
+from fpipe.utils.s3_list import list_objects
 from fpipe.utils.s3_reader import S3FileReader
+from fpipe.utils.s3_upload_budget import S3UploadBudget
+from fpipe.utils.s3_upload_pool import S3UploadPool
 from fpipe.utils.s3_writer import S3FileWriter
+from fpipe.utils.sink import SinkStream
 
 
 class S3(FileGenerator):
@@ -26,7 +36,19 @@ class S3(FileGenerator):
             seekable=False,
             process_meta: Optional[
                 Union[Iterable[MetaResolver], MetaResolver]
-            ] = None
+            ] = None,
+            read_ahead: int = 0,
+            read_chunk_size: int = S3_READ_CHUNK_SIZE,
+            block_cache: Optional[S3BlockCache] = None,
+            upload_pool: Optional[S3UploadPool] = None,
+            memory_budget: Optional[S3UploadBudget] = None,
+            checkpoint_dir: Optional[str] = None,
+            server_side_copy: bool = True,
+            copy_part_size: int = S3_COPY_PART_SIZE,
+            list_workers: int = 1,
+            list_delimiter: Optional[str] = "/",
+            list_boundaries: Optional[Sequence[str]] = None,
+            sink: bool = False
     ):
         """
 
@@ -35,11 +57,49 @@ class S3(FileGenerator):
         :param seekable:
         :param process_meta: MetaResolver to provider addition FileData
         if source File does not provide everything needed
+        :param read_ahead: number of ranged GETs kept in flight while
+        reading an object, 0 reads objects with a single GET
+        :param read_chunk_size: size of each ranged GET
+        :param block_cache: cache shared between readers, objects are then
+        read with ranged GETs, see S3BlockCache
+        :param upload_pool: upload threads shared between objects written,
+        see S3UploadPool
+        :param memory_budget: bytes buffered for upload and not yet
+        uploaded, shared between objects written, see S3UploadBudget
+        :param checkpoint_dir: directory of upload checkpoints, failed
+        uploads are resumed by the next upload of the same object and
+        seekable sources skip what was uploaded
+        :param server_side_copy: sources that are S3 objects not yet read
+        from, with the same client, are copied within S3 instead of streamed
+        through this process
+        :param copy_part_size: objects larger than this are copied in
+        parts of this size, in parallel
+        :param list_workers: shards of a Prefix listed at once, objects are
+        then not in key order across shards, see fpipe.utils.s3_list
+        :param list_delimiter: shards are the common prefixes one delimiter
+        below Prefix
+        :param list_boundaries: sorted keys splitting the listing into
+        shards, used instead of list_delimiter
+        :param sink: objects written are not read back, the stream of the
+        output files is a SinkStream, flushing waits for the write. Size,
+        Version and ETag of the object are set once it is written
         """
         super().__init__(process_meta)
         self.client = client
         self.resource = resource
         self.seekable = seekable
+        self.read_ahead = read_ahead
+        self.read_chunk_size = read_chunk_size
+        self.block_cache = block_cache
+        self.upload_pool = upload_pool
+        self.memory_budget = memory_budget
+        self.checkpoint_dir = checkpoint_dir
+        self.server_side_copy = server_side_copy
+        self.copy_part_size = copy_part_size
+        self.list_workers = list_workers
+        self.list_delimiter = list_delimiter
+        self.list_boundaries = list_boundaries
+        self.sink = sink
 
     def process(
             self,
@@ -87,36 +147,68 @@ class S3(FileGenerator):
                 )
 
                 mime, encoding = guess_mime(key)
-                read_lock = Lock()
-                with S3FileReader(
+                size_hint: Optional[int]
+                try:
+                    size_hint = source[Size]
+                except FileDataException:
+                    # Size is often only known once the stream is read
+                    size_hint = None
+                copy_source = self.__copy_source(source_stream)
+                write: Callable[..., Dict[str, Any]]
+                if copy_source is not None:
+                    write = self.__copy_in_s3
+                    write_args: tuple = (
                         client,
-                        resource,
+                        copy_source,
                         bucket,
                         key,
-                        lock=read_lock,
-                        meta_lock=Lock(),
-                        seekable=self.seekable,
-                ) as reader:
-
-                    thread_args = (
+                        mime,
+                        self.copy_part_size,
+                    )
+                else:
+                    write = self.__write_to_s3
+                    write_args = (
                         client,
                         bucket,
                         key,
-                        reader,
-                        read_lock,
                         source_stream,
                         mime,
                         encoding,
+                        size_hint,
+                        self.upload_pool,
+                        self.memory_budget,
+                        self.__checkpoint(bucket, key),
                     )
+
+                if self.sink:
+                    sink = SinkStream()
                     yield FileGeneratorResponse(
-                        self.__build_output_file(reader, source),
-                        Thread(
-                            target=self.__write_to_s3,
-                            args=thread_args,
-                            daemon=True,
-                            name=self.__class__.__name__,
+                        self.__build_sink_file(sink, key, mime, source),
+                        self.__thread(
+                            self.__write_to_sink, sink, write, *write_args
                         ),
                     )
+                else:
+                    read_lock = Lock()
+                    with S3FileReader(
+                            client,
+                            resource,
+                            bucket,
+                            key,
+                            lock=read_lock,
+                            meta_lock=Lock(),
+                            seekable=self.seekable,
+                            cache_size=self.read_chunk_size,
+                            read_ahead=self.read_ahead,
+                            block_cache=self.block_cache,
+                    ) as reader:
+                        yield FileGeneratorResponse(
+                            self.__build_output_file(reader, source),
+                            self.__thread(
+                                self.__write_to_reader, reader, read_lock,
+                                write, *write_args
+                            ),
+                        )
             except FileDataException:
                 try:
                     version = meta_prioritized(
@@ -134,15 +226,32 @@ class S3(FileGenerator):
                         key,
                         version=version if version else None,
                         seekable=self.seekable,
+                        cache_size=self.read_chunk_size,
+                        read_ahead=self.read_ahead,
+                        block_cache=self.block_cache,
                 ) as reader:
                     yield FileGeneratorResponse(
                         self.__build_output_file(reader, source)
                     )
         elif prefix:
-            for o in self.__list_objects(client, bucket, prefix):
+            for o in list_objects(
+                    client, bucket, prefix,
+                    workers=self.list_workers,
+                    delimiter=self.list_delimiter,
+                    boundaries=self.list_boundaries,
+            ):
                 with S3FileReader(
                         client, resource, bucket, o["Key"],
-                        seekable=self.seekable
+                        seekable=self.seekable,
+                        # Listing saves a HEAD request per object
+                        object_info={
+                            "ContentLength": o["Size"],
+                            "ETag": o["ETag"],
+                            "LastModified": o["LastModified"],
+                        },
+                        cache_size=self.read_chunk_size,
+                        read_ahead=self.read_ahead,
+                        block_cache=self.block_cache,
                 ) as reader:
                     yield FileGeneratorResponse(
                         self.__build_output_file(reader, source)
@@ -162,59 +271,140 @@ class S3(FileGenerator):
             parent=parent
         )
 
+    def __checkpoint(self, bucket: str, key: str) -> Optional[str]:
+        if not self.checkpoint_dir:
+            return None
+        name = hashlib.sha1(f"{bucket}/{key}".encode()).hexdigest()
+        return os.path.join(self.checkpoint_dir, name)
+
+    def __copy_source(self, source: BinaryIO) -> Optional[S3FileReader]:
+        if not self.server_side_copy or not isinstance(source, S3FileReader):
+            return None
+        # Only a reader nothing was read from is the object as it is
+        if source.offset or source.bytes_received or source.obj_body:
+            return None
+        # A copy is made with the credentials of this client, the source
+        # may only be readable by its own
+        if source.s3_client is not self.client:
+            return None
+        return source
+
     @staticmethod
-    def __write_to_s3(
+    def __copy_in_s3(
+            client,
+            source: S3FileReader,
+            bucket: str,
+            path: str,
+            mime: str,
+            part_size: int,
+    ) -> Dict[str, Any]:
+        if source.locked:
+            # Waits for the source object to be written
+            source._unlock()
+        size = source.size()
+        response = s3_copy.copy(
             client,
+            source.bucket,
+            source.key,
+            size,
             bucket,
             path,
-            reader,
-            read_lock,
-            source: BinaryIO,
-            mime: str,
-            encoding: str,
-    ):
+            mime,
+            version=source.version,
+            e_tag=source.e_tag,
+            part_size=part_size,
+        )
+        return {
+            "ContentLength": size,
+            "VersionId": response.get("VersionId"),
+            "ETag": response.get(
+                "ETag", response.get("CopyObjectResult", {}).get("ETag")
+            ),
+        }
+
+    def __thread(self, target: Callable, *args) -> Thread:
+        return Thread(
+            target=target,
+            args=args,
+            daemon=True,
+            name=self.__class__.__name__,
+        )
+
+    @staticmethod
+    def __write_to_reader(reader: S3FileReader, read_lock: Lock,
+                          write: Callable[..., Dict[str, Any]], *args):
         try:
-            with S3FileWriter(client, bucket, path, mime) as writer:
-                while True:
-                    b = source.read(writer.buffer.chunk_size)
-                    # self.stats.w(b)
-                    writer.write(b)
-                    if not b:
-                        break
-            if writer.mpu_res:
-                reader.version = writer.mpu_res.get("VersionId")
-            else:
-                raise FileException
-            # TODO: Exception from thread should be thrown on main thread
-            # before pipe reaches reader and throws
-            # FileException("Could not locate S3 object....")
+            reader.version = write(*args).get("VersionId")
         finally:
             # Release reader when we are done writing, or writing failed
             read_lock.release()
 
     @staticmethod
-    def __list_objects(
-            client, bucket: str, prefix: str = None, use_generator: bool = True
-    ):
-        """
-        Get all objects as a generator.
-        :param client: boto3 s3 client
-        :param bucket: Bucket name
-        :param prefix: Object prefix
-        :param use_generator: Use generator
-        :return: generator or list
-        """
-
-        args = {"Bucket": bucket}
-        if prefix is not None:
-            args["Prefix"] = prefix
+    def __write_to_sink(sink: SinkStream,
+                        write: Callable[..., Dict[str, Any]], *args):
+        try:
+            response = write(*args)
+        except BaseException as e:
+            # Raised by flush()
+            sink.finish(error=e)
+        else:
+            sink.finish(
+                **{k: v for k, v in response.items() if v is not None}
+            )
 
-        paginator = client.get_paginator("list_objects_v2")
-        page_iterator = paginator.paginate(**args)
+    @staticmethod
+    def __build_sink_file(sink: SinkStream, key: str, mime: str,
+                          parent: Optional[File] = None):
+        return File(
+            stream=sink,
+            meta=(
+                Path(key),
+                Mime(mime),
+                Size(future=sink.future("ContentLength", Size)),
+                Version(future=sink.future("VersionId", Version)),
+                ETag(future=sink.future("ETag", ETag)),
+            ),
+            parent=parent
+        )
 
-        def get_generator():
-            for page in page_iterator:
-                for item in page["Contents"]:
-                    yield item
+    @staticmethod
+    def __seekable(source: BinaryIO) -> bool:
+        try:
+            return source.seekable()
+        except NotImplementedError:
+            return False
 
-        return get_generator() if use_generator else list(get_generator())
+    @staticmethod
+    def __write_to_s3(
+            client,
+            bucket,
+            path,
+            source: BinaryIO,
+            mime: str,
+            encoding: str,
+            size_hint: Optional[int],
+            upload_pool: Optional[S3UploadPool],
+            memory_budget: Optional[S3UploadBudget],
+            checkpoint: Optional[str],
+    ) -> Dict[str, Any]:
+        with S3FileWriter(client, bucket, path, mime,
+                          size_hint=size_hint,
+                          upload_pool=upload_pool,
+                          memory_budget=memory_budget,
+                          checkpoint=checkpoint) as writer:
+            if writer.resume_offset and S3.__seekable(source):
+                source.seek(writer.resume_offset)
+                writer.seek(writer.resume_offset)
+            while True:
+                # Parts grow with the upload, reads do not
+                b = source.read(S3FileWriter.MIN_BLOCK_SIZE)
+                # self.stats.w(b)
+                writer.write(b)
+                if not b:
+                    break
+        if not writer.mpu_res:
+            raise FileException
+        # TODO: Exception from thread should be thrown on main thread
+        # before pipe reaches reader and throws
+        # FileException("Could not locate S3 object....")
+        return dict(writer.mpu_res, ContentLength=writer.tell())
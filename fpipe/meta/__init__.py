@@ -1,6 +1,7 @@
 from .blocksize import BlockSize  # noqa:F401
 from .bucket import Bucket  # noqa:F401
 from .checksum import MD5  # noqa:F401
+from .etag import ETag  # noqa:F401
 from .host import Host  # noqa:F401
 from .mime import Mime  # noqa:F401
 from .modified import Modified  # noqa:F401
@@ -0,0 +1,5 @@
+from fpipe.meta.abstract import FileData
+
+
+class ETag(FileData[str]):
+    pass
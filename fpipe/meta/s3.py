@@ -1,6 +1,7 @@
 from typing import Iterable, Type
 from fpipe.exceptions import FileDataException
 from fpipe.meta import Version
+from fpipe.meta.etag import ETag
 from fpipe.meta.modified import Modified
 from fpipe.meta.mime import Mime
 from fpipe.meta.path import Path
@@ -12,7 +13,6 @@ from fpipe.utils.s3_reader import S3FileReader
 class S3MetadataProducer:
     def __init__(self, reader: S3FileReader):
         self.reader = reader
-        self.__s3_obj = None
         self.bucket = reader.bucket
         self.path = reader.key
 
@@ -24,23 +24,16 @@ class S3MetadataProducer:
         yield Size(future=self.__future("ContentLength", Size))
         yield Modified(future=self.__future("LastModified", Modified))
         yield Mime(future=self.__future("ContentType", Mime))
+        yield ETag(future=self.__future("ETag", ETag))
 
     def __get_metadata(self, lock, key: str, value_class):
-        if lock.locked():
+        if lock and lock.locked():
+            raise FileDataException(value_class)
+        # Reuses the HEAD response the reader was initialized with
+        try:
+            return self.reader.object_info(key)
+        except KeyError:
             raise FileDataException(value_class)
-        self.__s3_obj = self.__s3_obj or self.reader.s3_client.get_object(
-            Bucket=self.reader.bucket,
-            Key=self.reader.key,
-            **(
-                {"VersionId": self.reader.version}
-                if self.reader.version
-                else {}
-            ),
-        )
-        if self.__s3_obj:
-            return self.__s3_obj[key]
-        else:
-            raise FileDataException(value_class)  # TODO: improve
 
     def __future(self, key_name, value_class: Type):
         lock = self.reader.meta_lock
@@ -0,0 +1,122 @@
+import asyncio
+from collections import deque
+from typing import Deque, Optional, Union, List
+
+from fpipe.utils.const import PIPE_BUFFER_SIZE
+
+
+class AsyncBytesLoop:
+    """Asyncio counterpart of BytesLoop, connecting a writer and a reader task
+
+    Both sides run on the same event loop, so chunks written as bytes are
+    queued by reference instead of being copied. The writer is suspended
+    once buf_size bytes are queued (high water mark) and resumed when the
+    reader has drained it down to low_water_mark.
+    """
+
+    def __init__(self,
+                 buf_size: int = PIPE_BUFFER_SIZE,
+                 low_water_mark: Optional[int] = None):
+        """
+        :param buf_size: bytes queued before the writer is suspended
+        :param low_water_mark: queued bytes a suspended writer waits for,
+        defaults to half of buf_size
+        """
+        self.__buf_size = buf_size
+        self.__low_water_mark = (
+            buf_size // 2 if low_water_mark is None else low_water_mark
+        )
+        self.__chunks: Deque[bytes] = deque()
+        self.__offset = 0  # Bytes already read from the first chunk
+        self.__size = 0
+        self.__done = False
+        self.__closed = False
+        self.__reader: Optional[asyncio.Future] = None
+        self.__writer: Optional[asyncio.Future] = None
+
+    @staticmethod
+    def __wake(waiter: Optional[asyncio.Future]):
+        if waiter and not waiter.done():
+            waiter.set_result(None)
+
+    async def write(self, s: Union[bytes, bytearray, memoryview]) -> int:
+        data_len = len(s)
+        if not data_len:
+            self.__done = True  # EOF
+            self.__wake(self.__reader)
+            return 0
+
+        if self.__size >= self.__buf_size:
+            self.__writer = asyncio.get_event_loop().create_future()
+            await self.__writer
+            self.__writer = None
+
+        # bytes are immutable, anything else is copied
+        self.__chunks.append(s if isinstance(s, bytes) else bytes(s))
+        self.__size += data_len
+        self.__wake(self.__reader)
+        return data_len
+
+    async def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            chunks: List[bytes] = []
+            while True:
+                chunk = await self.read(self.__buf_size)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+
+        while not self.__chunks:
+            if self.__done or not n:
+                return b''
+            self.__reader = asyncio.get_event_loop().create_future()
+            await self.__reader
+            self.__reader = None
+
+        first = self.__chunks[0]
+        offset = self.__offset
+        size = min(n, len(first) - offset)
+        if not offset and size == len(first):
+            chunk = first
+        else:
+            chunk = bytes(memoryview(first)[offset:offset + size])
+
+        if offset + size == len(first):
+            self.__chunks.popleft()
+            self.__offset = 0
+        else:
+            self.__offset += size
+        self.__size -= size
+
+        if self.__size <= self.__low_water_mark:
+            self.__wake(self.__writer)
+        return chunk
+
+    async def flush(self) -> None:
+        while await self.read(self.__buf_size):
+            pass
+
+    def close(self) -> None:
+        self.__chunks.clear()
+        self.__size = 0
+        self.__closed = True
+
+    @property
+    def closed(self) -> bool:
+        return self.__closed
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def __enter__(self) -> "AsyncBytesLoop":
+        return self
+
+    def __exit__(self, t, value, traceback) -> bool:
+        self.close()
+        return t is None
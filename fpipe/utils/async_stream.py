@@ -0,0 +1,26 @@
+import asyncio
+from typing import Any
+
+from fpipe.utils.const import PIPE_BUFFER_SIZE
+
+
+def is_async(stream: Any) -> bool:
+    """True if stream.read() is a coroutine, e.g. AsyncBytesLoop or
+    asyncio.StreamReader"""
+    return asyncio.iscoroutinefunction(getattr(stream, 'read', None))
+
+
+async def read(stream: Any, n: int = -1) -> bytes:
+    """Reads from async streams directly, blocking streams are read on the
+    default executor so the event loop is not blocked"""
+    if is_async(stream):
+        chunk: bytes = await stream.read(n)
+        return chunk
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, stream.read, n)
+
+
+async def flush(stream: Any) -> None:
+    """Reads stream until it is empty"""
+    while await read(stream, PIPE_BUFFER_SIZE):
+        pass
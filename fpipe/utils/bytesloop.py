@@ -1,4 +1,4 @@
-from threading import Event
+from threading import Condition
 from typing import Optional, Type, Iterator, AnyStr, Iterable, List, \
     BinaryIO, Union
 
@@ -6,35 +6,78 @@ from fpipe.utils.const import PIPE_BUFFER_SIZE
 
 
 class BytesLoop(BinaryIO):
+    """Fixed capacity ring buffer connecting one writer and one reader thread
+
+    Memory for the buffer is allocated once, data is copied in and out of it
+    through memoryview slices, so every byte is copied exactly once on write
+    and once on read. Positions in the ring are derived from the byte
+    counters, which are only ever updated by their owning thread.
+
+    The writer fills the buffer until it holds buf_size bytes (high water
+    mark), it is then woken once the reader has drained it down to
+    low_water_mark. The reader is woken as soon as any data is available.
+    """
+
     def __init__(self,
-                 buf_size: int = PIPE_BUFFER_SIZE):
-        self.__buffer = bytearray()
+                 buf_size: int = PIPE_BUFFER_SIZE,
+                 low_water_mark: Optional[int] = None):
+        """
+        :param buf_size: capacity of the buffer, the high water mark
+        :param low_water_mark: fill level a blocked writer waits for,
+        defaults to half of buf_size
+        """
         self.__buf_size: int = buf_size
+        self.__low_water_mark: int = (
+            buf_size // 2 if low_water_mark is None
+            else min(max(low_water_mark, 0), buf_size - 1)
+        )
+        self.__buffer = bytearray(buf_size)
+        self.__view = memoryview(self.__buffer)
         self.__done = False
         self.__closed = False
         self.__bytes_written = 0
         self.__bytes_read = 0
 
-        self.read_ready = Event()
-        self.write_ready = Event()
-        self.write_ready.set()
+        self.__cond = Condition()
+        self.__reader_waiting = False
+        self.__writer_waiting = False
+
+    def __wait_readable(self) -> int:
+        """Blocks until data is available, returns 0 on EOF"""
+        with self.__cond:
+            while True:
+                available = self.__bytes_written - self.__bytes_read
+                if available or self.__done:
+                    return available
+                self.__reader_waiting = True
+                self.__cond.wait()
+                self.__reader_waiting = False
+
+    def __consumed(self, size: int):
+        with self.__cond:
+            self.__bytes_read += size
+            if self.__writer_waiting and (
+                    self.__bytes_written - self.__bytes_read
+                    <= self.__low_water_mark
+            ):
+                self.__cond.notify()
 
     def __read_chunk(self, n=-1) -> bytes:
-        chunk = b''
-        while not self.__done or self.__bytes_written > self.__bytes_read:
-
-            self.read_ready.wait()
-
-            chunk = self.__buffer[:n] if n > 0 else self.__buffer[:]
-            try:
-                if chunk:
-                    chunk_len = len(chunk)
-                    del self.__buffer[:chunk_len]
-                    self.__bytes_read += chunk_len
-                    return chunk
-            finally:
-                self.read_ready.clear()
-                self.write_ready.set()
+        available = self.__wait_readable()
+        if not available:
+            return b''
+
+        buf_size = self.__buf_size
+        view = self.__view
+        size = min(available, n) if n > 0 else available
+        start = self.__bytes_read % buf_size
+        end = start + size
+        if end <= buf_size:
+            chunk = bytes(view[start:end])
+        else:
+            chunk = b''.join((view[start:], view[:end - buf_size]))
+
+        self.__consumed(size)
         return chunk
 
     def read(self, n=-1) -> bytes:
@@ -42,58 +85,103 @@ class BytesLoop(BinaryIO):
         if n > 0:
             return chunk
 
-        ret = chunk
+        chunks = []
         while chunk:
+            chunks.append(chunk)
             chunk = self.__read_chunk(n)
-            ret += chunk
-        return ret
+        return b''.join(chunks)
 
-    def write(self, s: Union[bytes, bytearray]) -> int:
-        data_len = len(s)
+    def readinto(self, b: Union[bytearray, memoryview]) -> int:
+        """Reads available data, up to len(b) bytes, directly into b
 
-        if not isinstance(s, bytearray):
-            s = bytearray(s)
+        :param b: a writable bytes-like object
+        :return: number of bytes read, 0 on EOF
+        """
+        target = memoryview(b).cast('B')
+        n = len(target)
+        if not n:
+            return 0
 
-        self.__bytes_written += data_len
-        if not data_len:
-            self.__done = True  # EOF
-            self.write_ready.clear()
-            self.read_ready.set()
+        available = self.__wait_readable()
+        if not available:
             return 0
 
-        while True:
-            self.write_ready.wait()
+        buf_size = self.__buf_size
+        view = self.__view
+        size = min(available, n)
+        start = self.__bytes_read % buf_size
+        end = start + size
+        if end <= buf_size:
+            target[:size] = view[start:end]
+        else:
+            split = buf_size - start
+            target[:split] = view[start:]
+            target[split:size] = view[:end - buf_size]
+
+        self.__consumed(size)
+        return size
+
+    def __wait_writable(self) -> int:
+        """Blocks while the buffer is full, returns free space"""
+        buf_size = self.__buf_size
+        with self.__cond:
+            fill = self.__bytes_written - self.__bytes_read
+            if fill < buf_size:
+                return buf_size - fill
+            while fill > self.__low_water_mark:
+                self.__writer_waiting = True
+                self.__cond.wait()
+                self.__writer_waiting = False
+                fill = self.__bytes_written - self.__bytes_read
+            return buf_size - fill
 
-            remaining_buffer = self.__buf_size - len(self.__buffer)
-            chunk_length = min(remaining_buffer, data_len)
+    def write(self, s: Union[bytes, bytearray]) -> int:
+        data_len = len(s)
 
-            if chunk_length == data_len:
-                self.__buffer += s
-                break
-            else:
-                chunk = s[:remaining_buffer]
-                del s[:chunk_length]
-                data_len -= chunk_length
-                self.__buffer += chunk
+        if not data_len:
+            with self.__cond:
+                self.__done = True  # EOF
+                self.__cond.notify_all()
+            return 0
 
-            self.write_ready.clear()
-            self.read_ready.set()
+        buf_size = self.__buf_size
+        view = self.__view
+        data = memoryview(s).cast('B')
+        offset = 0
+        while offset < data_len:
+            free = self.__wait_writable()
+            size = min(free, data_len - offset)
+            start = self.__bytes_written % buf_size
+            end = start + size
+            if end <= buf_size:
+                view[start:end] = data[offset:offset + size]
+            else:
+                split = offset + buf_size - start
+                view[start:] = data[offset:split]
+                view[:end - buf_size] = data[split:offset + size]
+            offset += size
+
+            with self.__cond:
+                self.__bytes_written += size
+                if self.__reader_waiting:
+                    self.__cond.notify()
         return data_len
 
     def __enter__(self) -> BinaryIO:
         return self
 
     def close(self) -> None:
-        self.__buffer.clear()
-        self.__bytes_read = 0
-        self.__bytes_written = 0
-        self.__closed = True
+        with self.__cond:
+            self.__bytes_read = 0
+            self.__bytes_written = 0
+            self.__closed = True
 
     def fileno(self) -> int:
         raise NotImplementedError
 
     def flush(self) -> None:
-        while self.read(self.__buf_size):
+        buffer = bytearray(self.__buf_size)
+        while self.readinto(buffer):
             pass
 
     def isatty(self) -> bool:
@@ -0,0 +1,132 @@
+import multiprocessing
+import os
+import threading
+from contextlib import contextmanager
+from multiprocessing.connection import Connection
+from queue import Queue
+from typing import List, Optional, Type, Sequence, Iterator, Any, Union
+
+from fpipe.exceptions import FileDataException
+from fpipe.meta.abstract import FileData
+
+
+def _work(conn: Connection):
+    """Worker process loop, runs calculators for one stream at a time"""
+    while True:
+        file_meta = conn.recv()
+        if file_meta is None:
+            break
+        calculators = [f.get_calculator() for f in file_meta]
+        while True:
+            chunk = conn.recv_bytes()
+            for c in calculators:
+                c.write(chunk)
+            if not chunk:
+                break
+
+        values = []
+        for c in calculators:
+            try:
+                values.append(c.calculable.value)
+            except FileDataException:
+                values.append(None)
+        conn.send(values)
+    conn.close()
+
+
+class CalculatorWorker:
+    """Parent side of a worker process, see CalculatorPool"""
+
+    def __init__(self, context):
+        self.__conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_work,
+            args=(child_conn,),
+            name=self.__class__.__name__,
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def start(self, file_meta: Sequence[Type[FileData]]):
+        self.__conn.send(list(file_meta))
+
+    def write(self, s: Union[bytes, bytearray]):
+        self.__conn.send_bytes(s)
+
+    def result(self) -> List[Any]:
+        """Values calculated, in the order of file_meta passed to start()"""
+        values: List[Any] = self.__conn.recv()
+        return values
+
+    def stop(self):
+        try:
+            self.__conn.send(None)
+        except OSError:
+            pass
+        self.__conn.close()
+        self.process.join()
+
+
+class CalculatorPool:
+    """Pool of processes running FileDataCalculators off the GIL
+
+    Each stream is leased a worker process for its full length, chunks are
+    sent to it through a pipe and the calculated values are sent back once
+    the stream ends. Pays off for calculators that are CPU bound in python,
+    the data is copied once more through the pipe.
+
+    FileData classes must be importable by the worker processes.
+    """
+
+    def __init__(self, processes: Optional[int] = None):
+        """
+        :param processes: max number of worker processes, defaults to the
+        number of CPUs
+        """
+        self.processes: int = processes or os.cpu_count() or 1
+        self.__context = multiprocessing.get_context()
+        self.__idle: Queue = Queue()
+        self.__workers: List[CalculatorWorker] = []
+        self.__lock = threading.Lock()
+
+    def __new_worker(self) -> CalculatorWorker:
+        worker = CalculatorWorker(self.__context)
+        self.__workers.append(worker)
+        return worker
+
+    def __acquire(self) -> CalculatorWorker:
+        with self.__lock:
+            if self.__idle.empty() and len(self.__workers) < self.processes:
+                return self.__new_worker()
+        worker: CalculatorWorker = self.__idle.get()
+        return worker
+
+    @contextmanager
+    def worker(self) -> Iterator[CalculatorWorker]:
+        """Leases a worker process, blocks while all workers are busy"""
+        worker = self.__acquire()
+        try:
+            yield worker
+        except BaseException:
+            # Worker is in an unknown state, replace it
+            worker.process.terminate()
+            worker.process.join()
+            with self.__lock:
+                self.__workers.remove(worker)
+                self.__idle.put(self.__new_worker())
+            raise
+        self.__idle.put(worker)
+
+    def close(self):
+        with self.__lock:
+            for worker in self.__workers:
+                worker.stop()
+            self.__workers.clear()
+
+    def __enter__(self) -> "CalculatorPool":
+        return self
+
+    def __exit__(self, t, value, traceback) -> bool:
+        self.close()
+        return t is None
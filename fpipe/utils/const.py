@@ -3,3 +3,6 @@ import sys
 EPSILON = sys.float_info.epsilon
 PIPE_BUFFER_SIZE = 2 ** 14
 DEFAULT_FTP_BLOCK_SIZE = 2 ** 23
+S3_READ_CHUNK_SIZE = 5 * 2 ** 20
+S3_COPY_PART_SIZE = 2 ** 28
+FTP_RESUME_WINDOW = 2 ** 24
@@ -2,11 +2,21 @@ import ftplib
 from pyftpdlib import log as pyftpdlib_log
 
 import logging
+import socket
+import sys
 import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import ExitStack
 
-from typing import BinaryIO, Optional
+from typing import BinaryIO, Optional, ContextManager, Dict, Any, Deque, \
+    Iterator, Tuple
 
+from fpipe.exceptions import FileException
 from fpipe.utils.bytesloop import BytesLoop
+from fpipe.utils.const import DEFAULT_FTP_BLOCK_SIZE, FTP_RESUME_WINDOW
+from fpipe.utils.ftp_list import list_files
+from fpipe.utils.ftp_pool import FTPConnectionPool
 
 
 class FTPClient(object):
@@ -19,7 +29,10 @@ class FTPClient(object):
             timeout: Optional[int] = None,
             port: int = 21,
             ftplib_log_level: int = 0,
-            pyftpdlib_log_level: int = logging.WARNING
+            pyftpdlib_log_level: int = logging.WARNING,
+            pool: Optional[FTPConnectionPool] = None,
+            segments: int = 1,
+            segment_size: int = DEFAULT_FTP_BLOCK_SIZE
     ):
         """
 
@@ -31,6 +44,13 @@ class FTPClient(object):
         :param timeout: idle timeout of ftp server
         :param ftplib_log_level: log level for ftplib library
         :param pyftpdlib_log_level: log level for pyftpdlib
+        :param pool: reuses logged in connections, a new connection is
+        made for each transfer when not set
+        :param segments: segments of a file downloaded at once, each with
+        REST on its own connection. Files are downloaded with a single RETR
+        when the server does not support SIZE and REST
+        :param segment_size: size of each segment, segments are kept in
+        memory until they are written in order
         """
         self.host: str = host
         self.port: int = port
@@ -39,6 +59,10 @@ class FTPClient(object):
         self.timeout: int = timeout or 60
         self.blocksize: Optional[int] = block_size
         self.md5: Optional[str] = None
+        self.ftplib_log_level = ftplib_log_level
+        self.pool = pool
+        self.segments = segments
+        self.segment_size = segment_size
 
         self.ftp = ftplib.FTP(user=self.user, passwd=self.passwd)
 
@@ -50,6 +74,41 @@ class FTPClient(object):
         self.ftp.login()
         return self.ftp
 
+    def _new_session(self) -> ftplib.FTP:
+        ftp = ftplib.FTP()
+        ftp.set_debuglevel(self.ftplib_log_level)
+        ftp.connect(host=self.host, port=self.port, timeout=self.timeout)
+        ftp.login(user=self.user, passwd=self.passwd)
+        return ftp
+
+    def session(
+            self, pool: Optional[FTPConnectionPool] = None
+    ) -> ContextManager[ftplib.FTP]:
+        """Logged in connection, from pool or self.pool when set"""
+        pool = pool or self.pool
+        if pool is None:
+            session: ContextManager[ftplib.FTP] = self._get_session()
+            return session
+        return pool.session(
+            self.host, self.port, self.user, self._new_session
+        )
+
+    def list_files(
+            self,
+            path: str,
+            recursive: bool = False,
+            pattern: Optional[str] = None,
+            workers: int = 1
+    ) -> Iterator[Dict[str, Any]]:
+        """Files of directory path, see fpipe.utils.ftp_list.list_files"""
+        return list_files(
+            self.session, path,
+            recursive=recursive,
+            pattern=pattern,
+            # Without a pool there is a single connection to share
+            workers=workers if self.pool else 1
+        )
+
     def write_to_file_threaded(self, path):
         with BytesLoop(self.blocksize) as bytes_io:
             thread = threading.Thread(
@@ -58,11 +117,23 @@ class FTPClient(object):
             return thread, bytes_io
 
     def write_to_file(self, path: str, bytes_io: BinaryIO):
-        with self._get_session() as ftp:
+        if self.segments > 1:
+            # Segments need a connection each, pooled for the transfer
+            pool = self.pool or FTPConnectionPool(max_per_host=self.segments)
+            try:
+                size = self.__segmented_size(pool, path)
+                if size is not None:
+                    self.__write_segments(pool, path, size, bytes_io)
+                    return self.md5, None
+            finally:
+                if pool is not self.pool:
+                    pool.close()
+
+        with self.session() as ftp:
             exception = None
-            kwargs = dict(cmd="RETR " + path,
-                          callback=bytes_io.write,
-                          blocksize=self.blocksize)
+            kwargs: Dict[str, Any] = dict(cmd="RETR " + path,
+                                          callback=bytes_io.write,
+                                          blocksize=self.blocksize)
 
             ftp.retrbinary(
                 **{k: v for k, v in kwargs.items() if v is not None}
@@ -70,3 +141,202 @@ class FTPClient(object):
             bytes_io.write(b"")
 
             return self.md5, exception
+
+    def __segmented_size(
+            self, pool: FTPConnectionPool, path: str
+    ) -> Optional[int]:
+        """Size of path, None if it is not worth or possible to segment"""
+        with self.session(pool) as ftp:
+            try:
+                ftp.voidcmd("TYPE I")
+                size = ftp.size(path)
+                # Marker is only used by the next RETR, 0 changes nothing
+                ftp.sendcmd("REST 0")
+            except ftplib.error_perm:
+                return None
+        if size is None or size <= self.segment_size:
+            return None
+        return size
+
+    def __write_segments(self, pool: FTPConnectionPool, path: str,
+                         size: int, bytes_io: BinaryIO):
+        offsets = iter(range(0, size, self.segment_size))
+        with ThreadPoolExecutor(self.segments) as executor:
+            pending: Deque[Future] = deque()
+
+            def fetch_next():
+                offset = next(offsets, None)
+                if offset is not None:
+                    pending.append(executor.submit(
+                        self.__read_segment, pool, path, offset,
+                        min(self.segment_size, size - offset)
+                    ))
+
+            for _ in range(self.segments):
+                fetch_next()
+            while pending:
+                segment = pending.popleft().result()
+                fetch_next()
+                bytes_io.write(segment)
+        bytes_io.write(b"")
+
+    def __read_segment(self, pool: FTPConnectionPool, path: str,
+                       offset: int, size: int) -> bytearray:
+        segment = bytearray(size)
+        view = memoryview(segment)
+        received = 0
+        with self.session(pool) as ftp:
+            ftp.voidcmd("TYPE I")
+            with ftp.transfercmd("RETR " + path, rest=offset) as conn:
+                while received < size:
+                    n = conn.recv_into(view[received:])
+                    if not n:
+                        break
+                    received += n
+            try:
+                # Complete, or aborted when the segment ended before the file
+                ftp.voidresp()
+            except ftplib.error_temp:
+                pass
+        view.release()
+        if received < size:
+            raise FileException(
+                f"{path} ended at {offset + received}, expected {size} bytes "
+                f"from {offset}"
+            )
+        return segment
+
+    def upload(
+            self,
+            path: str,
+            source: BinaryIO,
+            retries: int = 0,
+            resume_window: int = FTP_RESUME_WINDOW
+    ) -> int:
+        """
+        Streams source to path with STOR, blocks of block_size are read from
+        source and sent as they are read
+
+        A connection dropped during the upload is replaced, and the upload
+        resumed with APPE from the size of the file on the server. The bytes
+        to send again must still be held in the last resume_window bytes
+        sent, or be read again from a seekable source.
+
+        :param retries: connections dropped that are resumed, 0 fails on
+        the first one
+        :param resume_window: bytes sent kept in memory for a resume
+        :return: bytes written
+        """
+        block_size = self.blocksize or DEFAULT_FTP_BLOCK_SIZE
+        sent = 0
+        # Tail of what was sent, the server may not have received all of it
+        retained = bytearray()
+        # Read and not yet sent
+        block = b""
+        eof = False
+        attempts = 0
+        stack = ExitStack()
+        transfer: Optional[Tuple[ftplib.FTP, socket.socket]] = None
+
+        def send(conn: socket.socket, b: bytes):
+            nonlocal sent
+            # Counted first, a failed sendall may have sent part of b
+            sent += len(b)
+            if retries:
+                retained.extend(b)
+                if len(retained) > resume_window:
+                    del retained[:len(retained) - resume_window]
+            conn.sendall(b)
+
+        def dropped():
+            """Called for a failed connection, raises when out of retries"""
+            nonlocal stack, transfer, attempts
+            if attempts >= retries:
+                raise
+            attempts += 1
+            transfer = None
+            # The session is discarded, not returned to a pool
+            stack.__exit__(*sys.exc_info())
+            stack = ExitStack()
+
+        # Only connection errors are retried, errors of source are raised
+        try:
+            while True:
+                if transfer is None:
+                    try:
+                        ftp = stack.enter_context(self.session())
+                        ftp.voidcmd("TYPE I")
+                        offset = self.__remote_size(ftp, path) \
+                            if attempts else 0
+                        conn = stack.enter_context(ftp.transfercmd(
+                            ("APPE " if offset else "STOR ") + path
+                        ))
+                    except (OSError, EOFError, ftplib.error_temp):
+                        dropped()
+                        continue
+                    transfer = ftp, conn
+                    if attempts:
+                        resend = self.__resume(
+                            path, source, offset, sent, retained
+                        )
+                        sent = offset
+                        if resend is None:
+                            # Read again from offset
+                            block, eof = b"", False
+                        else:
+                            block = resend
+
+                if not block and not eof:
+                    block = source.read(block_size)
+                    eof = not block
+
+                ftp, conn = transfer
+                try:
+                    if block:
+                        send(conn, block)
+                        block = b""
+                    else:
+                        conn.close()
+                        ftp.voidresp()
+                        break
+                except (OSError, EOFError, ftplib.error_temp):
+                    dropped()
+        except BaseException:
+            stack.__exit__(*sys.exc_info())
+            raise
+        stack.close()
+        return sent
+
+    @staticmethod
+    def __remote_size(ftp: ftplib.FTP, path: str) -> int:
+        try:
+            size = ftp.size(path)
+        except ftplib.error_perm:
+            # Nothing was stored
+            return 0
+        return size or 0
+
+    @staticmethod
+    def __resume(path: str, source: BinaryIO, offset: int, sent: int,
+                 retained: bytearray) -> Optional[bytes]:
+        """
+        Bytes from offset to sent, to send before reading on, None when
+        source was moved back to offset instead
+        """
+        start = sent - len(retained)
+        if start <= offset <= sent:
+            resend = bytes(retained[offset - start:])
+            del retained[offset - start:]
+            return resend
+        try:
+            seekable = source.seekable()
+        except NotImplementedError:
+            seekable = False
+        if not seekable:
+            raise FileException(
+                f"Can not resume upload of {path} from {offset}, "
+                f"{sent - offset} bytes are no longer held"
+            )
+        source.seek(offset)
+        retained.clear()
+        return None
@@ -0,0 +1,178 @@
+import datetime
+import fnmatch
+import ftplib
+import posixpath
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, ContextManager, Deque, Dict, Iterator, \
+    List, Optional, Tuple
+
+Session = Callable[[], ContextManager[ftplib.FTP]]
+
+# Unix style LIST line, as sent by most servers without MLSD
+_LIST_LINE = re.compile(
+    r"^(?P<type>[-dlbcps])\S*\s+\d+\s+\S+\s+\S+\s+(?P<size>\d+)\s+"
+    r"(?P<month>[A-Za-z]{3})\s+(?P<day>\d{1,2})\s+"
+    r"(?:(?P<time>\d{1,2}:\d{2})|(?P<year>\d{4}))\s(?P<name>.+)$"
+)
+_MONTHS = {
+    m: i + 1 for i, m in enumerate((
+        "jan", "feb", "mar", "apr", "may", "jun",
+        "jul", "aug", "sep", "oct", "nov", "dec"
+    ))
+}
+
+
+def list_files(
+        session: Session,
+        path: str,
+        recursive: bool = False,
+        pattern: Optional[str] = None,
+        workers: int = 1,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lists the files of a directory with MLSD, or LIST when the server does
+    not support MLSD
+
+    A directory is listed on a session of its own, files are yielded once
+    their directory is listed. With workers above 1 subdirectories are
+    listed concurrently, files are then still yielded directory by
+    directory, in the order directories are found.
+
+    :param session: logged in connection, see FTPClient.session
+    :param path: directory to list
+    :param recursive: lists subdirectories as well
+    :param pattern: fnmatch pattern, files with a name not matching it are
+    left out
+    :param workers: directories listed at once
+    :return: files, with path, size and modified, modified is None when
+    the server did not send it
+    """
+    # Set once the server has rejected MLSD
+    no_mlsd: List[bool] = []
+
+    def list_dir(directory: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+        files, directories = [], []
+        for name, entry in _list_dir(session, directory, no_mlsd):
+            if entry["type"] == "dir":
+                directories.append(posixpath.join(directory, name))
+            elif entry["type"] == "file" and (
+                    pattern is None or fnmatch.fnmatchcase(name, pattern)
+            ):
+                files.append(dict(
+                    path=posixpath.join(directory, name),
+                    size=entry["size"],
+                    modified=entry["modified"],
+                ))
+        return files, directories
+
+    if workers <= 1:
+        directories: Deque[str] = deque((path,))
+        while directories:
+            files, found = list_dir(directories.popleft())
+            if recursive:
+                directories.extend(found)
+            yield from files
+        return
+
+    with ThreadPoolExecutor(workers) as executor:
+        waiting: Deque[str] = deque()
+        listing: Deque[Future] = deque(
+            (executor.submit(list_dir, path),)
+        )
+        try:
+            while listing:
+                files, found = listing.popleft().result()
+                if recursive:
+                    waiting.extend(found)
+                # Listings are kept at most one round ahead of the consumer
+                while waiting and len(listing) < 2 * workers:
+                    listing.append(
+                        executor.submit(list_dir, waiting.popleft())
+                    )
+                yield from files
+        finally:
+            for f in listing:
+                f.cancel()
+
+
+def _list_dir(session: Session, directory: str,
+              no_mlsd: List[bool]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    if not no_mlsd:
+        try:
+            with session() as ftp:
+                entries = list(ftp.mlsd(directory, ("type", "size", "modify")))
+        except ftplib.error_perm as e:
+            # Not understood or not implemented, other errors are real
+            if not str(e).startswith(("500", "502")):
+                raise
+            no_mlsd.append(True)
+        else:
+            for name, facts in entries:
+                yield name, dict(
+                    type=facts.get("type", "").lower(),
+                    size=int(facts.get("size", 0)),
+                    modified=_parse_modify(facts.get("modify")),
+                )
+            return
+
+    lines: List[str] = []
+    with session() as ftp:
+        ftp.retrlines(f"LIST {directory}", lines.append)
+    for line in lines:
+        entry = _parse_list_line(line)
+        if entry is not None:
+            yield entry
+
+
+def _parse_modify(value: Optional[str]) -> Optional[datetime.datetime]:
+    """MLSD modify fact, YYYYMMDDHHMMSS[.sss] in UTC"""
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(
+            value[:14], "%Y%m%d%H%M%S"
+        ).replace(tzinfo=datetime.timezone.utc)
+    except ValueError:
+        return None
+
+
+def _parse_list_line(line: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    match = _LIST_LINE.match(line)
+    if match is None:
+        # "total" lines, or a format that is not understood
+        return None
+    name = match.group("name")
+    if name in (".", ".."):
+        return None
+    entry_type = {"-": "file", "d": "dir"}.get(match.group("type"), "other")
+
+    month = _MONTHS.get(match.group("month").lower())
+    modified: Optional[datetime.datetime] = None
+    if month is not None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        day = int(match.group("day"))
+        try:
+            if match.group("year"):
+                modified = datetime.datetime(
+                    int(match.group("year")), month, day,
+                    tzinfo=datetime.timezone.utc
+                )
+            else:
+                # Recent files have a time instead of a year
+                hour, minute = map(int, match.group("time").split(":"))
+                modified = datetime.datetime(
+                    now.year, month, day, hour, minute,
+                    tzinfo=datetime.timezone.utc
+                )
+                if modified > now + datetime.timedelta(days=1):
+                    modified = modified.replace(year=now.year - 1)
+        except ValueError:
+            modified = None
+
+    return name, dict(
+        type=entry_type,
+        size=int(match.group("size")),
+        modified=modified,
+    )
@@ -0,0 +1,224 @@
+import atexit
+import ftplib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from fpipe.exceptions import FileException
+
+PoolKey = Tuple[str, int, str]
+
+
+class FTPConnectionPool:
+    """Logged in FTP control connections, reused between files
+
+    Connections are kept per (host, port, username). An idle connection is
+    checked with NOOP before it is reused, and closed once it has been idle
+    for idle_timeout seconds. At most max_per_host idle connections to a
+    host are kept, a session never waits for one. A download blocked on a
+    slow consumer, e.g. an upload to the same host, then holds no other
+    session back.
+
+    max_connections caps the connections open to a host at once, for
+    servers limiting connections per client. A session waits at most
+    wait_timeout seconds for a connection to be returned or closed, and
+    raises FileException instead of waiting on a session that may in turn
+    be waiting on it.
+    """
+
+    def __init__(
+            self,
+            max_per_host: int = 4,
+            idle_timeout: float = 60,
+            host_limits: Optional[Dict[str, int]] = None,
+            max_connections: Optional[int] = None,
+            wait_timeout: float = 60
+    ):
+        """
+        :param max_per_host: idle connections kept to a host
+        :param idle_timeout: seconds an idle connection is kept
+        :param host_limits: max_per_host of specific hosts
+        :param max_connections: connections open to a host at once, not
+        limited when None
+        :param wait_timeout: seconds a session waits for a connection when
+        max_connections are open
+        """
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.host_limits: Dict[str, int] = dict(host_limits or {})
+        self.max_connections = max_connections
+        self.wait_timeout = wait_timeout
+
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+        self.__condition = threading.Condition()
+        self.__idle: Dict[PoolKey, List[Tuple[float, ftplib.FTP]]] = {}
+        # Connections open per host, idle or in use
+        self.__open: Dict[str, int] = {}
+
+    def __take_idle(self, key: PoolKey) -> Optional[ftplib.FTP]:
+        expired = []
+        ftp = None
+        with self.__condition:
+            idle = self.__idle.get(key, [])
+            now = time.monotonic()
+            # Most recently used first, the others are more likely to expire
+            while idle:
+                returned, candidate = idle.pop()
+                if now - returned > self.idle_timeout:
+                    expired.append(candidate)
+                else:
+                    ftp = candidate
+                    break
+        for e in expired:
+            self.__discard(key[0], e)
+        return ftp
+
+    def __reserve(self, key: PoolKey) -> bool:
+        """
+        Counts a connection about to be made, waits while max_connections
+        are open
+
+        :return: False when a connection was returned idle meanwhile
+        """
+        host = key[0]
+        limit = self.max_connections
+        with self.__condition:
+            if not self.__condition.wait_for(
+                    lambda: limit is None or self.__idle.get(key)
+                    or self.__open.get(host, 0) < limit,
+                    self.wait_timeout
+            ):
+                raise FileException(
+                    f"No connection to {host} became available within "
+                    f"{self.wait_timeout} seconds, {limit} are in use"
+                )
+            if self.__idle.get(key):
+                return False
+            self.__open[host] = self.__open.get(host, 0) + 1
+            return True
+
+    def __closed(self, host: str):
+        with self.__condition:
+            self.__open[host] -= 1
+            self.__condition.notify_all()
+
+    def __discard(self, host: str, ftp: ftplib.FTP):
+        with self.__condition:
+            self.discarded += 1
+        self.__closed(host)
+        try:
+            ftp.close()
+        except OSError:
+            pass
+
+    def __return(self, key: PoolKey, ftp: ftplib.FTP):
+        host = key[0]
+        with self.__condition:
+            idle = sum(
+                len(c) for k, c in self.__idle.items() if k[0] == host
+            )
+            keep = idle < self.host_limits.get(host, self.max_per_host)
+            if keep:
+                self.__idle.setdefault(key, []).append(
+                    (time.monotonic(), ftp)
+                )
+                self.__condition.notify_all()
+        if not keep:
+            self.__closed(host)
+            self.__quit(ftp)
+
+    @staticmethod
+    def __quit(ftp: ftplib.FTP):
+        try:
+            ftp.quit()
+        except (ftplib.Error, OSError, EOFError):
+            ftp.close()
+
+    @contextmanager
+    def session(
+            self,
+            host: str,
+            port: int,
+            username: str,
+            connect: Callable[[], ftplib.FTP]
+    ) -> Iterator[ftplib.FTP]:
+        """
+        A logged in connection, returned to the pool when the session ends
+        without an exception
+
+        :param connect: connects and logs in when no idle connection is
+        available
+        """
+        key = (host, port, username)
+        ftp = None
+        while ftp is None:
+            ftp = self.__take_idle(key)
+            if ftp is None:
+                if not self.__reserve(key):
+                    continue
+                try:
+                    ftp = connect()
+                except BaseException:
+                    self.__closed(host)
+                    raise
+                with self.__condition:
+                    self.created += 1
+                break
+            try:
+                # Health check, the server may have closed it
+                if ftp.sock is None:
+                    raise EOFError
+                ftp.voidcmd("NOOP")
+            except (ftplib.Error, OSError, EOFError):
+                self.__discard(host, ftp)
+                ftp = None
+            else:
+                with self.__condition:
+                    self.reused += 1
+
+        try:
+            yield ftp
+        except BaseException:
+            self.__discard(host, ftp)
+            raise
+        self.__return(key, ftp)
+
+    def idle(self) -> int:
+        """Number of idle connections"""
+        with self.__condition:
+            return sum(len(c) for c in self.__idle.values())
+
+    def close(self):
+        """Closes idle connections"""
+        with self.__condition:
+            connections = [
+                (k[0], c) for k, idle in self.__idle.items() for _, c in idle
+            ]
+            self.__idle.clear()
+        for host, ftp in connections:
+            self.__closed(host)
+            self.__quit(ftp)
+
+    def __enter__(self) -> "FTPConnectionPool":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_default_pool: Optional[FTPConnectionPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool() -> FTPConnectionPool:
+    """Pool shared by FTP generators that are not given one"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = FTPConnectionPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
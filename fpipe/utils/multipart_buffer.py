@@ -1,33 +1,140 @@
-from typing import Tuple, Union
+from collections import deque
+from typing import Deque, Optional, Tuple, Union, Callable, Dict
+
+from fpipe.utils import s3_checksum
 
 
 class MultipartBuffer(object):
-    def __init__(self, chunk_size: int, str_encoding: str = "utf-8"):
-        self.buffer: bytearray = bytearray()
+    """Collects writes into parts of chunk_size bytes for multipart uploads
+
+    Writes are copied once, into a preallocated part. Completed parts are
+    handed out by get() as they are, the buffer keeps no reference to them
+    afterwards, so they can be uploaded without being copied again.
+    """
+
+    def __init__(
+            self,
+            chunk_size: int,
+            str_encoding: str = "utf-8",
+            part_size: Optional[Callable[[int], int]] = None,
+            checksum: Optional[str] = None,
+            allocate: Optional[Callable[[int], None]] = None
+    ):
+        """
+        :param chunk_size: size of every part, unless part_size is set
+        :param str_encoding:
+        :param part_size: returns the size of a part given its part number
+        :param checksum: algorithm from fpipe.utils.s3_checksum, calculated
+        as data is added, see pop_checksum()
+        :param allocate: called with the size of a part before it is
+        allocated, may block, and may take complete parts with get()
+        """
         self.part_number: int = 1
         self.chunk_size: int = chunk_size
         self.count: int = 0
         self.str_encoding = str_encoding
+        self.part_size: Callable[[int], int] = (
+            part_size or (lambda _: chunk_size)
+        )
+        self.__parts: Deque[bytearray] = deque()
+        self.__part: Optional[bytearray] = None
+        self.__view: Optional[memoryview] = None
+        self.__fill = 0
+        # Part number of the part being filled
+        self.__filling = 1
+        self.checksum = checksum
+        self.__hasher = None
+        self.__checksums: Dict[int, bytes] = {}
+        self.allocate = allocate
+
+    def add(self, s: Union[bytes, bytearray, memoryview]):
+        data = memoryview(s)
+        self.count += data.nbytes
+        while data:
+            if self.__part is None:
+                self.chunk_size = self.part_size(self.__filling)
+                if self.allocate:
+                    self.allocate(self.chunk_size)
+                self.__part = bytearray(self.chunk_size)
+                self.__view = memoryview(self.__part)
+                self.__fill = 0
+                if self.checksum:
+                    self.__hasher = s3_checksum.new(self.checksum)
+            view = self.__view
+            assert view is not None
+            fill = self.__fill
+            n = min(len(data), len(view) - fill)
+            view[fill:fill + n] = data[:n]
+            if self.__hasher:
+                self.__hasher.update(data[:n])
+            self.__fill = fill + n
+            data = data[n:]
+            if self.__fill == len(view):
+                self.__parts.append(self.__take_part())
 
-    def add(self, s: Union[bytes, bytearray]):
-        self.buffer += s
-        self.count += len(s)
+    def __take_part(self) -> bytearray:
+        part = self.__part
+        assert part is not None
+        if self.__view is not None:
+            self.__view.release()
+        if self.__fill < len(part):
+            # Last part, truncating from the end does not move the data
+            del part[self.__fill:]
+        if self.__hasher:
+            self.__checksums[self.__filling] = self.__hasher.digest()
+            self.__hasher = None
+        self.__part = None
+        self.__view = None
+        self.__fill = 0
+        self.__filling += 1
+        return part
 
     def empty(self) -> bool:
         return self.count == 0
 
     def full(self) -> bool:
-        return self.count >= self.chunk_size
+        """True when a complete part is ready"""
+        return bool(self.__parts)
 
     def get(self) -> Tuple[bytearray, int]:
+        """
+        Hands out the next part, or what is buffered if no part is complete
+
+        :return: part and its part number
+        """
+        if self.__parts:
+            part = self.__parts.popleft()
+        elif self.__part is not None:
+            part = self.__take_part()
+        else:
+            part = bytearray()
+        self.count -= len(part)
         try:
-            return self.buffer[: self.chunk_size], self.part_number
+            return part, self.part_number
         finally:
-            del self.buffer[: self.chunk_size]
-            self.count -= max(0, self.chunk_size)
             self.part_number += 1
 
-    def clear(self):
-        del self.buffer[:]
-        self.part_number = 1
+    def pop_checksum(self, part_number: int) -> Optional[bytes]:
+        """
+        Checksum of a part handed out by get()
+
+        :param part_number: part number returned by get()
+        :return: digest, None if checksum is not set or the part was empty
+        """
+        return self.__checksums.pop(part_number, None)
+
+    def clear(self, part_number: int = 1):
+        """
+        :param part_number: part number of the next part
+        """
+        self.__parts.clear()
+        self.__checksums.clear()
+        self.__hasher = None
+        if self.__view is not None:
+            self.__view.release()
+        self.__part = None
+        self.__view = None
+        self.__fill = 0
+        self.__filling = part_number
+        self.part_number = part_number
         self.count = 0
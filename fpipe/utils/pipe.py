@@ -0,0 +1,169 @@
+import os
+import stat
+from typing import Optional, Type, Iterator, AnyStr, Iterable, List, \
+    BinaryIO, Union
+
+from fpipe.utils.const import PIPE_BUFFER_SIZE
+
+SPLICE_BLOCK_SIZE = 2 ** 20
+
+
+class PipeStream(BinaryIO):
+    """Read end of an OS pipe, typically stdout of a subprocess
+
+    As long as nothing has been read from it, the file descriptor can be
+    detached and handed to another process or spliced into a file, so the
+    data never passes through python.
+    """
+
+    def __init__(self, f: BinaryIO):
+        self.__file = f
+        self.__touched = False
+
+    def detach(self) -> Optional[int]:
+        """Hands over the file descriptor if nothing has been read yet
+
+        The receiver becomes responsible for consuming the pipe, the file
+        descriptor is only handed over once.
+
+        :return: file descriptor, or None if data has been read already
+        """
+        if self.__touched:
+            return None
+        self.__touched = True
+        return self.__file.fileno()
+
+    def read(self, n=-1) -> bytes:
+        self.__touched = True
+        return self.__file.read(n)
+
+    def readinto(self, b: Union[bytearray, memoryview]) -> int:
+        self.__touched = True
+        return self.__file.readinto(b)  # type: ignore
+
+    def __enter__(self) -> BinaryIO:
+        return self
+
+    def close(self) -> None:
+        self.__file.close()
+
+    def fileno(self) -> int:
+        return self.__file.fileno()
+
+    def flush(self) -> None:
+        buffer = bytearray(PIPE_BUFFER_SIZE)
+        while self.readinto(buffer):
+            pass
+
+    def isatty(self) -> bool:
+        return False
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return False
+
+    def readline(self, limit: int = ...) -> AnyStr:
+        raise NotImplementedError
+
+    def readlines(self, hint: int = ...) -> List[AnyStr]:
+        raise NotImplementedError
+
+    def seek(self, offset: int, whence: int = ...) -> int:
+        raise NotImplementedError
+
+    def seekable(self) -> bool:
+        return False
+
+    def tell(self) -> int:
+        raise NotImplementedError
+
+    def truncate(self, size: Optional[int] = ...) -> int:
+        raise NotImplementedError
+
+    def write(self, s: AnyStr) -> int:
+        raise NotImplementedError
+
+    def writelines(self, lines: Iterable[AnyStr]) -> None:
+        raise NotImplementedError
+
+    @property
+    def closed(self):
+        return self.__file.closed
+
+    def mode(self):
+        raise NotImplementedError
+
+    def name(self) -> str:
+        raise NotImplementedError
+
+    def __next__(self) -> AnyStr:
+        raise NotImplementedError
+
+    def __iter__(self) -> Iterator[AnyStr]:
+        raise NotImplementedError
+
+    def __exit__(
+            self,
+            t: Optional[Type[BaseException]],
+            value: Optional[BaseException],
+            traceback=None,
+    ) -> bool:
+        self.close()
+        return t is None
+
+
+def stream_fileno(stream: BinaryIO) -> Optional[int]:
+    """Returns a file descriptor that can replace reads from stream
+
+    Only pipes that have not been read from and regular files whose
+    descriptor offset matches the stream position qualify.
+
+    :param stream: stream to take the file descriptor from
+    :return: file descriptor, or None if stream must be read through python
+    """
+    if isinstance(stream, PipeStream):
+        return stream.detach()
+    try:
+        fd = stream.fileno()
+    except (OSError, ValueError, AttributeError, NotImplementedError):
+        return None
+    if not isinstance(fd, int):
+        return None
+    try:
+        if not stat.S_ISREG(os.fstat(fd).st_mode):
+            return None
+        # Buffered readers may have read ahead of their logical position
+        if stream.tell() != os.lseek(fd, 0, os.SEEK_CUR):
+            return None
+    except (OSError, ValueError, NotImplementedError):
+        return None
+    return fd
+
+
+def splice(src_fd: int, dst_fd: int) -> bool:
+    """Copies everything from src_fd to dst_fd inside the kernel
+
+    Uses os.splice for pipes and os.sendfile for regular files.
+
+    :return: False if neither is supported for src_fd and dst_fd
+    """
+    mode = os.fstat(src_fd).st_mode
+    if stat.S_ISFIFO(mode) and hasattr(os, 'splice'):
+        def copy() -> int:
+            return os.splice(src_fd, dst_fd, SPLICE_BLOCK_SIZE)
+    elif stat.S_ISREG(mode) and hasattr(os, 'sendfile'):
+        def copy() -> int:
+            return os.sendfile(dst_fd, src_fd, None, SPLICE_BLOCK_SIZE)
+    else:
+        return False
+
+    try:
+        count = copy()
+    except OSError:
+        # Unsupported combination of descriptors, nothing has been copied
+        return False
+    while count:
+        count = copy()
+    return True
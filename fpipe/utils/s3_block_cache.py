@@ -0,0 +1,177 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, Type
+
+BlockKey = Tuple[Hashable, ...]
+
+
+class S3BlockCache:
+    """Block cache shared between S3FileReaders
+
+    Blocks are keyed by (bucket, key, version or ETag, offset, size), so
+    readers of the same object revision share downloads. The least recently
+    used blocks are moved from memory to spill_dir once memory_limit is
+    reached, and dropped once spill_limit is reached.
+
+    A block requested by several readers at once is only downloaded once,
+    the other readers wait for it.
+    """
+
+    def __init__(
+            self,
+            memory_limit: int = 2 ** 28,
+            spill_dir: Optional[str] = None,
+            spill_limit: Optional[int] = None
+    ):
+        """
+        :param memory_limit: bytes kept in memory
+        :param spill_dir: directory blocks evicted from memory are written
+        to, blocks are dropped when not set
+        :param spill_limit: bytes kept in spill_dir, unlimited when not set
+        """
+        self.memory_limit = memory_limit
+        self.spill_dir = spill_dir
+        self.spill_limit = spill_limit
+
+        self.memory_bytes = 0
+        self.spill_bytes = 0
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+
+        self.__memory: "OrderedDict[BlockKey, bytes]" = OrderedDict()
+        self.__spilled: "OrderedDict[BlockKey, Tuple[str, int]]" = \
+            OrderedDict()
+        self.__loading: Dict[BlockKey, Future] = {}
+        self.__lock = threading.Lock()
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def get(self, key: BlockKey, load: Callable[[], bytes]) -> bytes:
+        """
+        Returns a cached block, or loads and caches it
+
+        :param key: identifies the block
+        :param load: downloads the block on a miss
+        :return: content of the block
+        """
+        with self.__lock:
+            block = self.__memory.get(key)
+            if block is not None:
+                self.__memory.move_to_end(key)
+                self.hits += 1
+                return block
+            spilled = self.__spilled.pop(key, None)
+            loading = self.__loading.get(key)
+            if loading is None:
+                loading = self.__loading[key] = Future()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            # Another reader is loading the block
+            loaded: bytes = loading.result()
+            return loaded
+
+        try:
+            block = None
+            if spilled:
+                block = self.__read_spilled(spilled)
+            with self.__lock:
+                if block is not None:
+                    self.spill_hits += 1
+                else:
+                    self.misses += 1
+            if block is None:
+                block = load()
+            self.__put(key, block)
+            loading.set_result(block)
+            return block
+        except BaseException as e:
+            loading.set_exception(e)
+            raise
+        finally:
+            with self.__lock:
+                self.__loading.pop(key, None)
+
+    def __read_spilled(self, spilled: Tuple[str, int]) -> Optional[bytes]:
+        path, size = spilled
+        with self.__lock:
+            self.spill_bytes -= size
+        try:
+            with open(path, 'rb') as f:
+                block = f.read()
+            os.unlink(path)
+        except OSError:
+            return None
+        return block if len(block) == size else None
+
+    def __put(self, key: BlockKey, block: bytes):
+        evicted: List[Tuple[BlockKey, bytes]] = []
+        with self.__lock:
+            self.__memory[key] = block
+            self.memory_bytes += len(block)
+            while self.memory_bytes > self.memory_limit and \
+                    len(self.__memory) > 1:
+                evicted_key, evicted_block = self.__memory.popitem(last=False)
+                self.memory_bytes -= len(evicted_block)
+                evicted.append((evicted_key, evicted_block))
+
+        if self.spill_dir:
+            for evicted_key, evicted_block in evicted:
+                self.__spill(evicted_key, evicted_block)
+
+    def __spill(self, key: BlockKey, block: bytes):
+        spill_dir = self.spill_dir
+        assert spill_dir
+        if self.spill_limit is not None and len(block) > self.spill_limit:
+            return
+        name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        path = os.path.join(spill_dir, name)
+        fd, tmp_path = tempfile.mkstemp(dir=spill_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(block)
+        os.replace(tmp_path, path)
+
+        dropped: List[str] = []
+        with self.__lock:
+            self.__spilled[key] = (path, len(block))
+            self.spill_bytes += len(block)
+            while self.spill_limit is not None and \
+                    self.spill_bytes > self.spill_limit:
+                _, (dropped_path, size) = self.__spilled.popitem(last=False)
+                self.spill_bytes -= size
+                dropped.append(dropped_path)
+        for dropped_path in dropped:
+            try:
+                os.unlink(dropped_path)
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        """Drops all blocks, including the ones spilled to disk"""
+        with self.__lock:
+            spilled = list(self.__spilled.values())
+            self.__memory.clear()
+            self.__spilled.clear()
+            self.memory_bytes = 0
+            self.spill_bytes = 0
+        for path, _ in spilled:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def __enter__(self) -> "S3BlockCache":
+        return self
+
+    def __exit__(self, t: Optional[Type[BaseException]], value, traceback
+                 ) -> bool:
+        self.clear()
+        return t is None
@@ -0,0 +1,82 @@
+import base64
+import hashlib
+import zlib
+from typing import Callable, Dict, Optional, Union
+
+MD5 = "MD5"
+CRC32 = "CRC32"
+CRC32C = "CRC32C"
+SHA256 = "SHA256"
+CHECKSUM_ALGORITHMS = (MD5, CRC32, CRC32C, SHA256)
+
+Data = Union[bytes, bytearray, memoryview]
+
+
+class _Crc32(object):
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data: Data):
+        self.value = zlib.crc32(data, self.value)
+
+    def digest(self) -> bytes:
+        digest: bytes = self.value.to_bytes(4, "big")
+        return digest
+
+
+class _Crc32c(_Crc32):
+    def __init__(self):
+        super().__init__()
+        try:
+            import crc32c
+        except ImportError as e:
+            raise ImportError(
+                "CRC32C checksums require the crc32c package, "
+                "installed with fpipe[crc32c]"
+            ) from e
+        self.__crc32c = crc32c.crc32c
+
+    def update(self, data: Data):
+        self.value = self.__crc32c(data, self.value)
+
+
+_FACTORIES: Dict[str, Callable] = {
+    MD5: hashlib.md5,
+    CRC32: _Crc32,
+    CRC32C: _Crc32c,
+    SHA256: hashlib.sha256,
+}
+
+
+def new(algorithm: str):
+    """
+    Incremental checksum with update(data) and digest()
+
+    :param algorithm: one of CHECKSUM_ALGORITHMS
+    """
+    try:
+        return _FACTORIES[algorithm]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown checksum {algorithm}, use one of {CHECKSUM_ALGORITHMS}"
+        )
+
+
+def upload_arguments(algorithm: Optional[str],
+                     digest: Optional[bytes]) -> Dict[str, str]:
+    """
+    Arguments for upload_part/put_object that make S3 validate the data
+
+    :param algorithm: one of CHECKSUM_ALGORITHMS, or None
+    :param digest: checksum of the data
+    :return: arguments to pass on to boto3
+    """
+    if algorithm is None or digest is None:
+        return {}
+    encoded = base64.b64encode(digest).decode("ascii")
+    if algorithm == MD5:
+        return {"ContentMD5": encoded}
+    return {
+        "ChecksumAlgorithm": algorithm,
+        f"Checksum{algorithm}": encoded,
+    }
@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from botocore.client import BaseClient
+from botocore.exceptions import ClientError
+
+from fpipe.exceptions import S3WriteException
+from fpipe.utils.const import S3_COPY_PART_SIZE
+
+MAX_PARTS = 10000
+
+
+def copy(
+        client: BaseClient,
+        source_bucket: str,
+        source_key: str,
+        size: int,
+        bucket: str,
+        key: str,
+        mime: str,
+        version: Optional[str] = None,
+        e_tag: Optional[str] = None,
+        part_size: int = S3_COPY_PART_SIZE,
+        worker_limit: int = 8,
+        full_control: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Copies an object within S3, without downloading it
+
+    Objects up to part_size are copied with copy_object, larger objects with
+    ranged upload_part_copy requests, worker_limit at a time.
+
+    :param size: size of the source object
+    :param mime: content type of the copy
+    :param version: version of the source object
+    :param e_tag: copy only fails if the source object no longer has this
+    ETag
+    :param part_size: size of each part, grown to fit in MAX_PARTS parts
+    :param full_control: String to set full object control to addition
+    aws users/accounts
+    :return: response of copy_object or complete_multipart_upload
+    """
+    copy_source = {"Bucket": source_bucket, "Key": source_key}
+    if version:
+        copy_source["VersionId"] = version
+    conditions = {"CopySourceIfMatch": e_tag} if e_tag else {}
+    arguments = {"Bucket": bucket, "Key": key, "ContentType": mime}
+    if full_control:
+        arguments["GrantFullControl"] = full_control
+
+    if size <= part_size:
+        response: Dict[str, Any] = client.copy_object(
+            CopySource=copy_source,
+            MetadataDirective="REPLACE",
+            **conditions,
+            **arguments
+        )
+        return response
+
+    part_size = max(part_size, -(-size // MAX_PARTS))
+    upload_id = client.create_multipart_upload(**arguments)["UploadId"]
+
+    def copy_part(part_number: int) -> Dict[str, Any]:
+        start = (part_number - 1) * part_size
+        end = min(start + part_size, size) - 1
+        part = client.upload_part_copy(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            CopySource=copy_source,
+            CopySourceRange=f"bytes={start}-{end}",
+            **conditions
+        )
+        return {
+            "PartNumber": part_number,
+            "ETag": part["CopyPartResult"]["ETag"],
+        }
+
+    try:
+        with ThreadPoolExecutor(worker_limit) as executor:
+            parts = list(
+                executor.map(copy_part, range(1, -(-size // part_size) + 1))
+            )
+        response = client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+        return response
+    except Exception as e:
+        try:
+            client.abort_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id
+            )
+        except ClientError:
+            pass
+        raise S3WriteException(
+            f"Could not copy s3://{source_bucket}/{source_key}"
+        ) from e
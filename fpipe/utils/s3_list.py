@@ -0,0 +1,130 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Queue
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from botocore.client import BaseClient
+
+# Put on the page queue by a shard once it is listed
+_DONE = None
+
+
+def list_objects(
+        client: BaseClient,
+        bucket: str,
+        prefix: Optional[str] = None,
+        workers: int = 1,
+        delimiter: Optional[str] = "/",
+        boundaries: Optional[Sequence[str]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lists objects with list_objects_v2, items are yielded as pages arrive
+
+    With workers above 1 the listing is split into shards listed
+    concurrently, objects are then yielded in key order within a shard but
+    not across shards.
+
+    :param workers: shards listed at once, 1 lists sequentially
+    :param delimiter: shards are the common prefixes one delimiter below
+    prefix, found by listing prefix with this delimiter
+    :param boundaries: sorted keys splitting the listing into shards, used
+    instead of delimiter. A shard lists keys after one boundary, up to and
+    including the next
+    :return: Contents items, with Key, Size, ETag and LastModified
+    """
+    if workers <= 1 or not (boundaries or delimiter):
+        for page in _pages(client, bucket, prefix):
+            yield from page
+        return
+
+    pages: Queue = Queue(maxsize=2 * workers)
+    stop = threading.Event()
+
+    def list_shard(shard_prefix: Optional[str], start_after: Optional[str],
+                   end: Optional[str]):
+        try:
+            for page in _pages(client, bucket, shard_prefix, start_after):
+                if stop.is_set():
+                    break
+                if end is not None and page and page[-1]["Key"] > end:
+                    pages.put([o for o in page if o["Key"] <= end])
+                    break
+                pages.put(page)
+        except BaseException as e:
+            pages.put(e)
+        finally:
+            pages.put(_DONE)
+
+    with ThreadPoolExecutor(workers) as executor:
+        shards = 0
+
+        def submit(*args):
+            nonlocal shards
+            shards += 1
+            executor.submit(list_shard, *args)
+
+        def received(block: bool) -> Iterator[Dict[str, Any]]:
+            """Items of listed pages, without block only those waiting"""
+            nonlocal shards
+            while shards:
+                try:
+                    page = pages.get(block=block)
+                except Empty:
+                    return
+                if page is _DONE:
+                    shards -= 1
+                elif isinstance(page, BaseException):
+                    raise page
+                else:
+                    yield from page
+
+        try:
+            if boundaries:
+                starts: List[Optional[str]] = [None, *boundaries]
+                ends: List[Optional[str]] = [*boundaries, None]
+                for start_after, end in zip(starts, ends):
+                    submit(prefix, start_after, end)
+            else:
+                assert delimiter is not None
+                # Shards are submitted as they are discovered, objects
+                # directly under prefix are yielded by the discovery
+                for page in _pages(client, bucket, prefix,
+                                   delimiter=delimiter, common=True):
+                    for item in page:
+                        if "Prefix" in item:
+                            submit(item["Prefix"], None, None)
+                        else:
+                            yield item
+                    # Shards listed so far are not held back by discovery
+                    yield from received(block=False)
+
+            yield from received(block=True)
+        finally:
+            stop.set()
+            # Unblocks shards waiting for room on the queue
+            while shards:
+                if pages.get() is _DONE:
+                    shards -= 1
+
+
+def _pages(
+        client: BaseClient,
+        bucket: str,
+        prefix: Optional[str],
+        start_after: Optional[str] = None,
+        delimiter: Optional[str] = None,
+        common: bool = False,
+) -> Iterator[List[Dict[str, Any]]]:
+    args = {"Bucket": bucket}
+    if prefix is not None:
+        args["Prefix"] = prefix
+    if start_after is not None:
+        args["StartAfter"] = start_after
+    if delimiter is not None:
+        args["Delimiter"] = delimiter
+
+    for page in client.get_paginator("list_objects_v2").paginate(**args):
+        items: List[Dict[str, Any]] = page.get("Contents", [])
+        if common:
+            items = items + page.get("CommonPrefixes", [])
+        yield items
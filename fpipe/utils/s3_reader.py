@@ -1,5 +1,7 @@
 import math
 import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
 from typing import (
     Optional,
     List,
@@ -9,48 +11,96 @@ from typing import (
     AnyStr,
     Iterable,
     Type,
+    Dict,
+    Any,
 )
 
-from fpipe.exceptions import SeekException, FileException
+from botocore.exceptions import ClientError
+
+from fpipe.exceptions import SeekException, FileException, \
+    SourceModifiedException
+from fpipe.utils.const import S3_READ_CHUNK_SIZE
+from fpipe.utils.s3_block_cache import S3BlockCache
 
 
 class S3FileReader(BinaryIO):
+    """Reads an S3 object through ranged GETs of cache_size bytes
+
+    With read_ahead set, the next read_ahead chunks are fetched concurrently
+    on a thread pool while earlier chunks are being read, so sequential
+    throughput is bound by the number of connections instead of the
+    latency of each request.
+    """
+
     def __init__(
             self,
             s3_client,
             s3_resource,
             bucket,
             key,
-            cache_size=5 * 2 ** 20,
+            cache_size=S3_READ_CHUNK_SIZE,
             cache_chunk_count_limit=4,
             lock: Optional[threading.Lock] = None,
             meta_lock: Optional[threading.Lock] = None,
             version: Optional[str] = None,
             seekable: bool = True,
+            read_ahead: int = 0,
+            cache_byte_limit: Optional[int] = None,
+            block_cache: Optional[S3BlockCache] = None,
+            object_info: Optional[Dict[str, Any]] = None,
     ):
+        """
+        :param cache_size: size of each ranged GET
+        :param cache_chunk_count_limit: chunks kept after being read, used
+        when cache_byte_limit is not set
+        :param read_ahead: number of ranged GETs kept in flight ahead of the
+        read position, 0 disables read-ahead. When set, non-seekable readers
+        also use ranged GETs instead of a single streaming GET
+        :param cache_byte_limit: bytes kept in the cache, least recently used
+        chunks are evicted first
+        :param block_cache: cache shared with other readers, consulted
+        before downloading a chunk
+        :param object_info: fields of a HEAD response already known, e.g.
+        from a listing, ContentLength saves the HEAD request
+        """
         self.s3_client = s3_client
         self.s3_resource = s3_resource
 
         self.bucket = bucket
         self.key = key
         self.version = version
+        self.e_tag: Optional[str] = None
+        self.block_cache = block_cache
+        self.__object_info: Dict[str, Any] = dict(object_info or {})
 
         self.cache_chunk_size = cache_size
-        self.cache_chunk_count_limit = cache_chunk_count_limit
+        self.cache_byte_limit: int = (
+            cache_byte_limit
+            if cache_byte_limit is not None
+            else cache_size * cache_chunk_count_limit
+        )
 
         self.bytes_received = 0
         self.chunk_lookups = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
         self._size = 0
 
         # Cache blocks that each contain a byte-range of the object limited
-        # in size by by cache_chunk_size.
-        self.cache_chunks: List[Tuple[int, bytes]] = []
-        self.last_chunk = None
+        # in size by by cache_chunk_size, indexed by offset of the range and
+        # ordered from least to most recently used.
+        self.cache_chunks: "OrderedDict[int, bytes]" = OrderedDict()
+        self.cache_bytes = 0
+        self.last_chunk: Optional[Tuple[int, bytes]] = None
         self.offset = 0
         self.read_lock = lock
         self.meta_lock = meta_lock
         self.__seekable: bool = seekable
         self.obj_body = None
+        self.read_ahead = read_ahead
+        self.__executor: Optional[ThreadPoolExecutor] = None
+        self.__prefetch: Dict[int, Future] = {}
         self.locked = self.meta_lock or self.read_lock
         self.__closed = False
 
@@ -75,25 +125,36 @@ class S3FileReader(BinaryIO):
         return t is None
 
     def __initialize(self):
-        if self.version:
-            versions = self.s3_resource.Bucket(
-                self.bucket
-            ).object_versions.filter(Prefix=self.key)
-            for version in versions:
-                this_ver = version.get().get("VersionId")
-                if this_ver == self.version:
-                    self._size = version.size
-                    return
-        else:
-            for obj in self.s3_resource.Bucket(self.bucket).objects.filter(
-                    Prefix=self.key
-            ):
-                if obj.key == self.key:
-                    self._size = obj.size
-                    return
-        raise FileException(
-            f"Could not locate S3 object s3://{self.bucket}/{self.key}"
-        )
+        if self.__object_info.get("ContentLength") is None:
+            self.__object_info.update(self.__head_object())
+        self._size = self.__object_info["ContentLength"]
+        self.e_tag = self.__object_info.get("ETag")
+
+    def __head_object(self) -> Dict[str, Any]:
+        try:
+            response: Dict[str, Any] = self.s3_client.head_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                **({"VersionId": self.version} if self.version else {}),
+            )
+        except ClientError as e:
+            raise FileException(
+                f"Could not locate S3 object s3://{self.bucket}/{self.key}"
+            ) from e
+        return response
+
+    def object_info(self, name: str) -> Any:
+        """
+        Returns a field of the HEAD response of the object, HEAD is only
+        requested if the field was not provided by object_info or an
+        earlier request
+
+        :param name: field name, e.g. ContentLength or ContentType
+        :return: value of the field
+        """
+        if name not in self.__object_info:
+            self.__object_info.update(self.__head_object())
+        return self.__object_info[name]
 
     def size(self):
         return self._size
@@ -132,7 +193,9 @@ class S3FileReader(BinaryIO):
         if self.locked:
             self._unlock()
 
-        if not self.__seekable:
+        # Ranged GETs are needed for read-ahead and the shared block cache
+        if not self.__seekable and not self.read_ahead and \
+                not self.block_cache:
             self.obj_body = (
                 self.obj_body
                 or self.s3_client.get_object(
@@ -147,37 +210,28 @@ class S3FileReader(BinaryIO):
         if n > 0:
             end = min(end, self.offset + n)
 
-        data = b''
+        parts: List[memoryview] = []
         while self.offset < end:
-            if self.last_chunk is None:
-                self.last_chunk = self._get_chunk_for_offset()
-            chunk_start, chunk_bytes = self.last_chunk
-
-            while chunk_start is not None:
-                while (
-                        chunk_start
-                        <= self.offset
-                        < chunk_start + self.cache_chunk_size
-                        and self.offset < end
-                ):
-                    chunk_offset = self.offset - chunk_start
-                    self.offset = min(end, chunk_start + self.cache_chunk_size)
-                    if data:
-                        data += chunk_bytes[chunk_offset:end - chunk_start]
-                    else:
-                        data = chunk_bytes[chunk_offset:end - chunk_start]
-
-                if self.offset < end:
-                    self.last_chunk = (
-                        chunk_start,
-                        chunk_bytes,
-                    ) = self._get_chunk_for_offset()
-                else:
-                    break
-
-            if self.offset < end:
-                self.last_chunk = self._append_cache_chunk()
-        return data
+            if self.last_chunk and (
+                    self.last_chunk[0]
+                    <= self.offset
+                    < self.last_chunk[0] + len(self.last_chunk[1])
+            ):
+                chunk_start, chunk_bytes = self.last_chunk
+            else:
+                chunk_start, chunk_bytes = self._get_chunk_for_offset()
+                if chunk_start is None:
+                    chunk_start, chunk_bytes = self._append_cache_chunk()
+                self.last_chunk = (chunk_start, chunk_bytes)
+
+            chunk_offset = self.offset - chunk_start
+            chunk_end = min(end - chunk_start, len(chunk_bytes))
+            if chunk_end <= chunk_offset:
+                # Object is shorter than its listed size
+                break
+            parts.append(memoryview(chunk_bytes)[chunk_offset:chunk_end])
+            self.offset = chunk_start + chunk_end
+        return b''.join(parts)
 
     def _get_chunk_for_offset(self):
         self.chunk_lookups += 1
@@ -185,14 +239,13 @@ class S3FileReader(BinaryIO):
             math.floor(self.offset / self.cache_chunk_size)
             * self.cache_chunk_size
         )
-        return next(
-            (
-                (chunk_start, chunk_bytes)
-                for chunk_start, chunk_bytes in self.cache_chunks
-                if chunk_start == chunk_index
-            ),
-            (None, None),
-        )
+        chunk_bytes = self.cache_chunks.get(chunk_index)
+        if chunk_bytes is None:
+            self.cache_misses += 1
+            return None, None
+        self.cache_hits += 1
+        self.cache_chunks.move_to_end(chunk_index)
+        return chunk_index, chunk_bytes
 
     def _append_cache_chunk(self):
 
@@ -200,29 +253,115 @@ class S3FileReader(BinaryIO):
             math.floor(self.offset / self.cache_chunk_size)
             * self.cache_chunk_size
         )
+
+        if self.read_ahead:
+            chunk_bytes = self.__prefetched_range(chunk_start)
+        else:
+            chunk_bytes = self.__get_range(chunk_start)
+
+        # Least recently used chunks are evicted, but the new chunk is
+        # always kept even if it alone exceeds the budget
+        while (
+                self.cache_chunks
+                and self.cache_bytes + len(chunk_bytes) > self.cache_byte_limit
+        ):
+            _, evicted = self.cache_chunks.popitem(last=False)
+            self.cache_bytes -= len(evicted)
+            self.cache_evictions += 1
+
+        self.cache_chunks[chunk_start] = chunk_bytes
+        self.cache_bytes += len(chunk_bytes)
+
+        self.bytes_received += len(chunk_bytes)
+        return chunk_start, chunk_bytes
+
+    def __get_range(self, chunk_start: int) -> bytes:
+        revision = self.version or self.e_tag
+        if self.block_cache and revision:
+            return self.block_cache.get(
+                (
+                    self.bucket,
+                    self.key,
+                    revision,
+                    chunk_start,
+                    self.cache_chunk_size
+                ),
+                lambda: self.__download_range(chunk_start)
+            )
+        return self.__download_range(chunk_start)
+
+    def __download_range(self, chunk_start: int) -> bytes:
         chunk_end = min(chunk_start + self.cache_chunk_size, self.size()) - 1
 
-        response = self.s3_client.get_object(
-            Bucket=self.bucket,
-            Key=self.key,
-            Range="bytes={0}-{1}".format(str(chunk_start), str(chunk_end)),
-            **({"VersionId": self.version} if self.version else {}),
+        if self.version:
+            revision: Dict[str, str] = {"VersionId": self.version}
+        elif self.e_tag:
+            # Blocks are cached by ETag, they must all be of that revision
+            revision = {"IfMatch": self.e_tag}
+        else:
+            revision = {}
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Range="bytes={0}-{1}".format(str(chunk_start), str(chunk_end)),
+                **revision,
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in (
+                    "PreconditionFailed", "412"
+            ):
+                raise SourceModifiedException(
+                    f"s3://{self.bucket}/{self.key} was modified while read"
+                ) from e
+            raise
+        chunk_bytes: bytes = response["Body"].read()
+        return chunk_bytes
+
+    def __prefetched_range(self, chunk_start: int) -> bytes:
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(
+                max_workers=self.read_ahead,
+                thread_name_prefix=self.__class__.__name__
+            )
+
+        window = range(
+            chunk_start,
+            min(
+                chunk_start + self.read_ahead * self.cache_chunk_size,
+                self._size
+            ),
+            self.cache_chunk_size
         )
 
-        if len(self.cache_chunks) >= self.cache_chunk_count_limit:
-            self.cache_chunks.pop(0)
+        # Prefetches behind a seek are not needed anymore
+        for start in list(self.__prefetch):
+            if start not in window:
+                self.__prefetch.pop(start).cancel()
 
-        chunk = (chunk_start, response["Body"].read())
-        self.cache_chunks.append(chunk)
+        for start in window:
+            if start not in self.__prefetch and start not in self.cache_chunks:
+                self.__prefetch[start] = self.__executor.submit(
+                    self.__get_range, start
+                )
 
-        self.bytes_received += chunk_end - chunk_start + 1
-        return chunk
+        chunk_bytes: bytes = self.__prefetch.pop(chunk_start).result()
+        return chunk_bytes
 
     def close(self) -> None:
         if self.obj_body:
             self.obj_body.close()
 
+        for future in self.__prefetch.values():
+            future.cancel()
+        self.__prefetch.clear()
+        if self.__executor:
+            self.__executor.shutdown(wait=False)
+            self.__executor = None
+
         self.cache_chunks.clear()
+        self.cache_bytes = 0
+        self.last_chunk = None
         self.__closed = True
 
     def fileno(self) -> int:
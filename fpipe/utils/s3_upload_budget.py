@@ -0,0 +1,55 @@
+import threading
+from typing import Optional
+
+
+class S3UploadBudget:
+    """Bytes buffered by S3FileWriters and not yet uploaded
+
+    Shared between writers, a writer reserves a part before filling it and
+    blocks while the budget is used up, the part is released once uploaded.
+    A part larger than the whole budget is let through when nothing else is
+    reserved, so a small budget slows writers down instead of stopping them.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        :param max_bytes: bytes reserved at most, by all writers together
+        """
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be at least 1")
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.peak = 0
+        self.waits = 0
+        self.__condition = threading.Condition()
+
+    def __fits(self, size: int) -> bool:
+        return self.used == 0 or self.used + size <= self.max_bytes
+
+    def acquire(self, size: int, timeout: Optional[float] = None):
+        """
+        Reserves size bytes, blocks until they fit in the budget
+
+        :param timeout: seconds to wait, TimeoutError when exceeded
+        """
+        with self.__condition:
+            if not self.__fits(size):
+                self.waits += 1
+                if not self.__condition.wait_for(
+                        lambda: self.__fits(size), timeout
+                ):
+                    raise TimeoutError(
+                        f"Upload budget of {self.max_bytes} bytes is used up"
+                    )
+            self.used += size
+            self.peak = max(self.peak, self.used)
+
+    def release(self, size: int):
+        with self.__condition:
+            self.used -= size
+            self.__condition.notify_all()
+
+    @property
+    def available(self) -> int:
+        """Bytes that can be reserved without blocking"""
+        return max(self.max_bytes - self.used, 0)
@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+from typing import Any, Dict, IO, Optional
+
+
+class S3UploadCheckpoint:
+    """Upload ID and uploaded parts of a multipart upload, kept in a file
+
+    The file holds one JSON object per line, the upload first, then a line
+    for each part as it is uploaded. A line cut short when the process died
+    is ignored when the checkpoint is loaded.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: checkpoint file, created when an upload starts
+        """
+        self.path = path
+        self.upload: Optional[Dict[str, Any]] = None
+        self.parts: Dict[int, Dict[str, Any]] = {}
+        self.__file: Optional[IO[str]] = None
+        self.__lock = threading.Lock()
+
+    def load(self) -> bool:
+        """
+        Reads the checkpoint file
+
+        :return: False when there is no checkpoint
+        """
+        self.upload = None
+        self.parts = {}
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    if self.upload is None:
+                        self.upload = entry
+                    else:
+                        self.parts[entry["PartNumber"]] = entry
+        except FileNotFoundError:
+            return False
+        return self.upload is not None
+
+    def start(self, upload: Dict[str, Any], *parts: Dict[str, Any]):
+        """
+        Replaces the checkpoint file
+
+        :param upload: describes the upload, including its UploadId
+        :param parts: parts uploaded so far
+        """
+        with self.__lock:
+            self.__close()
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                for entry in (upload,) + parts:
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp, self.path)
+            self.upload = upload
+            self.parts = {p["PartNumber"]: p for p in parts}
+            self.__file = open(self.path, "a")
+
+    def add(self, part: Dict[str, Any]):
+        """
+        Records an uploaded part
+
+        :param part: PartNumber, ETag, Size and checksum of the part
+        """
+        with self.__lock:
+            self.parts[part["PartNumber"]] = part
+            if self.__file is not None:
+                self.__file.write(json.dumps(part) + "\n")
+                self.__file.flush()
+
+    def __close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def close(self):
+        with self.__lock:
+            self.__close()
+
+    def remove(self):
+        """Deletes the checkpoint file, once the upload is complete"""
+        with self.__lock:
+            self.__close()
+            self.upload = None
+            self.parts = {}
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,158 @@
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, \
+    Tuple, Type
+
+Job = Tuple[Future, Callable, tuple]
+
+
+class S3UploadPool:
+    """Upload threads shared between S3FileWriters
+
+    At most max_workers parts are uploaded at once, and at most max_parts
+    parts are queued or being uploaded, whatever the number of writers, so
+    memory held by uploads is bounded by max_parts times the part size.
+    Writers block in submit() until there is room.
+
+    Workers take parts from the writers in turn, so a writer with many
+    queued parts does not hold back the others.
+    """
+
+    def __init__(self, max_workers: int = 16, max_parts: Optional[int] = None):
+        """
+        :param max_workers: parts uploaded at once
+        :param max_parts: parts queued or being uploaded, defaults to
+        twice max_workers
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self.max_parts = max(max_parts or 2 * max_workers, max_workers)
+
+        self.__slots = threading.BoundedSemaphore(self.max_parts)
+        self.__condition = threading.Condition()
+        self.__queues: Dict[Hashable, Deque[Job]] = {}
+        # Writers with queued parts, in the order they are served
+        self.__turns: Deque[Hashable] = deque()
+        self.__threads: List[threading.Thread] = []
+        self.__idle = 0
+        self.__shutdown = False
+        self.in_flight = 0
+
+    def submit(self, owner: Hashable, fn: Callable, *args: Any,
+               timeout: Optional[float] = None) -> Future:
+        """
+        Queues fn(*args), blocks while max_parts parts are queued or being
+        uploaded
+
+        :param owner: writer the part belongs to, owners are served in turn
+        :param timeout: seconds to wait for room, TimeoutError when exceeded
+        :return: future with the result of fn
+        """
+        if not self.__slots.acquire(timeout=timeout):
+            raise TimeoutError("Upload pool is full")
+        future: Future = Future()
+        with self.__condition:
+            if self.__shutdown:
+                self.__slots.release()
+                raise RuntimeError("Upload pool is shut down")
+            queue = self.__queues.get(owner)
+            if queue is None:
+                queue = self.__queues[owner] = deque()
+                self.__turns.append(owner)
+            queue.append((future, fn, args))
+            if self.__idle:
+                # Counted as woken, the next part of a burst starts a worker
+                # instead of notifying the same one again
+                self.__idle -= 1
+                self.__condition.notify()
+            elif len(self.__threads) < self.max_workers:
+                self.__start_worker()
+        return future
+
+    def pending(self, owner: Hashable) -> int:
+        """Parts of owner waiting for a worker"""
+        with self.__condition:
+            return len(self.__queues.get(owner, ()))
+
+    def cancel(self, owner: Hashable) -> int:
+        """
+        Drops parts of owner waiting for a worker, parts being uploaded are
+        not interrupted
+
+        :return: number of parts dropped
+        """
+        with self.__condition:
+            queue = self.__queues.pop(owner, None)
+            if queue is None:
+                return 0
+            self.__turns.remove(owner)
+        for future, _, _ in queue:
+            future.cancel()
+            self.__slots.release()
+        return len(queue)
+
+    def __start_worker(self):
+        thread = threading.Thread(
+            target=self.__work, name=f"S3UploadPool-{len(self.__threads)}",
+            daemon=True
+        )
+        self.__threads.append(thread)
+        thread.start()
+
+    def __next_job(self) -> Optional[Job]:
+        with self.__condition:
+            while not self.__turns:
+                if self.__shutdown:
+                    return None
+                # Taken back by the submit() notifying this worker
+                self.__idle += 1
+                self.__condition.wait()
+            owner = self.__turns.popleft()
+            queue = self.__queues[owner]
+            job = queue.popleft()
+            if queue:
+                self.__turns.append(owner)
+            else:
+                del self.__queues[owner]
+            self.in_flight += 1
+            return job
+
+    def __work(self):
+        while True:
+            job = self.__next_job()
+            if job is None:
+                break
+            future, fn, args = job
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self.__condition:
+                    self.in_flight -= 1
+                self.__slots.release()
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stops the workers once queued parts are uploaded
+
+        :param wait: wait for the workers to stop
+        """
+        with self.__condition:
+            self.__shutdown = True
+            self.__idle = 0
+            self.__condition.notify_all()
+        if wait:
+            for thread in self.__threads:
+                thread.join()
+
+    def __enter__(self) -> "S3UploadPool":
+        return self
+
+    def __exit__(self, t: Optional[Type[BaseException]],
+                 value: Optional[BaseException], traceback=None):
+        self.shutdown()
@@ -1,8 +1,9 @@
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
 from queue import Queue
 from typing import AnyStr, List, Optional, Iterable, Iterator, Type,\
-    BinaryIO, Union
+    BinaryIO, Union, Dict, Tuple, Deque
 
 from botocore.client import BaseClient
 from botocore.exceptions import (
@@ -10,13 +11,23 @@ from botocore.exceptions import (
     BotoCoreError,
 )
 
-from fpipe.exceptions import S3WriteException
+from fpipe.exceptions import S3WriteException, SeekException
+from fpipe.utils import s3_checksum
 from fpipe.utils.multipart_buffer import MultipartBuffer
-from fpipe.utils.s3_writer_worker import S3FileProgress, worker
+from fpipe.utils.s3_upload_budget import S3UploadBudget
+from fpipe.utils.s3_upload_checkpoint import S3UploadCheckpoint
+from fpipe.utils.s3_upload_pool import S3UploadPool
+from fpipe.utils.s3_writer_worker import S3FileProgress, worker, STOP, \
+    UploadStats, upload_part
 
 
 class S3FileWriter(BinaryIO, ThreadPoolExecutor):
     MIN_BLOCK_SIZE = 5 * 2 ** 20
+    MAX_BLOCK_SIZE = 5 * 2 ** 30
+    MAX_PARTS = 10000
+    # Part size doubles every PART_GROWTH_INTERVAL parts, so uploads of
+    # unknown size start with small parts and still fit in MAX_PARTS
+    PART_GROWTH_INTERVAL = 500
 
     def __init__(
             self,
@@ -31,6 +42,11 @@ class S3FileWriter(BinaryIO, ThreadPoolExecutor):
             progress_queue: Optional[Queue] = None,
             max_part_upload_retries: int = 10,
             queue_timeout=300,
+            size_hint: Optional[int] = None,
+            checksum: Optional[str] = s3_checksum.MD5,
+            upload_pool: Optional[S3UploadPool] = None,
+            memory_budget: Optional[S3UploadBudget] = None,
+            checkpoint: Optional[str] = None,
     ):
         """
 
@@ -38,13 +54,25 @@ class S3FileWriter(BinaryIO, ThreadPoolExecutor):
         :param bucket: S3 bucket name
         :param key: S3 key name
         :param mime: mime type of object
-        :param block_size: block size lower limit of 5MB
+        :param block_size: size of the first parts, lower limit of 5MB
         :param full_control: String to set full object control to addition
         aws users/accounts
         :param worker_limit: limit for parallel uploads
         :param progress_queue: a queue providing upload status feedback
         :param max_part_upload_retries: max retries if a part fails uploading
         :type queue_timeout: Timeout for adding new data to queue
+        :param size_hint: expected size of the object, parts are made large
+        enough for the object to fit in MAX_PARTS parts
+        :param checksum: MD5, CRC32, CRC32C or SHA256, calculated as data is
+        written and validated by S3. None disables validation
+        :param upload_pool: uploads parts with threads shared between
+        writers instead of worker_limit threads per writer, worker_limit
+        is ignored when set
+        :param memory_budget: bytes buffered and not yet uploaded, shared
+        between writers, write() blocks while it is used up
+        :param checkpoint: file recording the upload ID and uploaded parts.
+        A failed upload is then kept instead of aborted, and is resumed by
+        the next writer with the same checkpoint, see resume_offset
         """
         super().__init__()
         if mime is None:
@@ -56,22 +84,127 @@ class S3FileWriter(BinaryIO, ThreadPoolExecutor):
         self.bucket = bucket
         self.key = key
         self.mime = mime
-        self.buffer = MultipartBuffer(block_size)
+        self.block_size = block_size
+        self.size_hint = size_hint
+        if checksum:
+            # Fails early on unknown or unavailable algorithms
+            s3_checksum.new(checksum)
+        self.checksum = checksum
+        self.memory_budget = memory_budget
+        # Bytes reserved from memory_budget, and reserved by each part
+        self.reserved = 0
+        self.__reservations: Deque[int] = deque()
+        self.__reserved_lock = threading.Lock()
+        self.buffer = MultipartBuffer(
+            block_size, part_size=self.part_size, checksum=checksum,
+            allocate=self.__reserve if memory_budget else None
+        )
         self.full_control = full_control
         self.progress_queue = progress_queue if progress_queue else Queue()
 
         self.stop_workers_request = threading.Event()
         self.work_queue: Queue = Queue(maxsize=worker_limit)
         self.result_queue: Queue = Queue()
+        self.stats = UploadStats()
+        self.workers: List[Future] = []
+        self.upload_pool = upload_pool
+        self.uploads: List[Future] = []
         self.worker_limit = worker_limit
         self.max_part_upload_retries = max_part_upload_retries
         self.queue_timeout = queue_timeout
+        self.mpu = None
         self.mpu_res = None
+        self.checkpoint = (
+            S3UploadCheckpoint(checkpoint) if checkpoint else None
+        )
+        # Parts uploaded before the upload was resumed
+        self.resumed_parts: List[Dict] = []
+        self.resume_offset = 0
+        self.__position = 0
         self.__closed = False
 
     def __enter__(self) -> "S3FileWriter":
         self.buffer.clear()
+        # Multipart upload is started once the first part is complete,
+        # smaller objects are written with a single put_object
+        self.mpu = None
+        self.resumed_parts = []
+        self.resume_offset = 0
+        self.__position = 0
+        if self.checkpoint and self.checkpoint.load():
+            self.__resume()
+        return self
+
+    def __checkpoint_upload(self, upload_id: str) -> Dict:
+        # A checkpoint is only resumed by an upload split into the same parts
+        return {
+            "Bucket": self.bucket,
+            "Key": self.key,
+            "UploadId": upload_id,
+            "BlockSize": self.block_size,
+            "SizeHint": self.size_hint,
+            "Checksum": self.checksum,
+        }
+
+    def __resume(self):
+        checkpoint = self.checkpoint
+        assert checkpoint is not None and checkpoint.upload is not None
+        upload_id = checkpoint.upload.get("UploadId")
+        if checkpoint.upload != self.__checkpoint_upload(upload_id):
+            # Parts of the stale upload are not left behind
+            try:
+                self.client.abort_multipart_upload(
+                    Bucket=checkpoint.upload.get("Bucket", self.bucket),
+                    Key=checkpoint.upload.get("Key", self.key),
+                    UploadId=upload_id
+                )
+            except ClientError:
+                # Completed or aborted already
+                pass
+            checkpoint.remove()
+            return
+        try:
+            uploaded = {
+                p["PartNumber"]: p
+                for page in self.client.get_paginator("list_parts").paginate(
+                    Bucket=self.bucket, Key=self.key, UploadId=upload_id
+                )
+                for p in page.get("Parts", [])
+            }
+        except ClientError:
+            # The upload was completed or aborted
+            checkpoint.remove()
+            return
+
+        # Parts uploaded in order from the first are skipped
+        parts = []
+        while True:
+            part = checkpoint.parts.get(len(parts) + 1)
+            listed = uploaded.get(len(parts) + 1)
+            if (
+                    part is None or listed is None
+                    or part["ETag"] != listed["ETag"]
+                    or part["Size"] != listed["Size"]
+            ):
+                break
+            parts.append(part)
+
+        self.mpu = {"UploadId": upload_id}
+        self.resumed_parts = [
+            {k: v for k, v in p.items() if k != "Size"} for p in parts
+        ]
+        self.resume_offset = sum(p["Size"] for p in parts)
+        self.buffer.clear(part_number=len(parts) + 1)
+        checkpoint.start(checkpoint.upload, *parts)
+        self.progress_queue.put(
+            S3FileProgress(
+                "Multipart",
+                f"Resumed after {len(parts)} parts, {self.resume_offset} bytes"
+            )
+        )
+        self.__start_workers()
 
+    def __object_arguments(self) -> Dict[str, str]:
         arguments = {
             "Bucket": self.bucket,
             "Key": self.key,
@@ -79,11 +212,24 @@ class S3FileWriter(BinaryIO, ThreadPoolExecutor):
         }
         if self.full_control:
             arguments["GrantFullControl"] = self.full_control
+        return arguments
 
+    def __start_multipart(self):
+        arguments = self.__object_arguments()
+        if self.checksum and self.checksum != s3_checksum.MD5:
+            arguments["ChecksumAlgorithm"] = self.checksum
         self.mpu = self.client.create_multipart_upload(**arguments)
         self.progress_queue.put("Created multipart upload")
+        if self.checkpoint:
+            self.checkpoint.start(
+                self.__checkpoint_upload(self.mpu["UploadId"])
+            )
+        self.__start_workers()
 
-        for _ in range(self.worker_limit):
+    def __start_workers(self):
+        if self.upload_pool is not None:
+            return
+        self.workers = [
             self.submit(
                 worker,
                 self.client,
@@ -95,16 +241,119 @@ class S3FileWriter(BinaryIO, ThreadPoolExecutor):
                 self.key,
                 self.mpu["UploadId"],
                 self.max_part_upload_retries,
+                self.stats,
+                self.checksum,
+                self.__release,
+                self.checkpoint,
             )
+            for _ in range(self.worker_limit)
+        ]
 
-        return self
+    def part_size(self, part_number: int) -> int:
+        """
+        Size of a part, grows with the part number and is at least large
+        enough for size_hint
+
+        :param part_number: starting at 1
+        :return: size in bytes
+        """
+        size: int = self.block_size << (
+            (part_number - 1) // self.PART_GROWTH_INTERVAL
+        )
+        if self.size_hint:
+            # Rounded up to MiB
+            hinted = -(-self.size_hint // self.MAX_PARTS)
+            size = max(size, -(-hinted // 2 ** 20) * 2 ** 20)
+        return min(size, self.MAX_BLOCK_SIZE)
+
+    @property
+    def queue_depth(self) -> int:
+        """Parts waiting for a worker"""
+        if self.upload_pool is not None:
+            return self.upload_pool.pending(self)
+        depth: int = self.work_queue.qsize()
+        return depth
+
+    @property
+    def in_flight(self) -> int:
+        """Parts being uploaded"""
+        in_flight: int = self.stats.in_flight
+        return in_flight
 
     def write(self, s: Union[bytes, bytearray]) -> int:
-        self.buffer.add(s)
+        size = len(s)
+        skip = min(max(self.resume_offset - self.__position, 0), size)
+        self.__position += size
+        # Bytes already uploaded when the upload was resumed
+        self.buffer.add(memoryview(s)[skip:] if skip else s)
+        self.__queue_parts()
+        return size
+
+    def __queue_parts(self):
+        while self.buffer.full():
+            if self.mpu is None:
+                self.__start_multipart()
+            self.__queue_part()
+
+    def __reserve(self, size: int):
+        # Called by the buffer before it allocates a part. Complete parts are
+        # queued first, their uploads free the budget waited for
+        self.__queue_parts()
+        assert self.memory_budget is not None
+        self.memory_budget.acquire(size, timeout=self.queue_timeout)
+        with self.__reserved_lock:
+            self.reserved += size
+            self.__reservations.append(size)
+
+    def __release(self, size: int):
+        if self.memory_budget is None:
+            return
+        with self.__reserved_lock:
+            # Parts still uploading after the writer is closed were
+            # already released
+            size = min(size, self.reserved)
+            self.reserved -= size
+        if size:
+            self.memory_budget.release(size)
+
+    def __queue_part(self):
+        part = self.__next_part()
+        if self.upload_pool is None:
+            self.work_queue.put(part, timeout=self.queue_timeout)
+            return
+        self.uploads.append(
+            self.upload_pool.submit(
+                self,
+                upload_part,
+                self.client,
+                self.progress_queue,
+                self.bucket,
+                self.key,
+                self.mpu["UploadId"],
+                part,
+                self.max_part_upload_retries,
+                self.stats,
+                self.checksum,
+                self.__release,
+                self.checkpoint,
+                timeout=self.queue_timeout,
+            )
+        )
 
-        if self.buffer.full():
-            self.work_queue.put(self.buffer.get(), timeout=self.queue_timeout)
-        return len(s)
+    def __next_part(self) -> Tuple[bytearray, int, Optional[bytes]]:
+        data, part_number = self.buffer.get()
+        digest = (
+            self.buffer.pop_checksum(part_number) if self.checksum else None
+        )
+        if self.memory_budget is not None:
+            with self.__reserved_lock:
+                reserved = (
+                    self.__reservations.popleft()
+                    if self.__reservations else 0
+                )
+            # The last part is smaller than reserved
+            self.__release(reserved - len(data))
+        return data, part_number, digest
 
     def __exit__(
             self,
@@ -113,17 +362,41 @@ class S3FileWriter(BinaryIO, ThreadPoolExecutor):
             traceback=None,
     ) -> bool:
         try:
-            self.close()
-            return t is None
-        except (ClientError, S3WriteException):
-            self.abort()
-            raise
+            if t is not None:
+                # What was written is not the whole object, the upload is
+                # kept to be resumed when checkpoint is set
+                self.abort()
+                return False
+            try:
+                self.close()
+            except (ClientError, S3WriteException):
+                self.abort()
+                raise
+            return True
         finally:
             self.shutdown()
+            self.buffer.clear()
+            self.__reservations.clear()
+            # Parts skipped or dropped after a failure
+            self.__release(self.reserved)
+            if self.checkpoint:
+                self.checkpoint.close()
             self.__closed = True
 
     def abort(self):
+        """
+        Stops uploading parts and aborts the multipart upload, or keeps it to
+        be resumed when checkpoint is set
+        """
         self.stop_workers_request.set()
+        if self.upload_pool is not None:
+            self.upload_pool.cancel(self)
+        for w in self.workers:
+            if not w.done():
+                # Parts still queued are skipped up to STOP
+                self.work_queue.put(STOP, timeout=self.queue_timeout)
+        if self.mpu is None or self.checkpoint:
+            return
         try:
             self.client.abort_multipart_upload(
                 Bucket=self.bucket, Key=self.key,
@@ -136,13 +409,30 @@ class S3FileWriter(BinaryIO, ThreadPoolExecutor):
 
     def close(self):
         try:
-            results = self.__get_worker_result()
-            self.__finalize_multipart(results)
+            if self.mpu is None:
+                self.__put_object()
+            else:
+                results = self.resumed_parts + self.__get_worker_result()
+                self.__finalize_multipart(results)
+                if self.checkpoint:
+                    self.checkpoint.remove()
         except BotoCoreError:
             raise
         except Exception as e:
             raise S3WriteException("Could not close Multipart upload") from e
 
+    def __put_object(self):
+        body, _, digest = self.__next_part()
+        self.mpu_res = self.client.put_object(
+            Body=body,
+            **self.__object_arguments(),
+            **s3_checksum.upload_arguments(self.checksum, digest)
+        )
+        self.__release(len(body))
+        self.progress_queue.put(
+            S3FileProgress("Put", "Put object complete")
+        )
+
     def __finalize_multipart(self, results):
         results.sort(key=lambda x: x["PartNumber"])
         self.mpu_res = self.client.complete_multipart_upload(
@@ -158,12 +448,17 @@ class S3FileWriter(BinaryIO, ThreadPoolExecutor):
 
     def __get_worker_result(self):
         if not self.buffer.empty():
-            self.work_queue.put(
-                self.buffer.get(), timeout=self.queue_timeout
-            )
+            self.__queue_part()
 
-        self.stop_workers_request.set()
-        self.work_queue.join()
+        if self.upload_pool is not None:
+            # Raises the exception of a failed upload
+            return [u.result() for u in self.uploads]
+
+        for _ in self.workers:
+            self.work_queue.put(STOP, timeout=self.queue_timeout)
+        for w in self.workers:
+            # Raises the exception of a failed worker
+            w.result()
         results = []
         while not self.result_queue.empty():
             results.append(self.result_queue.get_nowait())
@@ -191,14 +486,23 @@ class S3FileWriter(BinaryIO, ThreadPoolExecutor):
     def readlines(self, hint: int = ...) -> List[AnyStr]:
         raise NotImplementedError
 
-    def seek(self, offset: int, whence: int = ...) -> int:
-        raise NotImplementedError
+    def seek(self, offset: int, whence: int = 0) -> int:
+        """
+        Skips bytes already uploaded, from the current position up to
+        resume_offset, so a seekable source can skip them as well
+        """
+        if whence != 0 or not self.__position <= offset <= self.resume_offset:
+            raise SeekException(
+                f"Can only seek forward to at most {self.resume_offset}"
+            )
+        self.__position = offset
+        return offset
 
     def seekable(self) -> bool:
         raise NotImplementedError
 
     def tell(self) -> int:
-        raise NotImplementedError
+        return self.__position
 
     def truncate(self, size: Optional[int] = ...) -> int:
         raise NotImplementedError
@@ -1,11 +1,16 @@
-import hashlib
-from queue import Empty, Queue
-from threading import Event
+from queue import Queue
+from threading import Event, Lock
+from typing import Optional, Dict, Any, Tuple, Callable
 
-import gc
 from botocore import exceptions
 from botocore.client import BaseClient
 
+from fpipe.utils import s3_checksum
+from fpipe.utils.s3_upload_checkpoint import S3UploadCheckpoint
+
+# Put on the work queue once per worker when there are no more parts
+STOP = None
+
 
 class CorruptedMultipartError(Exception):
     pass
@@ -24,6 +29,30 @@ def checksum_validates(data_etag, s3_etag):
     return data_etag == s3_etag[1:-1]
 
 
+class UploadStats(object):
+    """Counts parts uploaded by the workers of one upload"""
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.in_flight = 0
+        self.parts_uploaded = 0
+        self.bytes_uploaded = 0
+
+    def started(self):
+        with self.__lock:
+            self.in_flight += 1
+
+    def finished(self, size: Optional[int] = None):
+        """
+        :param size: bytes uploaded, None if the upload failed
+        """
+        with self.__lock:
+            self.in_flight -= 1
+            if size is not None:
+                self.parts_uploaded += 1
+                self.bytes_uploaded += size
+
+
 def worker(
         client: BaseClient,
         stop_workers_request: Event,
@@ -34,52 +63,132 @@ def worker(
         key: str,
         upload_id: str,
         max_retries: int,
+        stats: Optional[UploadStats] = None,
+        checksum: Optional[str] = s3_checksum.MD5,
+        release: Optional[Callable[[int], None]] = None,
+        checkpoint: Optional[S3UploadCheckpoint] = None,
 ):
-    retries = 0
-
-    while not stop_workers_request.is_set() or work_queue.qsize() > 0:
+    """
+    Uploads parts from work_queue until STOP is received
+
+    :param stop_workers_request: set to skip parts still in work_queue
+    :param work_queue: (data, part number) or (data, part number, digest)
+    tuples, followed by STOP
+    :param result_queue: PartNumber, ETag and checksum of uploaded parts
+    :param max_retries: retries of each part before giving up
+    :param stats: counts parts in flight and uploaded
+    :param checksum: algorithm from fpipe.utils.s3_checksum sent along with
+    each part for S3 to validate, None disables validation
+    :param release: called with the size of each part once it is uploaded,
+    or has failed
+    :param checkpoint: records each part once it is uploaded
+    """
+    stats = stats or UploadStats()
+    while True:
+        item = work_queue.get()
         try:
-            data, part_index = work_queue.get(timeout=0.05)
-        except Empty:
-            continue
+            if item is STOP:
+                break
+            if stop_workers_request.is_set():
+                continue
+            result_queue.put(
+                upload_part(
+                    client, progress_queue, bucket, key, upload_id, item,
+                    max_retries, stats, checksum, release, checkpoint
+                )
+            )
+        finally:
+            work_queue.task_done()
 
-        try:
 
+def upload_part(
+        client: BaseClient,
+        progress_queue: Queue,
+        bucket: str,
+        key: str,
+        upload_id: str,
+        item: Tuple,
+        max_retries: int,
+        stats: UploadStats,
+        checksum: Optional[str] = s3_checksum.MD5,
+        release: Optional[Callable[[int], None]] = None,
+        checkpoint: Optional[S3UploadCheckpoint] = None,
+) -> Dict[str, Any]:
+    """
+    Uploads one part, see worker()
+
+    :param item: (data, part number) or (data, part number, digest)
+    :return: PartNumber, ETag and checksum of the part
+    """
+    data, part_index = item[:2]
+    digest: Optional[bytes] = item[2] if len(item) > 2 else None
+    if checksum and digest is None:
+        hasher = s3_checksum.new(checksum)
+        hasher.update(data)
+        digest = hasher.digest()
+    stats.started()
+    try:
+        result = _upload_part(
+            client, progress_queue, bucket, key, upload_id,
+            data, part_index, max_retries, checksum, digest
+        )
+    except BaseException:
+        stats.finished()
+        raise
+    finally:
+        if release:
+            release(len(data))
+    stats.finished(len(data))
+    if checkpoint:
+        checkpoint.add(dict(result, Size=len(data)))
+    return result
+
+
+def _upload_part(client, progress_queue: Queue, bucket: str, key: str,
+                 upload_id: str, data, part_index: int, max_retries: int,
+                 checksum: Optional[str], digest: Optional[bytes]
+                 ) -> Dict[str, Any]:
+    checksum_arguments = s3_checksum.upload_arguments(checksum, digest)
+    retries = 0
+    while True:
+        try:
             part = client.upload_part(
                 PartNumber=part_index,
                 Body=data,
                 Bucket=bucket,
                 Key=key,
                 UploadId=upload_id,
+                **checksum_arguments
             )
 
-            hash_md5 = hashlib.md5()
-            hash_md5.update(data)
-            data_etag = hash_md5.hexdigest()
+            s3_etag: str = part["ETag"]
 
-            s3_etag = part["ETag"]
-
-            if not checksum_validates(data_etag, s3_etag):
-                progress = S3FileProgress(
-                    "Part nr {} upload".format(part_index),
-                    "Incorrect checksum {}!={}".format(data_etag, s3_etag),
-                )
-                progress_queue.put(progress)
-                raise CorruptedMultipartError(progress)
-            else:
-                progress_queue.put(
-                    S3FileProgress(
+            if checksum == s3_checksum.MD5 and digest is not None:
+                data_etag = digest.hex()
+                if not checksum_validates(data_etag, s3_etag):
+                    progress = S3FileProgress(
                         "Part nr {} upload".format(part_index),
-                        "ok [{}]".format(len(data)),
+                        "Incorrect checksum {}!={}".format(
+                            data_etag, s3_etag
+                        ),
                     )
-                )
-            work_queue.task_done()
-            result_queue.put({"PartNumber": part_index, "ETag": s3_etag})
+                    progress_queue.put(progress)
+                    raise CorruptedMultipartError(progress)
 
-            gc.collect()  # boto3 has memory leaks for some reason
+            progress_queue.put(
+                S3FileProgress(
+                    "Part nr {} upload".format(part_index),
+                    "ok [{}]".format(len(data)),
+                )
+            )
+            result = {"PartNumber": part_index, "ETag": s3_etag}
+            if checksum and checksum != s3_checksum.MD5:
+                # Additional checksums are repeated when completing
+                name = f"Checksum{checksum}"
+                result[name] = checksum_arguments[name]
+            return result
         except (CorruptedMultipartError, exceptions.ClientError):
             if retries < max_retries:
-                work_queue.put((data, part_index))
                 retries += 1
             else:
                 raise
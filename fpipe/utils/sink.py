@@ -0,0 +1,123 @@
+import threading
+from typing import Any, AnyStr, Dict, Iterable, Iterator, List, Optional, \
+    Type, BinaryIO, Callable, Union
+
+from fpipe.exceptions import FileDataException
+
+
+class SinkStream(BinaryIO):
+    """Stream of a file written by a generator in sink mode
+
+    Nothing can be read back, flush() waits until the write is complete and
+    raises the exception of a failed write. The result of the write is
+    available as FileData through future(), once it is complete.
+    """
+
+    def __init__(self):
+        self.result: Dict[str, Any] = {}
+        self.__done = threading.Event()
+        self.__error: Optional[BaseException] = None
+        self.__closed = False
+
+    def finish(self, error: Optional[BaseException] = None, **result: Any):
+        """
+        Called by the writer when the write is complete, or has failed
+
+        :param error: exception of a failed write
+        :param result: values for future()
+        """
+        self.result.update(result)
+        self.__error = error
+        self.__done.set()
+
+    def done(self) -> bool:
+        done: bool = self.__done.is_set()
+        return done
+
+    def future(self, name: str, value_class: Type) -> Callable[[], Any]:
+        """
+        :param name: key of the result
+        :param value_class: FileData the value is for
+        :return: future for FileData(future=...), raising FileDataException
+        until the write is complete, or when it did not return name
+        """
+        def get():
+            if not self.__done.is_set() or name not in self.result:
+                raise FileDataException(value_class)
+            return self.result[name]
+        return get
+
+    def __enter__(self) -> "SinkStream":
+        return self
+
+    def __exit__(
+            self,
+            t: Optional[Type[BaseException]],
+            value: Optional[BaseException],
+            traceback=None,
+    ) -> bool:
+        self.close()
+        return t is None
+
+    def flush(self) -> None:
+        self.__done.wait()
+        if self.__error is not None:
+            raise self.__error
+
+    def close(self) -> None:
+        self.__closed = True
+
+    @property
+    def closed(self):
+        return self.__closed
+
+    def readable(self) -> bool:
+        return False
+
+    def writable(self) -> bool:
+        return False
+
+    def seekable(self) -> bool:
+        return False
+
+    def fileno(self) -> int:
+        raise NotImplementedError
+
+    def isatty(self) -> bool:
+        return False
+
+    def read(self, n=-1) -> bytes:
+        raise NotImplementedError
+
+    def readline(self, limit: int = ...) -> AnyStr:
+        raise NotImplementedError
+
+    def readlines(self, hint: int = ...) -> List[AnyStr]:
+        raise NotImplementedError
+
+    def seek(self, offset: int, whence: int = ...) -> int:
+        raise NotImplementedError
+
+    def tell(self) -> int:
+        raise NotImplementedError
+
+    def truncate(self, size: Optional[int] = ...) -> int:
+        raise NotImplementedError
+
+    def write(self, s: Union[bytes, bytearray]) -> int:
+        raise NotImplementedError
+
+    def writelines(self, lines: Iterable[AnyStr]) -> None:
+        raise NotImplementedError
+
+    def mode(self):
+        raise NotImplementedError
+
+    def name(self) -> str:
+        raise NotImplementedError
+
+    def __next__(self) -> AnyStr:
+        raise NotImplementedError
+
+    def __iter__(self) -> Iterator[AnyStr]:
+        raise NotImplementedError
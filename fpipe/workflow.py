@@ -1,6 +1,8 @@
-from typing import Iterable, List, Union, Optional
+from typing import Iterable, List, Union, Optional, cast
 
 from fpipe.file import File
+from fpipe.gen.async_generator import AsyncFileGenerator
+from fpipe.gen.concurrent import Concurrent, AsyncConcurrent
 from fpipe.gen.generator import FileGenerator
 
 
@@ -10,15 +12,50 @@ class WorkFlow:
         self.generators: List[FileGenerator] = [*generators]
         self.last_gen: Optional[FileGenerator] = None
 
-    def compose(self, *source: Union[File, Iterable[File]]) -> FileGenerator:
+    def compose(
+            self,
+            *source: Union[File, Iterable[File]],
+            max_in_flight: int = 1,
+            ordered: bool = True
+    ) -> FileGenerator:
         """
         Sets up the workflow, but will not process anything before returned
         files are read from.
 
         :param source: A collection of File or generators of File to run the
         workflow with
-        :return: the output FileGenerator of the workflow
+        :param max_in_flight: number of source files to run through the
+        workflow at once, see fpipe.gen.concurrent.Concurrent
+        :param ordered: when running concurrently, yield files in the order
+        of the source files, instead of as soon as they are produced
+        :return: the output FileGenerator of the workflow, iterate it with
+        async for if the workflow contains AsyncFileGenerators
         """
+        if max_in_flight > 1:
+            gens = [self.first_gen, *self.generators]
+            n_async = sum(isinstance(g, AsyncFileGenerator) for g in gens)
+            if n_async == len(gens):
+                concurrent: FileGenerator = AsyncConcurrent(
+                    *cast(List[AsyncFileGenerator], gens),
+                    max_in_flight=max_in_flight,
+                    ordered=ordered
+                )
+            elif n_async:
+                raise ValueError(
+                    "max_in_flight > 1 requires a workflow of only "
+                    "FileGenerators or only AsyncFileGenerators"
+                )
+            else:
+                concurrent = Concurrent(
+                    self.first_gen,
+                    *self.generators,
+                    max_in_flight=max_in_flight,
+                    ordered=ordered
+                )
+            for s in source:
+                concurrent.chain(s)
+            self.last_gen = concurrent
+            return concurrent
 
         previous_gen = self.first_gen
 
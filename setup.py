@@ -27,6 +27,10 @@ setup(
     license='MIT',
     packages=find_packages(exclude=['*.tests']),
     install_requires=[
-        'botocore>=1.13.40'
+        # ChecksumAlgorithm and additional checksums of S3 uploads
+        'botocore>=1.24.0'
     ],
+    extras_require={
+        'crc32c': ['crc32c'],
+    },
 )
@@ -8,11 +8,12 @@ from pyftpdlib.servers import FTPServer
 
 
 class TestFTPServer(threading.Thread):
-    def __init__(self, port=None, *args, **kwargs):
+    def __init__(self, port=None, handler=FTPHandler, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.running = True
         self.started = False
         self.port = port or 2121
+        self.handler = handler
 
     def run(self):
         # Instantiate a dummy authorizer for managing 'virtual' users
@@ -24,7 +25,7 @@ class TestFTPServer(threading.Thread):
         authorizer.add_anonymous(os.getcwd())
 
         # Instantiate FTP handler class
-        handler = FTPHandler
+        handler = self.handler
         handler.authorizer = authorizer
 
         # Define a customized banner (string returned when client connects)
@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import time
+
+from unittest import TestCase
+
+from fpipe.file import ByteFile
+from fpipe.gen import AsyncMeta, AsyncProgram, Meta, Program
+from fpipe.meta import MD5, Path, Size
+from fpipe.meta.stream import Stream
+from fpipe.utils.async_bytesloop import AsyncBytesLoop
+from fpipe.workflow import WorkFlow
+from test_utils.test_file import ReversibleTestFile, TestStream
+
+
+def run_until_complete(coroutine):
+    """asyncio.run() is not available on Python 3.6"""
+    loop = asyncio.new_event_loop()
+    # Subprocesses are watched through the current loop
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsync(TestCase):
+    @staticmethod
+    def __checksum(data: bytes):
+        sig = hashlib.md5()
+        sig.update(data)
+        return sig.hexdigest()
+
+    def test_async_bytesloop(self):
+        async def run():
+            loop = AsyncBytesLoop(16, low_water_mark=4)
+            data = bytes(range(100))
+
+            async def writer():
+                for i in range(0, len(data), 10):
+                    await loop.write(data[i:i + 10])
+                await loop.write(b'')
+
+            task = asyncio.ensure_future(writer())
+            self.assertEqual(await loop.read(3), data[:3])
+            self.assertEqual(await loop.read(), data[3:])
+            await task
+
+        run_until_complete(run())
+
+    def test_async_workflow(self):
+        stream_sizes = [2 ** i for i in range(18, 22)]
+        md5_of_files = [
+            self.__checksum(ReversibleTestFile(s).read()) for s in stream_sizes
+        ]
+        md5_of_reversed_files = [
+            self.__checksum(
+                bytes(reversed(ReversibleTestFile(s).read()))
+            ) for s in stream_sizes
+        ]
+
+        async def run():
+            workflow = WorkFlow(
+                # Blocking generators can feed asyncio generators
+                Meta(MD5),
+                AsyncMeta(Size),
+                AsyncProgram("rev"),
+                AsyncProgram("tr -d '\n'"),
+                AsyncMeta(MD5, Size)
+            )
+            count = 0
+            async for f in workflow.compose(
+                    TestStream(s, f'{s}', reversible=True)
+                    for s in stream_sizes):
+                await f[Stream].read()
+                self.assertEqual(f[MD5], md5_of_reversed_files[count])
+                self.assertEqual(f[Path], str(f[Size]))
+                self.assertEqual(f.parent.parent.parent[Size], f[Size])
+                self.assertEqual(f[MD5, 1], md5_of_files[count])
+                count += 1
+            self.assertEqual(count, len(stream_sizes))
+
+        run_until_complete(run())
+
+    def test_async_iterate_blocking_workflow(self):
+        async def run():
+            workflow = WorkFlow(Program("cat"), Meta(Size))
+            sizes = []
+            async for f in workflow.compose(
+                    ByteFile(b'x' * i, Path(str(i))) for i in range(1, 5)):
+                f[Stream].read()
+                sizes.append(f[Size])
+            self.assertEqual(sizes, list(range(1, 5)))
+
+        run_until_complete(run())
+
+    def test_async_program_abandoned(self):
+        async def run():
+            workflow = WorkFlow(AsyncProgram("cat"))
+            sources = [
+                ByteFile(b'x' * 2 ** 22, Path('big')),
+                ByteFile(b'y', Path('small'))
+            ]
+            paths = []
+            async for f in workflow.compose(sources):
+                # Output of the first file is left unread
+                paths.append(f.parent[Path])
+            self.assertEqual(paths, ['big', 'small'])
+
+        run_until_complete(run())
+
+    def test_async_workflow_concurrent(self):
+        count = 8
+
+        async def run():
+            workflow = WorkFlow(
+                AsyncProgram(["sh", "-c", "sleep 0.5; cat"]),
+                AsyncMeta(Size)
+            )
+            for ordered in (True, False):
+                start = time.time()
+                files = [f async for f in workflow.compose(
+                    (ByteFile(b'x' * i, Path(str(i))) for i in range(count)),
+                    max_in_flight=count,
+                    ordered=ordered
+                ).aflush_iter()]
+                # Run one by one this takes at least count * 0.5 seconds
+                self.assertLess(time.time() - start, count * 0.5 / 2)
+
+                paths = [f.parent.parent[Path] for f in files]
+                if ordered:
+                    self.assertEqual(paths, [str(i) for i in range(count)])
+                else:
+                    self.assertEqual(
+                        sorted(paths), sorted(str(i) for i in range(count))
+                    )
+                for f in files:
+                    size = int(f.parent.parent[Path])
+                    if size:
+                        self.assertEqual(f[Size], size)
+
+        run_until_complete(run())
+
+    def test_concurrent_mixed_workflow(self):
+        with self.assertRaises(ValueError):
+            WorkFlow(Meta(Size), AsyncMeta(MD5)).compose(
+                ByteFile(b'x', Path('x')), max_in_flight=2
+            )
@@ -0,0 +1,105 @@
+import threading
+import time
+
+from unittest import TestCase
+
+from fpipe.utils.bytesloop import BytesLoop
+from test_utils.test_file import ReversibleTestFile
+
+
+class TestBytesLoop(TestCase):
+    def __transfer(self, buf_size, write_size, read_size, total_size):
+        source = ReversibleTestFile(total_size)
+        expected = bytes(ReversibleTestFile(total_size).read())
+        received = []
+
+        with BytesLoop(buf_size) as loop:
+            def produce():
+                while True:
+                    b = source.read(write_size)
+                    loop.write(b)
+                    if not b:
+                        break
+
+            thread = threading.Thread(target=produce, daemon=True)
+            thread.start()
+            while True:
+                b = loop.read(read_size)
+                if not b:
+                    break
+                self.assertLessEqual(len(b), buf_size)
+                received.append(b)
+            thread.join()
+
+        self.assertEqual(b''.join(received), expected)
+
+    def test_wrap_around(self):
+        # Sizes that are not multiples of each other make reads and writes
+        # straddle the end of the ring
+        self.__transfer(buf_size=1000, write_size=333, read_size=777,
+                        total_size=2 ** 18 + 17)
+
+    def test_writes_larger_than_buffer(self):
+        self.__transfer(buf_size=2 ** 10, write_size=2 ** 16,
+                        read_size=2 ** 12, total_size=2 ** 20)
+
+    def test_read_all(self):
+        loop = BytesLoop(16)
+        thread = threading.Thread(
+            target=lambda: [loop.write(b) for b in (b'x' * 40, b'y' * 3, b'')],
+            daemon=True
+        )
+        thread.start()
+        self.assertEqual(loop.read(), b'x' * 40 + b'y' * 3)
+        thread.join()
+        self.assertEqual(loop.read(), b'')
+
+    def test_readinto(self):
+        total_size = 2 ** 18 + 5
+        expected = bytes(ReversibleTestFile(total_size).read())
+        source = ReversibleTestFile(total_size)
+
+        loop = BytesLoop(1000, low_water_mark=100)
+
+        def produce():
+            while True:
+                b = source.read(4096)
+                loop.write(b)
+                if not b:
+                    break
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+
+        received = bytearray()
+        buffer = bytearray(777)
+        while True:
+            count = loop.readinto(buffer)
+            if not count:
+                break
+            received += buffer[:count]
+        thread.join()
+        self.assertEqual(bytes(received), expected)
+
+    def test_writer_waits_for_low_water_mark(self):
+        loop = BytesLoop(100, low_water_mark=40)
+        loop.write(b'x' * 100)
+        blocked_write_done = threading.Event()
+
+        def produce():
+            loop.write(b'y')
+            blocked_write_done.set()
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        time.sleep(0.1)
+
+        # Draining to just above the low water mark keeps the writer blocked
+        self.assertEqual(loop.read(59), b'x' * 59)
+        self.assertFalse(blocked_write_done.wait(0.2))
+
+        self.assertEqual(loop.read(1), b'x')
+        self.assertTrue(blocked_write_done.wait(5))
+        thread.join()
+        loop.write(b'')
+        self.assertEqual(loop.read(), b'x' * 40 + b'y')
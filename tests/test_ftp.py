@@ -1,12 +1,23 @@
+import datetime
+import ftplib
 import hashlib
+import io
 import os
+import shutil
+import time
 
-from unittest import TestCase
+from unittest import TestCase, mock
+
+from pyftpdlib.handlers import FTPHandler
 
 from fpipe.gen import Meta, Program, FTP
-from fpipe.file import FTPFile
-from fpipe.meta import MD5, Path
+from fpipe.file import ByteFile, File, FTPFile, FTPPrefixFile
+from fpipe.meta import MD5, Path, Size, Modified, Host, Username, \
+    Password, Port
+from fpipe.exceptions import FileException
 from fpipe.meta.stream import Stream
+from fpipe.utils.ftp import FTPClient
+from fpipe.utils.ftp_pool import FTPConnectionPool
 from fpipe.utils.const import PIPE_BUFFER_SIZE
 from test_utils.ftp_server import TestFTPServer
 
@@ -104,3 +115,353 @@ class TestFTP(TestCase):
             ftp_server_thread.stop()
 
         self.assertTrue(run_balance)
+
+    def test_ftp_pool(self):
+        port = 2122
+        ftp_server_thread = TestFTPServer(port=port)
+        ftp_server_thread.start()
+
+        files_in = {f"temp_pool_{i}.testfile": i * 1000 for i in range(4)}
+        try:
+            for path, size in files_in.items():
+                with open(path, 'wb') as f:
+                    f.write(b'x' * size)
+
+            def read_all(pool):
+                return [
+                    len(f[Stream].read()) for f in FTP(pool=pool).chain(
+                        FTPFile(
+                            path,
+                            host='localhost',
+                            username='user',
+                            password='12345',
+                            port=port
+                        ) for path in files_in.keys()
+                    )
+                ]
+
+            with FTPConnectionPool(max_per_host=1) as pool:
+                self.assertEqual(read_all(pool), list(files_in.values()))
+                # One login, reused for every file
+                self.assertEqual((pool.created, pool.reused), (1, 3))
+                self.assertEqual(pool.idle(), 1)
+
+                # Broken connections are replaced
+                with pool.session('localhost', port, 'user', None) as ftp:
+                    ftp.close()
+                self.assertEqual(read_all(pool), list(files_in.values()))
+                self.assertEqual(pool.created, 2)
+                self.assertEqual(pool.discarded, 1)
+
+            with FTPConnectionPool(idle_timeout=0) as pool:
+                read_all(pool)
+                # Idle connections expire
+                self.assertEqual(pool.created, 4)
+        finally:
+            for path in files_in.keys():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            ftp_server_thread.stop()
+
+    def test_ftp_pool_same_host(self):
+        port = 2128
+        ftp_server_thread = TestFTPServer(port=port)
+        ftp_server_thread.start()
+
+        src, dst = 'temp_pool_src.testfile', 'temp_pool_dst.testfile'
+        size = 2 ** 25
+        with open(src, 'wb') as f:
+            f.write(b'x' * size)
+
+        try:
+            # The download waits on the upload reading it, both on one host
+            with FTPConnectionPool(max_per_host=1) as pool:
+                for f in FTP(
+                        process_meta=(
+                            Host('localhost'),
+                            Username('user'),
+                            Password('12345'),
+                            Port(port),
+                            Path(dst),
+                        ),
+                        pool=pool
+                ).chain(
+                    FTP(pool=pool).chain(
+                        FTPFile(
+                            src,
+                            host='localhost',
+                            username='user',
+                            password='12345',
+                            port=port
+                        )
+                    )
+                ).flush_iter():
+                    self.assertEqual(f[Size], size)
+                self.assertEqual(os.path.getsize(dst), size)
+                # Only one of the two connections is kept
+                self.assertEqual(pool.idle(), 1)
+
+            # Connections beyond max_connections wait, then fail
+            with FTPConnectionPool(
+                    max_connections=1, wait_timeout=0.1
+            ) as pool:
+                def connect():
+                    ftp = ftplib.FTP()
+                    ftp.connect('localhost', port)
+                    ftp.login('user', '12345')
+                    return ftp
+
+                with pool.session('localhost', port, 'user', connect):
+                    with self.assertRaises(FileException):
+                        with pool.session('localhost', port, 'user', connect):
+                            pass
+                # Reused once returned
+                with pool.session('localhost', port, 'user', connect):
+                    pass
+                self.assertEqual((pool.created, pool.reused), (1, 1))
+        finally:
+            for path in (src, dst):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            ftp_server_thread.stop()
+
+    def test_ftp_segments(self):
+        class NoRestHandler(FTPHandler):
+            proto_cmds = {
+                k: v for k, v in FTPHandler.proto_cmds.items() if k != 'REST'
+            }
+
+        path = 'temp_segments.testfile'
+        segment_size = 2 ** 16
+        data = bytes(i % 251 for i in range(segment_size * 3 + 100))
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        try:
+            for port, handler, segmented in (
+                    (2123, FTPHandler, True),
+                    (2124, NoRestHandler, False)
+            ):
+                ftp_server_thread = TestFTPServer(port=port, handler=handler)
+                ftp_server_thread.start()
+                try:
+                    with FTPConnectionPool() as pool:
+                        for f in FTP(
+                                pool=pool,
+                                segments=3,
+                                segment_size=segment_size
+                        ).chain(
+                            FTPFile(
+                                path,
+                                host='localhost',
+                                username='user',
+                                password='12345',
+                                port=port
+                            )
+                        ):
+                            self.assertEqual(f[Stream].read(), data)
+                        # Segments are downloaded on connections of their
+                        # own, a single RETR is used without REST
+                        self.assertEqual(pool.created > 1, segmented)
+                finally:
+                    ftp_server_thread.stop()
+        finally:
+            os.remove(path)
+
+    def test_ftp_prefix(self):
+        class NoMlsdHandler(FTPHandler):
+            proto_cmds = {
+                k: v for k, v in FTPHandler.proto_cmds.items() if k != 'MLSD'
+            }
+
+        root = 'temp_ftp_list'
+        files_in = {
+            f'{root}/a.txt': b'a' * 10,
+            f'{root}/b.csv': b'b' * 20,
+            f'{root}/sub/c.txt': b'c' * 30,
+            f'{root}/sub/deep/d.txt': b'd' * 40,
+        }
+        for path, content in files_in.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(content)
+
+        def read_all(port, pool, **kwargs):
+            files_out = {}
+            for f in FTP(pool=pool, **kwargs).chain(
+                FTPPrefixFile(
+                    root,
+                    host='localhost',
+                    username='user',
+                    password='12345',
+                    port=port
+                )
+            ):
+                content = f[Stream].read()
+                self.assertEqual(f[Size], len(content))
+                self.assertIsInstance(f[Modified], datetime.datetime)
+                files_out[f[Path]] = content
+            return files_out
+
+        try:
+            # MLSD, and LIST when the server does not support it
+            for port, handler in ((2125, FTPHandler), (2126, NoMlsdHandler)):
+                ftp_server_thread = TestFTPServer(port=port, handler=handler)
+                ftp_server_thread.start()
+                try:
+                    with FTPConnectionPool() as pool:
+                        self.assertEqual(
+                            read_all(port, pool),
+                            {
+                                k: v for k, v in files_in.items()
+                                if k.count('/') == 1
+                            }
+                        )
+                        self.assertEqual(
+                            read_all(
+                                port,
+                                pool,
+                                list_workers=2,
+                                list_recursive=True,
+                                list_pattern='*.txt'
+                            ),
+                            {
+                                k: v for k, v in files_in.items()
+                                if k.endswith('.txt')
+                            }
+                        )
+
+                    # Files following the one being read are downloading
+                    started = []
+                    fetch = FTPClient.write_to_file
+
+                    def write_to_file(client, path, bytes_io):
+                        started.append(path)
+                        return fetch(client, path, bytes_io)
+
+                    with FTPConnectionPool() as pool, mock.patch.object(
+                            FTPClient, 'write_to_file', write_to_file
+                    ):
+                        files = FTP(
+                            pool=pool, list_recursive=True, list_prefetch=2
+                        ).chain(
+                            FTPPrefixFile(
+                                root,
+                                host='localhost',
+                                username='user',
+                                password='12345',
+                                port=port
+                            )
+                        )
+                        files_out = {}
+                        for f in files:
+                            if not files_out:
+                                deadline = time.monotonic() + 5
+                                while len(started) < 3 and \
+                                        time.monotonic() < deadline:
+                                    time.sleep(0.01)
+                                self.assertEqual(len(started), 3)
+                            files_out[f[Path]] = f[Stream].read()
+                        self.assertEqual(files_out, files_in)
+                finally:
+                    ftp_server_thread.stop()
+        finally:
+            shutil.rmtree(root)
+
+    def test_ftp_upload(self):
+        port = 2127
+        ftp_server_thread = TestFTPServer(port=port)
+        ftp_server_thread.start()
+
+        data = bytes(i % 251 for i in range(2 ** 20))
+        paths = [f'temp_upload_{i}.testfile' for i in range(3)]
+        transfer = ftplib.FTP.transfercmd
+        commands = []
+
+        class DroppedConnection:
+            """Data connection dropped after half of the first block"""
+
+            def __init__(self, conn):
+                self.conn = conn
+
+            def sendall(self, b):
+                self.conn.sendall(b[:len(b) // 2])
+                # Dropped once the server has stored part of it
+                while not os.path.exists(paths[1]) \
+                        or not os.path.getsize(paths[1]):
+                    time.sleep(0.01)
+                raise ConnectionResetError
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                self.conn.close()
+
+        def transfercmd(ftp, cmd, rest=None):
+            commands.append(cmd.split()[0])
+            conn = transfer(ftp, cmd, rest)
+            if len(commands) == 1:
+                return DroppedConnection(conn)
+            return conn
+
+        try:
+            with FTPConnectionPool() as pool:
+                gen = FTP(
+                    process_meta=(
+                        Host('localhost'),
+                        Username('user'),
+                        Password('12345'),
+                        Port(port),
+                    ),
+                    pool=pool,
+                    upload_retries=1
+                )
+                for f in gen.chain(
+                        ByteFile(data, Path(paths[0]))
+                ).flush_iter():
+                    self.assertEqual((f[Path], f[Size]), (paths[0], len(data)))
+                with open(paths[0], 'rb') as f:
+                    self.assertEqual(f.read(), data)
+
+                gen.reset()
+                with mock.patch.object(ftplib.FTP, 'transfercmd', transfercmd):
+                    for f in gen.chain(
+                            ByteFile(data, Path(paths[1]))
+                    ).flush_iter():
+                        self.assertEqual(f[Size], len(data))
+                # Resumed after the dropped connection
+                self.assertEqual(commands, ['STOR', 'APPE'])
+                with open(paths[1], 'rb') as f:
+                    self.assertEqual(f.read(), data)
+
+                class BrokenSource(io.BytesIO):
+                    def read(self, size=-1):
+                        if self.tell():
+                            raise OSError("source broken")
+                        return super().read(1000)
+
+                def recording(ftp, cmd, rest=None):
+                    commands.append(cmd.split()[0])
+                    return transfer(ftp, cmd, rest)
+
+                # Errors of the source are not retried as dropped connections
+                commands.clear()
+                gen.reset()
+                with mock.patch.object(ftplib.FTP, 'transfercmd', recording):
+                    with self.assertRaisesRegex(OSError, 'source broken'):
+                        gen.chain(File(
+                            stream=BrokenSource(data), meta=Path(paths[2])
+                        )).flush()
+                self.assertEqual(commands, ['STOR'])
+        finally:
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            ftp_server_thread.stop()
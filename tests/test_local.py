@@ -1,11 +1,13 @@
 import hashlib
 import os
+import tempfile
 
 from unittest import TestCase
 
 from fpipe.file import ByteFile, LocalFile
 from fpipe.gen import Meta, Local
-from fpipe.meta import MD5, Path, Size
+from fpipe.gen.flush import Flush
+from fpipe.meta import MD5, Path, Size, Modified
 from fpipe.meta.stream import Stream
 from fpipe.workflow import WorkFlow
 
@@ -85,3 +87,30 @@ class TestLocal(TestCase):
                     os.remove(f_n + append_to_file_name)
                 except:
                     pass
+
+    def test_local_sink(self):
+        with tempfile.TemporaryDirectory() as d:
+            files = []
+            for f in Local(sink=True).chain(
+                    ByteFile(b'x' * i, Path(os.path.join(d, str(i))))
+                    for i in range(3)
+            ).flush_iter():
+                self.assertFalse(f[Stream].readable())
+                files.append((f[Path], f[Size]))
+                self.assertIsNotNone(f[Modified])
+            self.assertEqual(
+                files, [(os.path.join(d, str(i)), i) for i in range(3)]
+            )
+            with open(os.path.join(d, '2'), 'rb') as local_file:
+                self.assertEqual(local_file.read(), b'xx')
+
+            # Flush waits for the write instead of reading the sink
+            path = os.path.join(d, 'flushed')
+            WorkFlow(Local(sink=True), Flush()).compose(
+                ByteFile(b'abc', Path(path))
+            ).flush()
+            with open(path, 'rb') as local_file:
+                self.assertEqual(local_file.read(), b'abc')
+
+        with self.assertRaises(ValueError):
+            Local(pass_through=True, sink=True)
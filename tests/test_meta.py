@@ -1,14 +1,33 @@
 import hashlib
+import os
 
 from unittest import TestCase
 
 from fpipe.gen import Program, Meta
 from fpipe.meta import MD5, Path,  Size
 from fpipe.exceptions import FileDataException
+from fpipe.meta.abstract import FileData, FileDataCalculator
 from fpipe.meta.stream import Stream
+from fpipe.utils.calculator_pool import CalculatorPool
 from test_utils.test_file import ReversibleTestFile, TestStream
 
 
+class PidCalculator(FileDataCalculator[int]):
+    def __init__(self):
+        super().__init__(Pid)
+
+    def write(self, s):
+        if not s:
+            self.calculable.value = os.getpid()
+
+
+class Pid(FileData[int]):
+    """Process id of the process that calculated it"""
+    @staticmethod
+    def get_calculator():
+        return PidCalculator()
+
+
 class TestMeta(TestCase):
     @staticmethod
     def __checksum(data: bytes):
@@ -55,3 +74,21 @@ class TestMeta(TestCase):
             self.assertEqual(f[Path], str(f[Size]))
         # Assert that we've checked all files
         self.assertEqual(len(md5_of_files) + len(md5_of_reversed_files), 0)
+
+    def test_calculator_pool(self):
+        stream_sizes = [2 ** i for i in range(18, 23)]
+        md5_of_files = [
+            self.__checksum(ReversibleTestFile(s).read()) for s in stream_sizes
+        ]
+
+        with CalculatorPool(processes=2) as pool:
+            gen = Meta(MD5, Size, Pid, pool=pool).chain(
+                TestStream(s, f'{s}', reversible=True) for s in stream_sizes
+            )
+            for f in gen:
+                content = f[Stream].read()
+                self.assertEqual(len(content), f[Size])
+                self.assertEqual(f[MD5], md5_of_files.pop(0))
+                self.assertEqual(f[Path], str(f[Size]))
+                self.assertNotEqual(f[Pid], os.getpid())
+        self.assertEqual(len(md5_of_files), 0)
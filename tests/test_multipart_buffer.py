@@ -0,0 +1,74 @@
+import hashlib
+from unittest import TestCase
+
+from fpipe.utils.multipart_buffer import MultipartBuffer
+from test_utils.test_file import ReversibleTestFile
+
+
+class TestMultipartBuffer(TestCase):
+    def test_parts(self):
+        chunk_size = 100
+        data = bytes(ReversibleTestFile(1050).read())
+        buffer = MultipartBuffer(chunk_size)
+
+        parts = []
+        for i in range(0, len(data), 70):
+            buffer.add(data[i:i + 70])
+            while buffer.full():
+                parts.append(buffer.get())
+        self.assertFalse(buffer.empty())
+        parts.append(buffer.get())
+        self.assertTrue(buffer.empty())
+
+        self.assertEqual([n for _, n in parts], list(range(1, 12)))
+        self.assertEqual([len(p) for p, _ in parts], [100] * 10 + [50])
+        self.assertEqual(b''.join(p for p, _ in parts), data)
+
+    def test_write_larger_than_part(self):
+        buffer = MultipartBuffer(10)
+        buffer.add(b'x' * 25)
+        self.assertEqual(buffer.count, 25)
+        self.assertEqual(buffer.get(), (bytearray(b'x' * 10), 1))
+        self.assertEqual(buffer.get(), (bytearray(b'x' * 10), 2))
+        self.assertFalse(buffer.full())
+        self.assertEqual(buffer.get(), (bytearray(b'x' * 5), 3))
+        self.assertTrue(buffer.empty())
+
+    def test_parts_are_handed_over(self):
+        buffer = MultipartBuffer(4)
+        buffer.add(b'abcd')
+        part, _ = buffer.get()
+        # Writes after a part is handed out do not touch it
+        buffer.add(memoryview(b'efgh'))
+        self.assertEqual(part, b'abcd')
+        buffer.clear()
+        self.assertTrue(buffer.empty())
+        self.assertEqual(buffer.get(), (bytearray(), 1))
+
+    def test_part_size(self):
+        buffer = MultipartBuffer(2, part_size=lambda n: n * 2)
+        buffer.add(b'x' * 13)
+        self.assertEqual([len(buffer.get()[0]) for _ in range(4)],
+                         [2, 4, 6, 1])
+        self.assertTrue(buffer.empty())
+
+    def test_checksum(self):
+        data = bytes(ReversibleTestFile(250).read())
+        buffer = MultipartBuffer(100, checksum="MD5")
+        for i in range(0, len(data), 30):
+            buffer.add(data[i:i + 30])
+        for n in range(1, 4):
+            part, part_number = buffer.get()
+            self.assertEqual(part_number, n)
+            self.assertEqual(buffer.pop_checksum(part_number),
+                             hashlib.md5(part).digest())
+        self.assertIsNone(buffer.pop_checksum(1))
+
+    def test_allocate(self):
+        allocated = []
+        buffer = MultipartBuffer(4, allocate=allocated.append)
+        buffer.add(b'x' * 9)
+        self.assertEqual(allocated, [4, 4, 4])
+        buffer.get()
+        buffer.add(b'x' * 3)
+        self.assertEqual(allocated, [4, 4, 4])
@@ -1,12 +1,14 @@
+import os
 from unittest import TestCase
 
-from fpipe.file import File
-from fpipe.meta import Size, MD5
-from fpipe.gen import Meta, Program
+from fpipe.file import File, ByteFile
+from fpipe.meta import Size, MD5, Path
+from fpipe.gen import Meta, Program, Local
 from fpipe.exceptions import FileDataException
 from fpipe.meta.stream import Stream
 from fpipe.utils.const import PIPE_BUFFER_SIZE
-from test_utils.test_file import TestStream
+from fpipe.workflow import WorkFlow
+from test_utils.test_file import TestStream, ReversibleTestFile
 
 
 class TestProcess(TestCase):
@@ -53,3 +55,36 @@ class TestProcess(TestCase):
             self.assertNotEqual(file[MD5], '')
             signal = True
         self.assertTrue(signal)
+
+    def test_adjacent_programs(self):
+        content = bytes(ReversibleTestFile(2 ** 22).read())
+        count = 0
+        for f in WorkFlow(
+                Program("gzip -c"),
+                Program("gzip -d")
+        ).compose(ByteFile(content)):
+            self.assertEqual(f[Stream].read(), content)
+            # stdout of gzip -c was handed directly to gzip -d
+            self.assertIsNone(f.parent[Stream].detach())
+            count += 1
+        self.assertEqual(count, 1)
+
+    def test_file_to_program_to_file(self):
+        content = bytes(ReversibleTestFile(2 ** 22).read())
+        file_names = ('.program.in.test', '.program.out.test')
+        try:
+            workflow = WorkFlow(
+                Local(),
+                Program("cat"),
+                Local(process_meta=Path(file_names[1]))
+            )
+            for f in workflow.compose(
+                    ByteFile(content, Path(file_names[0]))).flush_iter():
+                with open(f[Path], 'rb') as out:
+                    self.assertEqual(out.read(), content)
+        finally:
+            for f_n in file_names:
+                try:
+                    os.remove(f_n)
+                except FileNotFoundError:
+                    pass
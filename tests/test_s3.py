@@ -1,9 +1,15 @@
+import base64
 import datetime
+import hashlib
 import io
+import os
 import tarfile
+import tempfile
+import time
+import zlib
 from copy import copy, deepcopy
 from queue import Queue
-from threading import Event
+from threading import Event, Thread
 from unittest import TestCase
 
 from typing import IO, Iterable, List
@@ -11,21 +17,49 @@ from typing import IO, Iterable, List
 from botocore import exceptions
 from mock import patch
 
-from fpipe.exceptions import SeekException, FileException, FileDataException
+from fpipe.exceptions import SeekException, FileException, \
+    FileDataException, S3WriteException, SourceModifiedException
 from fpipe.gen import Meta, S3, Tar
+from fpipe.gen.flush import Flush
 from fpipe.file import S3File, S3PrefixFile, ByteFile
-from fpipe.meta import Mime, Modified, Version, Path, Size, Bucket
+from fpipe.meta import Mime, Modified, Version, Path, Size, Bucket, ETag
 
 from moto import mock_s3, mock_iam, mock_config
 
 from fpipe.meta.checksum import MD5
 from fpipe.meta.stream import Stream
 from fpipe.utils.const import PIPE_BUFFER_SIZE
-from fpipe.utils.s3_writer_worker import worker, CorruptedMultipartError
+from fpipe.utils.s3_block_cache import S3BlockCache
+from fpipe.utils import s3_list
+from fpipe.utils.s3_list import list_objects
+from fpipe.utils.s3_reader import S3FileReader
+from fpipe.utils.s3_upload_budget import S3UploadBudget
+from fpipe.utils.s3_upload_pool import S3UploadPool
+from fpipe.utils.s3_writer import S3FileWriter
+from fpipe.utils.s3_writer_worker import worker, CorruptedMultipartError, \
+    STOP
 from fpipe.workflow import WorkFlow
 from test_utils.test_file import TestStream
 
 
+def count_calls(client, *names: str, with_key: bool = False) -> list:
+    """
+    Wraps client methods to record their calls
+
+    :param names: client methods to wrap
+    :param with_key: record (name, Key) instead of the name
+    :return: list the calls are appended to
+    """
+    calls: list = []
+    for name in names:
+        def counting(*args, __method=getattr(client, name), __name=name,
+                     **kwargs):
+            calls.append((__name, kwargs.get("Key")) if with_key else __name)
+            return __method(*args, **kwargs)
+        setattr(client, name, counting)
+    return calls
+
+
 class TestS3(TestCase):
     def __init_s3(self, bucket="aws"):
         import boto3
@@ -138,7 +172,9 @@ class TestS3(TestCase):
         mocked.side_effect = e
 
         client, resource, bucket = self.__init_s3()
-        test_stream = TestStream(60, "xyz", reversible=True)
+        # Larger than one part, smaller objects are not multipart uploads
+        test_stream = TestStream(S3FileWriter.MIN_BLOCK_SIZE + 60, "xyz",
+                                 reversible=True)
 
         # TODO: Should really raise S3WriteException
         with self.assertRaises(FileException):
@@ -202,6 +238,600 @@ class TestS3(TestCase):
             self.assertEqual(f[Stream].read(), source_body)
         self.assertEqual(len(all_files_copy), 0)
 
+    @mock_s3
+    @mock_iam
+    @mock_config
+    def test_s3_read_ahead(self):
+        client, resource, bucket = self.__init_s3()
+        body = bytes(i % 251 for i in range(2 ** 20 + 123))
+        self.__create_objects(client, bucket, [("key", body)])
+
+        for seekable in (False, True):
+            gen = S3(client, resource, seekable=seekable, read_ahead=3,
+                     read_chunk_size=2 ** 16).chain(S3File(bucket, "key"))
+            for f in gen:
+                reader = f[Stream]
+                self.assertEqual(reader.read(100), body[:100])
+                self.assertEqual(reader.read(), body[100:])
+                self.assertEqual(reader.bytes_received, len(body))
+                if seekable:
+                    # Seek back past prefetched chunks
+                    for offset in (2 ** 19 + 7, 10, 2 ** 20):
+                        reader.seek(offset)
+                        self.assertEqual(reader.read(2 ** 17),
+                                         body[offset:offset + 2 ** 17])
+
+    @mock_s3
+    @mock_iam
+    @mock_config
+    def test_s3_reader_cache(self):
+        client, resource, bucket = self.__init_s3()
+        chunk = 2 ** 10
+        body = bytes(i % 251 for i in range(chunk * 4))
+        self.__create_objects(client, bucket, [("key", body)])
+
+        with S3FileReader(client, resource, bucket, "key", cache_size=chunk,
+                          cache_byte_limit=chunk * 2) as reader:
+            # Chunks 0, 1, 0, 2: chunk 1 is least recently used when 2 is
+            # fetched, so chunk 0 survives
+            for offset in (0, chunk, 10, chunk * 2, 20):
+                reader.seek(offset)
+                self.assertEqual(reader.read(10), body[offset:offset + 10])
+            self.assertEqual(list(reader.cache_chunks), [chunk * 2, 0])
+            self.assertEqual(reader.cache_hits, 2)
+            self.assertEqual(reader.cache_misses, 3)
+            self.assertEqual(reader.cache_evictions, 1)
+            self.assertEqual(reader.bytes_received, chunk * 3)
+
+            # Reads spanning several chunks
+            reader.seek(chunk - 5)
+            self.assertEqual(reader.read(chunk * 2 + 10),
+                             body[chunk - 5:chunk * 3 + 5])
+            self.assertLessEqual(reader.cache_bytes, chunk * 2)
+
+    @mock_s3
+    @mock_iam
+    @mock_config
+    def test_s3_block_cache(self):
+        client, resource, bucket = self.__init_s3()
+        chunk = 2 ** 16
+        body = bytes(i % 251 for i in range(chunk * 4 + 7))
+        self.__create_objects(client, bucket, [("key", body)])
+
+        get_object = client.get_object
+        calls = []
+
+        def counting_get_object(**kwargs):
+            calls.append(kwargs)
+            return get_object(**kwargs)
+
+        client.get_object = counting_get_object
+
+        with tempfile.TemporaryDirectory() as spill_dir:
+            # Only two blocks fit in memory, the rest are spilled to disk
+            cache = S3BlockCache(memory_limit=chunk * 2, spill_dir=spill_dir)
+            with cache:
+                for seekable in (False, True, False):
+                    gen = S3(client, resource, seekable=seekable,
+                             read_chunk_size=chunk, block_cache=cache)
+                    for f in gen.chain(S3File(bucket, "key")):
+                        self.assertEqual(f[Stream].read(), body)
+
+                self.assertEqual(len(calls), 5)
+                self.assertEqual(cache.misses, 5)
+                self.assertEqual(cache.hits + cache.spill_hits, 10)
+                self.assertGreater(cache.spill_hits, 0)
+                self.assertLessEqual(cache.memory_bytes, chunk * 2)
+                self.assertTrue(os.listdir(spill_dir))
+            self.assertFalse(os.listdir(spill_dir))
+
+        # Blocks are only read from the revision the reader was opened on,
+        # an overwritten object is not cached under the old ETag
+        calls.clear()
+        with S3BlockCache() as cache:
+            with S3FileReader(client, resource, bucket, "key",
+                              cache_size=chunk, block_cache=cache) as reader:
+                self.assertEqual(reader.read(chunk), body[:chunk])
+                client.put_object(Bucket=bucket, Key="key",
+                                  Body=b"y" * len(body))
+                with self.assertRaises(SourceModifiedException):
+                    reader.read(chunk)
+            self.assertEqual(calls[0]["IfMatch"], reader.e_tag)
+
+    @mock_s3
+    @mock_iam
+    @mock_config
+    def test_s3_requests(self):
+        client, resource, bucket = self.__init_s3()
+        for key in ("a", "ab", "abc"):
+            client.put_object(Bucket=bucket, Body=key.encode(), Key=key,
+                              ContentType="text/plain")
+
+        calls = count_calls(
+            client, "head_object", "get_object", "list_objects_v2"
+        )
+
+        # Opening a reader is a single HEAD, reused for metadata
+        for f in S3(client, resource).chain(S3File(bucket, "a")):
+            self.assertEqual(f[Size], 1)
+            self.assertEqual(f[Mime], "text/plain")
+            self.assertIsInstance(f[Modified], datetime.datetime)
+            self.assertEqual(f[Stream].read(), b"a")
+        self.assertEqual(calls, ["head_object", "get_object"])
+
+        # Objects from a listing need no HEAD unless mime is requested
+        calls.clear()
+        for f in S3(client, resource).chain(S3PrefixFile(bucket, "ab")):
+            self.assertEqual(f[Size], len(f[Path]))
+            self.assertIsInstance(f[Modified], datetime.datetime)
+        self.assertEqual(calls, ["list_objects_v2"])
+
+        with self.assertRaises(FileException):
+            for _ in S3(client, resource).chain(S3File(bucket, "missing")):
+                pass
+
+    @mock_s3
+    @mock_iam
+    @mock_config
+    def test_s3_server_side_copy(self):
+        client, resource, bucket = self.__init_s3()
+        part = S3FileWriter.MIN_BLOCK_SIZE
+        body = bytes(i % 251 for i in range(part * 2 + 5))
+        client.put_object(Bucket=bucket, Key="src", Body=body)
+        client.put_object(Bucket=bucket, Key="small", Body=b"small")
+
+        calls = count_calls(
+            client, "get_object", "upload_part", "copy_object",
+            "upload_part_copy", with_key=True
+        )
+
+        def copy_to(dst, source_key, **kwargs):
+            for f in S3(client, resource, copy_part_size=part,
+                        process_meta=Path(dst), **kwargs).chain(
+                S3(client, resource).chain(S3File(bucket, source_key))
+            ):
+                return f[Stream].read()
+
+        self.assertEqual(copy_to("dst", "src"), body)
+        self.assertEqual(calls, [("upload_part_copy", "dst")] * 3
+                         + [("get_object", "dst")])
+
+        calls.clear()
+        self.assertEqual(copy_to("dst2", "small"), b"small")
+        self.assertEqual(calls, [("copy_object", "dst2"),
+                                 ("get_object", "dst2")])
+        obj = client.head_object(Bucket=bucket, Key="dst2")
+        self.assertEqual(obj["ContentType"], "application/octet-stream")
+
+        # Streamed through when disabled
+        calls.clear()
+        self.assertEqual(copy_to("dst3", "small", server_side_copy=False),
+                         b"small")
+        self.assertIn(("get_object", "small"), calls)
+
+        # Streamed through when read with another client, whose
+        # credentials may be the only ones with access to the source
+        import boto3
+        calls.clear()
+        source_client = boto3.Session().client("s3")
+        for f in S3(client, resource, process_meta=Path("dst4")).chain(
+            S3(source_client, resource).chain(S3File(bucket, "small"))
+        ):
+            self.assertEqual(f[Stream].read(), b"small")
+        self.assertNotIn(("copy_object", "dst4"), calls)
+        self.assertIn(("get_object", "dst4"), calls)
+
+    @mock_s3
+    @mock_iam
+    @mock_config
+    def test_s3_list_shards(self):
+        client, resource, bucket = self.__init_s3()
+        keys = [f"p/{d}/{i}" for d in "abc" for i in range(5)] + ["p/top"]
+        self.__create_objects(client, bucket, [(k, k) for k in keys])
+        client.put_object(Bucket=bucket, Key="other", Body=b"x")
+
+        head_object = client.head_object
+        heads = []
+
+        def counting_head_object(**kwargs):
+            heads.append(kwargs["Key"])
+            return head_object(**kwargs)
+
+        client.head_object = counting_head_object
+
+        for options in (
+                {},
+                {"list_workers": 3},
+                {"list_workers": 2, "list_boundaries": ["p/a/3", "p/c/0"]},
+        ):
+            listed = {}
+            for f in S3(client, resource, **options).chain(
+                    S3PrefixFile(bucket, "p/")
+            ):
+                listed[f[Path]] = (f[Size], f[ETag])
+            self.assertEqual(sorted(listed), keys)
+            for key, (size, e_tag) in listed.items():
+                self.assertEqual(size, len(key))
+                self.assertEqual(
+                    e_tag, f'"{hashlib.md5(key.encode()).hexdigest()}"'
+                )
+        self.assertEqual(heads, [])
+
+        # Shards are stopped when the listing is not read to the end
+        objects = list_objects(client, bucket, "p/", workers=2)
+        self.assertIn(next(objects)["Key"], keys)
+        objects.close()
+
+        # Pages of shards are yielded while shards are still discovered
+        discovery_pages = s3_list._pages
+        discovering = []
+
+        def slow_discovery(*args, common=False, **kwargs):
+            for page in discovery_pages(*args, common=common, **kwargs):
+                if not common:
+                    yield page
+                    continue
+                for item in page:
+                    discovering.append(True)
+                    yield [item]
+                    # Gives the shard time to be listed
+                    time.sleep(0.2)
+            discovering.clear()
+
+        with patch.object(s3_list, "_pages", slow_discovery):
+            during_discovery = [
+                bool(discovering) for o in list_objects(
+                    client, bucket, "p/", workers=3
+                ) if o["Key"] != "p/top"
+            ]
+        self.assertEqual(len(during_discovery), 15)
+        self.assertTrue(any(during_discovery))
+
+    @mock_s3
+    @mock_iam
+    @mock_config
+    def test_s3_sink(self):
+        client, resource, bucket = self.__init_s3()
+        part = S3FileWriter.MIN_BLOCK_SIZE
+        bodies = {"small": b"small", "large": b"x" * (part + 1)}
+
+        calls = count_calls(client, "get_object", "head_object")
+
+        files = list(
+            S3(client, resource, process_meta=Bucket(bucket), sink=True)
+            .chain(ByteFile(body, meta=Path(key))
+                   for key, body in bodies.items())
+            .flush_iter()
+        )
+        self.assertEqual(calls, [])
+        for f, (key, body) in zip(files, bodies.items()):
+            self.assertEqual(f[Path], key)
+            self.assertEqual(f[Size], len(body))
+            obj = client.get_object(Bucket=bucket, Key=key)
+            self.assertEqual(f[ETag], obj["ETag"])
+            self.assertEqual(obj["Body"].read(), body)
+            with self.assertRaises(FileDataException):
+                f[Version]
+
+        # Copies within S3 are sinks as well
+        calls.clear()
+        for f in S3(client, resource, process_meta=Path("copy"),
+                    sink=True).chain(
+            S3(client, resource).chain(S3File(bucket, "small"))
+        ).flush_iter():
+            self.assertEqual(f[Size], len(bodies["small"]))
+        self.assertEqual(calls, ["head_object"])
+
+        # Failed writes are raised when flushing
+        with self.assertRaises(S3WriteException):
+            S3(client, resource, process_meta=Bucket("missing"),
+               sink=True).chain(ByteFile(b"x", meta=Path("key"))).flush()
+
+        # Flush waits for the write instead of reading the sink
+        WorkFlow(
+            S3(client, resource, process_meta=Bucket(bucket), sink=True),
+            Flush()
+        ).compose(ByteFile(b"abc", meta=Path("flushed"))).flush()
+        obj = client.get_object(Bucket=bucket, Key="flushed")
+        self.assertEqual(obj["Body"].read(), b"abc")
+        with self.assertRaises(S3WriteException):
+            WorkFlow(
+                S3(client, resource, process_meta=Bucket("missing"),
+                   sink=True),
+                Flush()
+            ).compose(ByteFile(b"x", meta=Path("key"))).flush()
+
+    @mock_s3
+    @mock_iam
+    @mock_config
+    def test_s3_writer_put_object(self):
+        client, resource, bucket = self.__init_s3()
+
+        calls = count_calls(client, "put_object", "create_multipart_upload")
+
+        part = S3FileWriter.MIN_BLOCK_SIZE
+        for size, expected in (
+                (0, "put_object"),
+                (2048, "put_object"),
+                (part - 1, "put_object"),
+                (part + 1, "create_multipart_upload"),
+        ):
+            calls.clear()
+            body = b"x" * size
+            with S3FileWriter(client, bucket, "key", "text/plain") as writer:
+                for i in range(0, size, 2 ** 20):
+                    writer.write(body[i:i + 2 ** 20])
+            self.assertEqual(calls, [expected])
+            self.assertEqual(
+                client.get_object(Bucket=bucket, Key="key")["Body"].read(),
+                body
+            )
+
+    @mock_s3
+    @mock_iam
+    @mock_config
+    def test_s3_writer_workers(self):
+        client, resource, bucket = self.__init_s3()
+        part = S3FileWriter.MIN_BLOCK_SIZE
+        body = b"x" * (part * 2 + 10)
+
+        with S3FileWriter(client, bucket, "key", "text/plain",
+                          worker_limit=2) as writer:
+            writer.write(body)
+            self.assertLessEqual(writer.queue_depth + writer.in_flight, 2)
+        self.assertEqual(writer.in_flight, 0)
+        self.assertEqual(writer.queue_depth, 0)
+        self.assertEqual(writer.stats.parts_uploaded, 3)
+        self.assertEqual(writer.stats.bytes_uploaded, len(body))
+        self.assertTrue(all(not w.running() for w in writer.workers))
+
+        # Workers return on STOP, without polling a stop event
+        mpu = client.create_multipart_upload(Bucket=bucket, Key="key2")
+        q = Queue()
+        q.put((b"x" * part, 1))
+        q.put(STOP)
+        results = Queue()
+        worker(client, Event(), q, results, Queue(), bucket, "key2",
+               mpu["UploadId"], 1)
+        self.assertEqual(results.get_nowait()["PartNumber"], 1)
+
+    @mock_s3
+    @mock_iam
+    @mock_config
+    def test_s3_upload_pool(self):
+        client, resource, bucket = self.__init_s3()
+        part = S3FileWriter.MIN_BLOCK_SIZE
+        bodies = [bytes([i]) * (part * 2 + 1 + i) for i in range(3)]
+
+        with S3UploadPool(max_workers=2, max_parts=3) as pool:
+            writers = [
+                S3FileWriter(client, bucket, f"key{i}", "text/plain",
+                             upload_pool=pool)
+                for i in range(len(bodies))
+            ]
+            for writer in writers:
+                writer.__enter__()
+            for writer, body in zip(writers, bodies):
+                writer.write(body)
+                self.assertLessEqual(pool.in_flight, 2)
+            for writer in writers:
+                writer.__exit__(None, None)
+                self.assertEqual(writer.queue_depth, 0)
+                self.assertEqual(writer.stats.parts_uploaded, 3)
+                # No threads of its own
+                self.assertEqual(writer.workers, [])
+
+        for i, body in enumerate(bodies):
+            obj = client.get_object(Bucket=bucket, Key=f"key{i}")
+            self.assertEqual(obj["Body"].read(), body)
+
+        with S3UploadPool() as pool:
+            for f in (
+                    S3(client, resource, process_meta=Bucket(bucket),
+                       upload_pool=pool)
+                    .chain(ByteFile(b"x" * (part + 1), meta=Path("gen")))
+            ):
+                self.assertEqual(len(f[Stream].read()), part + 1)
+
+    @mock_s3
+    @mock_iam
+    @mock_config
+    def test_s3_upload_budget(self):
+        client, resource, bucket = self.__init_s3()
+        part = S3FileWriter.MIN_BLOCK_SIZE
+        body = b"x" * (part * 3 + 1)
+        budget = S3UploadBudget(part * 2)
+
+        def write(key, upload_pool=None):
+            with S3FileWriter(client, bucket, key, "text/plain",
+                              upload_pool=upload_pool,
+                              memory_budget=budget) as writer:
+                # A single write does not buffer the whole body
+                writer.write(body)
+            self.assertEqual(writer.reserved, 0)
+
+        with S3UploadPool(max_workers=4) as pool:
+            threads = [
+                Thread(target=write, args=(f"key{i}", pool if i else None))
+                for i in range(3)
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertLessEqual(budget.peak, part * 2)
+        self.assertGreater(budget.waits, 0)
+        self.assertEqual(budget.used, 0)
+        for i in range(3):
+            obj = client.get_object(Bucket=bucket, Key=f"key{i}")
+            self.assertEqual(obj["ContentLength"], len(body))
+
+        # Small objects are released once put
+        write("small")
+        self.assertEqual(budget.used, 0)
+
+    @mock_s3
+    @mock_iam
+    @mock_config
+    def test_s3_writer_resume(self):
+        client, resource, bucket = self.__init_s3()
+        part = S3FileWriter.MIN_BLOCK_SIZE
+        body = bytes(i % 251 for i in range(part * 4 + 10))
+
+        upload_part = client.upload_part
+        uploaded = []
+        failed = Event()
+
+        def failing_upload_part(**kwargs):
+            if kwargs["PartNumber"] == 3 and not failed.is_set():
+                failed.set()
+                raise exceptions.ClientError(
+                    {"Error": {"Code": "500", "Message": "failed"}},
+                    "UploadPart"
+                )
+            uploaded.append(kwargs["PartNumber"])
+            return upload_part(**kwargs)
+
+        client.upload_part = failing_upload_part
+
+        with tempfile.TemporaryDirectory() as d:
+            checkpoint = os.path.join(d, "checkpoint")
+            with self.assertRaises(S3WriteException):
+                with S3FileWriter(client, bucket, "key", "text/plain",
+                                  max_part_upload_retries=0,
+                                  checkpoint=checkpoint) as writer:
+                    writer.write(body)
+            # The upload is kept
+            self.assertEqual(len(client.list_multipart_uploads(
+                Bucket=bucket)["Uploads"]), 1)
+
+            uploaded.clear()
+            with S3FileWriter(client, bucket, "key", "text/plain",
+                              checkpoint=checkpoint) as writer:
+                self.assertEqual(writer.resume_offset, part * 2)
+                with self.assertRaises(SeekException):
+                    writer.seek(part * 3)
+                writer.seek(part * 2)
+                writer.write(body[part * 2:])
+            self.assertEqual(sorted(uploaded), [3, 4, 5])
+            self.assertFalse(os.path.exists(checkpoint))
+
+            obj = client.get_object(Bucket=bucket, Key="key")
+            self.assertEqual(obj["Body"].read(), body)
+
+            # Without a checkpoint there is nothing to resume, sources
+            # are written from the start
+            with S3FileWriter(client, bucket, "key", "text/plain",
+                              checkpoint=checkpoint) as writer:
+                self.assertEqual(writer.resume_offset, 0)
+                writer.write(body[:10])
+
+            def uploads():
+                return client.list_multipart_uploads(
+                    Bucket=bucket
+                ).get("Uploads", [])
+
+            # A failed source does not complete a truncated object, the
+            # upload and checkpoint are kept to be resumed
+            with self.assertRaises(IOError):
+                with S3FileWriter(client, bucket, "key2", "text/plain",
+                                  checkpoint=checkpoint) as writer:
+                    writer.write(body[:part * 2 + 5])
+                    raise IOError("source failed")
+            self.assertTrue(os.path.exists(checkpoint))
+            self.assertEqual(len(uploads()), 1)
+            with self.assertRaises(exceptions.ClientError):
+                client.head_object(Bucket=bucket, Key="key2")
+
+            # An upload split differently does not resume the checkpoint,
+            # the stale upload is aborted
+            with S3FileWriter(client, bucket, "key2", "text/plain",
+                              size_hint=len(body),
+                              checkpoint=checkpoint) as writer:
+                self.assertEqual(writer.resume_offset, 0)
+                self.assertEqual(uploads(), [])
+                writer.write(body[:10])
+
+        # Without a checkpoint the upload is aborted
+        with self.assertRaises(IOError):
+            with S3FileWriter(client, bucket, "key3", "text/plain") as writer:
+                writer.write(body[:part * 2 + 5])
+                raise IOError("source failed")
+        self.assertEqual(uploads(), [])
+        with self.assertRaises(exceptions.ClientError):
+            client.head_object(Bucket=bucket, Key="key3")
+
+    @mock_s3
+    @mock_iam
+    @mock_config
+    def test_s3_writer_checksum(self):
+        client, resource, bucket = self.__init_s3()
+        part = S3FileWriter.MIN_BLOCK_SIZE
+
+        upload_part = client.upload_part
+        sent = []
+
+        def recording_upload_part(**kwargs):
+            sent.append({k: v for k, v in kwargs.items() if k != "Body"})
+            return upload_part(**kwargs)
+
+        client.upload_part = recording_upload_part
+
+        body = bytes(i % 251 for i in range(part + 10))
+        for checksum, header, expected in (
+                (None, None, None),
+                ("MD5", "ContentMD5", hashlib.md5(body[:part]).digest()),
+                ("CRC32", "ChecksumCRC32",
+                 zlib.crc32(body[:part]).to_bytes(4, "big")),
+                ("SHA256", "ChecksumSHA256",
+                 hashlib.sha256(body[:part]).digest()),
+        ):
+            sent.clear()
+            with S3FileWriter(client, bucket, "key", "text/plain",
+                              checksum=checksum) as writer:
+                for i in range(0, len(body), 2 ** 16):
+                    writer.write(body[i:i + 2 ** 16])
+            self.assertEqual(
+                client.get_object(Bucket=bucket, Key="key")["Body"].read(),
+                body
+            )
+            first = next(s for s in sent if s["PartNumber"] == 1)
+            if header:
+                self.assertEqual(base64.b64decode(first[header]), expected)
+            else:
+                self.assertFalse(
+                    [k for k in first if k.startswith(("Checksum", "Content"))]
+                )
+
+        with self.assertRaises(ValueError):
+            S3FileWriter(client, bucket, "key", "text/plain", checksum="XXH")
+
+    def test_s3_writer_part_size(self):
+        mib = 2 ** 20
+        writer = S3FileWriter(None, "bucket", "key", "mime")
+        parts = range(1, S3FileWriter.MAX_PARTS + 1)
+
+        # Unknown size starts with small parts, and still fits the largest
+        # object S3 accepts
+        self.assertEqual(writer.part_size(1), 5 * mib)
+        self.assertEqual(
+            writer.part_size(S3FileWriter.PART_GROWTH_INTERVAL + 1), 10 * mib
+        )
+        self.assertGreaterEqual(
+            sum(writer.part_size(p) for p in parts), 5 * 2 ** 40
+        )
+        self.assertLessEqual(
+            max(writer.part_size(p) for p in parts),
+            S3FileWriter.MAX_BLOCK_SIZE
+        )
+
+        # A hint of 1 TiB makes every part large enough from the start
+        writer = S3FileWriter(None, "bucket", "key", "mime",
+                              size_hint=2 ** 40)
+        self.assertEqual(writer.part_size(1), 105 * mib)
+        self.assertGreaterEqual(writer.part_size(1) * len(parts), 2 ** 40)
+
     @mock_s3
     @mock_iam
     @mock_config
@@ -0,0 +1,83 @@
+import threading
+import time
+from unittest import TestCase
+
+from fpipe.utils.s3_upload_budget import S3UploadBudget
+from fpipe.utils.s3_upload_pool import S3UploadPool
+
+
+class TestS3UploadPool(TestCase):
+    def test_turns(self):
+        release = threading.Event()
+        done = []
+
+        with S3UploadPool(max_workers=1, max_parts=7) as pool:
+            # Holds the only worker while parts are queued
+            blocker = pool.submit("blocker", release.wait)
+            futures = [pool.submit("a", done.append, f"a{i}")
+                       for i in range(4)]
+            futures += [pool.submit("b", done.append, f"b{i}")
+                        for i in range(2)]
+            self.assertEqual(pool.pending("a"), 4)
+            release.set()
+            for f in [blocker] + futures:
+                f.result()
+
+        self.assertEqual(done, ["a0", "b0", "a1", "b1", "a2", "a3"])
+
+    def test_limits(self):
+        release = threading.Event()
+        with S3UploadPool(max_workers=2, max_parts=3) as pool:
+            futures = [pool.submit(i, release.wait) for i in range(3)]
+            with self.assertRaises(TimeoutError):
+                pool.submit("full", release.wait, timeout=0.1)
+            self.assertLessEqual(pool.in_flight, 2)
+            self.assertEqual(pool.cancel(2), 1)
+            self.assertTrue(futures[2].cancelled())
+            # The cancelled part made room
+            futures.append(pool.submit("room", release.wait, timeout=1))
+            release.set()
+            self.assertTrue(all(f.result() for f in futures[:2]))
+
+    def test_burst(self):
+        with S3UploadPool(max_workers=4) as pool:
+            pool.submit("a", int, "1").result()
+            # Lets the worker go idle
+            time.sleep(0.1)
+            # Parts of a burst are uploaded at once, not by the idle worker
+            # alone
+            barrier = threading.Barrier(4, timeout=5)
+            futures = [pool.submit("a", barrier.wait) for _ in range(4)]
+            self.assertEqual(
+                sorted(f.result() for f in futures), [0, 1, 2, 3]
+            )
+
+    def test_exception(self):
+        with S3UploadPool() as pool:
+            future = pool.submit("a", int, "x")
+            with self.assertRaises(ValueError):
+                future.result()
+            self.assertEqual(pool.submit("a", int, "1").result(), 1)
+
+
+class TestS3UploadBudget(TestCase):
+    def test_budget(self):
+        budget = S3UploadBudget(10)
+        budget.acquire(6)
+        with self.assertRaises(TimeoutError):
+            budget.acquire(6, timeout=0.1)
+        self.assertEqual(budget.waits, 1)
+
+        t = threading.Timer(0.1, budget.release, (6,))
+        t.start()
+        budget.acquire(6, timeout=5)
+        t.join()
+        self.assertEqual((budget.used, budget.peak, budget.available),
+                         (6, 6, 4))
+        budget.release(6)
+
+        # Larger than the budget, let through when nothing is reserved
+        budget.acquire(20, timeout=0)
+        self.assertEqual(budget.available, 0)
+        budget.release(20)
+        self.assertEqual(budget.used, 0)
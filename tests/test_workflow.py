@@ -1,7 +1,9 @@
 import hashlib
+import time
 
 from unittest import TestCase
 
+from fpipe.file import ByteFile
 from fpipe.gen import Program, Meta
 from fpipe.meta import MD5, Path,  Size
 from fpipe.exceptions import FileDataException
@@ -59,3 +61,56 @@ class TestWorkflow(TestCase):
             self.assertEqual(f[Path], str(f[Size]))
         # Assert that we've checked all files
         self.assertEqual(len(md5_of_files) + len(md5_of_reversed_files), 0)
+
+    def test_workflow_concurrent(self):
+        stream_sizes = [2 ** i for i in range(10, 20)]
+        md5_of_reversed_files = {
+            str(s): self.__checksum(
+                bytes(reversed(ReversibleTestFile(s).read()))
+            ) for s in stream_sizes
+        }
+
+        workflow = WorkFlow(
+            Meta(MD5),
+            Program("rev"),
+            Program("tr -d '\n'"),
+            Meta(MD5, Size)
+        )
+
+        for ordered in (True, False):
+            paths = []
+            for f in workflow.compose(
+                    (TestStream(s, f'{s}', reversible=True)
+                     for s in stream_sizes),
+                    max_in_flight=3,
+                    ordered=ordered
+            ):
+                f[Stream].read()
+                self.assertEqual(f[MD5], md5_of_reversed_files[f[Path]])
+                self.assertEqual(f[Path], str(f[Size]))
+                paths.append(f[Path])
+
+            expected = [str(s) for s in stream_sizes]
+            if ordered:
+                self.assertEqual(paths, expected)
+            else:
+                self.assertEqual(sorted(paths), sorted(expected))
+
+    def test_workflow_concurrent_flush(self):
+        count = 8
+        workflow = WorkFlow(
+            Program(["sh", "-c", "sleep 0.5; cat"]),
+            Meta(Size)
+        )
+
+        start = time.time()
+        files = list(workflow.compose(
+            (ByteFile(b'x' * i, Path(str(i))) for i in range(count)),
+            max_in_flight=count
+        ).flush_iter())
+        # Run one by one this takes at least count * 0.5 seconds
+        self.assertLess(time.time() - start, count * 0.5 / 2)
+
+        self.assertEqual([f[Path] for f in files],
+                         [str(i) for i in range(count)])
+        self.assertEqual([f[Size] for f in files[1:]], list(range(1, count)))